@@ -2,7 +2,17 @@ import argparse
 import logging
 
 from retriever.entity_configuration import EntityConfiguration
-from retriever.entity_list import EntityList
+from requests.adapters import DEFAULT_POOLSIZE
+
+from retriever.entity_list import EntityList, ENGINES
+from retriever.transport import Transport, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_CONNECT_RETRIES
+from retriever.response_cache import ResponseCache, DEFAULT_CACHE_TTL, DEFAULT_CACHE_MAX_SIZE
+from retriever.pipeline import Pipeline, DEFAULT_WINDOW_SIZE
+from retriever.request_coalescer import RequestCoalescer, DEFAULT_COALESCE_BUFFER_SIZE
+from retriever.json_decoder import JsonDecoder, JSON_DECODERS, DEFAULT_JSON_DECODER
+from retriever.metrics import MetricsReporter, DEFAULT_METRICS_INTERVAL
+from retriever.profiler import Profiler, PROFILE_MODES, DEFAULT_PROFILE_MODE, PROFILE_TARGETS, DEFAULT_PROFILE_TARGET
+from util.log import set_log_level, LOG_LEVELS, DEFAULT_LOG_LEVEL
 
 # get global logger
 logger = logging.getLogger('api-retriever_logger')
@@ -60,6 +70,200 @@ def get_argument_parser():
         help='chunk size for this call (default: 0, meaning max.)',
         dest='chunk_size'
     )
+    arg_parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        required=False,
+        default=1,
+        help='number of workers retrieving data concurrently (default: 1, meaning sequential)',
+        dest='workers'
+    )
+    arg_parser.add_argument(
+        '-e', '--engine',
+        required=False,
+        default='requests',
+        choices=ENGINES,
+        help='engine for data retrieval: worker threads with requests or coroutines with asyncio '
+             '(default: requests)',
+        dest='engine'
+    )
+    arg_parser.add_argument(
+        '-ps', '--pool-size',
+        type=int,
+        required=False,
+        default=0,
+        help='maximum number of connections kept open per host (default: 0, meaning max. of workers and '
+             + str(DEFAULT_POOLSIZE) + ')',
+        dest='pool_size'
+    )
+    arg_parser.add_argument(
+        '-ct', '--connect-timeout',
+        type=float,
+        required=False,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help='timeout in seconds for establishing a connection (default: ' + str(DEFAULT_CONNECT_TIMEOUT) + ')',
+        dest='connect_timeout'
+    )
+    arg_parser.add_argument(
+        '-rt', '--read-timeout',
+        type=float,
+        required=False,
+        default=DEFAULT_READ_TIMEOUT,
+        help='timeout in seconds for reading from a connection (default: ' + str(DEFAULT_READ_TIMEOUT) + ')',
+        dest='read_timeout'
+    )
+    arg_parser.add_argument(
+        '-cr', '--connect-retries',
+        type=int,
+        required=False,
+        default=DEFAULT_CONNECT_RETRIES,
+        help='number of retries for failed connection attempts (default: ' + str(DEFAULT_CONNECT_RETRIES) + ')',
+        dest='connect_retries'
+    )
+    arg_parser.add_argument(
+        '-nka', '--no-keep-alive',
+        required=False,
+        action='store_false',
+        help='close connections after each request',
+        dest='keep_alive'
+    )
+    arg_parser.add_argument(
+        '-cf', '--cache-file',
+        required=False,
+        default=None,
+        help='path to SQLite database for caching responses between runs (default: no cache)',
+        dest='cache_file'
+    )
+    arg_parser.add_argument(
+        '-cttl', '--cache-ttl',
+        type=int,
+        required=False,
+        default=DEFAULT_CACHE_TTL,
+        help='seconds until cached responses are revalidated (default: ' + str(DEFAULT_CACHE_TTL) + ')',
+        dest='cache_ttl'
+    )
+    arg_parser.add_argument(
+        '-cms', '--cache-max-size',
+        type=int,
+        required=False,
+        default=DEFAULT_CACHE_MAX_SIZE,
+        help='maximum size of the response cache in MiB (default: ' + str(DEFAULT_CACHE_MAX_SIZE) + ')',
+        dest='cache_max_size'
+    )
+    arg_parser.add_argument(
+        '-nco', '--no-coalescing',
+        required=False,
+        action='store_false',
+        help='send identical requests (same URI and headers) again instead of sharing their responses',
+        dest='coalescing'
+    )
+    arg_parser.add_argument(
+        '-cbs', '--coalesce-buffer-size',
+        type=int,
+        required=False,
+        default=DEFAULT_COALESCE_BUFFER_SIZE,
+        help='maximum size in MiB of completed responses kept for identical requests (default: '
+             + str(DEFAULT_COALESCE_BUFFER_SIZE) + ')',
+        dest='coalesce_buffer_size'
+    )
+    arg_parser.add_argument(
+        '-jd', '--json-decoder',
+        required=False,
+        choices=JSON_DECODERS,
+        default=DEFAULT_JSON_DECODER,
+        help='decoder for JSON responses, "auto" uses orjson if it is installed (default: ' + DEFAULT_JSON_DECODER
+             + ')',
+        dest='json_decoder'
+    )
+    arg_parser.add_argument(
+        '-r', '--resume',
+        required=False,
+        action='store_true',
+        help='resume an interrupted run, restoring the entities journaled in the output directory',
+        dest='resume'
+    )
+    arg_parser.add_argument(
+        '-s', '--stream',
+        required=False,
+        action='store_true',
+        help='stream the input file in windows of bounded size instead of loading all entities into memory',
+        dest='stream'
+    )
+    arg_parser.add_argument(
+        '-ws', '--window-size',
+        type=int,
+        required=False,
+        default=DEFAULT_WINDOW_SIZE,
+        help='number of input entities processed per window when streaming (default: '
+             + str(DEFAULT_WINDOW_SIZE) + ')',
+        dest='window_size'
+    )
+    arg_parser.add_argument(
+        '-df', '--dedup-file',
+        required=False,
+        default=None,
+        help='path to temporary SQLite database for detecting duplicates in very large input files '
+             '(default: keep keys in memory)',
+        dest='dedup_file'
+    )
+    arg_parser.add_argument(
+        '-mf', '--metrics-file',
+        required=False,
+        default=None,
+        help='file the metrics of the run (latencies, status codes, retries, rate limits, etc.) are periodically '
+             'written to, in the Prometheus text format if the name ends with .prom, as JSON otherwise',
+        dest='metrics_file'
+    )
+    arg_parser.add_argument(
+        '-mi', '--metrics-interval',
+        type=float,
+        required=False,
+        default=DEFAULT_METRICS_INTERVAL,
+        help='interval in seconds between two exports of the metrics and progress lines (default: '
+             + str(DEFAULT_METRICS_INTERVAL) + ')',
+        dest='metrics_interval'
+    )
+    arg_parser.add_argument(
+        '-pg', '--progress',
+        required=False,
+        action='store_true',
+        help='periodically log a progress line with the estimated remaining time',
+        dest='progress'
+    )
+    arg_parser.add_argument(
+        '-pf', '--profile',
+        required=False,
+        action='store_true',
+        help='time the phases of the run and the callbacks, write a report (profile.txt) to the output directory',
+        dest='profile'
+    )
+    arg_parser.add_argument(
+        '-pfm', '--profile-mode',
+        required=False,
+        choices=PROFILE_MODES,
+        default=DEFAULT_PROFILE_MODE,
+        help='additionally profile function calls (cprofile, written to .prof files) or memory allocations '
+             '(tracemalloc) when profiling (default: ' + DEFAULT_PROFILE_MODE + ')',
+        dest='profile_mode'
+    )
+    arg_parser.add_argument(
+        '-pft', '--profile-target',
+        required=False,
+        choices=PROFILE_TARGETS,
+        default=DEFAULT_PROFILE_TARGET,
+        help='profile the phases of the run or the individual callbacks using cprofile or tracemalloc (default: '
+             + DEFAULT_PROFILE_TARGET + ')',
+        dest='profile_target'
+    )
+    arg_parser.add_argument(
+        '-ll', '--log-level',
+        required=False,
+        choices=LOG_LEVELS,
+        default=DEFAULT_LOG_LEVEL,
+        help='minimum level of the messages written to the console and the log file, messages below the level are '
+             'not formatted at all (default: ' + DEFAULT_LOG_LEVEL + ')',
+        dest='log_level'
+    )
     return arg_parser
 
 
@@ -68,32 +272,93 @@ def main():
     parser = get_argument_parser()
     args = parser.parse_args()
 
-    # parse configuration and create entity list
-    config = EntityConfiguration.create_from_json(args.config_file)
-    entities = EntityList(config, args.start_index, args.chunk_size)
+    # skip (and do not even format) log messages below the configured level
+    set_log_level('api-retriever_logger', args.log_level)
+
+    # open response cache (if configured)
+    cache = None
+    if args.cache_file:
+        cache = ResponseCache(args.cache_file, args.cache_ttl, args.cache_max_size)
+
+    # share responses between identical requests (unless disabled)
+    coalescer = None
+    if args.coalescing:
+        coalescer = RequestCoalescer(args.coalesce_buffer_size)
 
-    # read entities from CSV
-    entities.read_from_csv(args.input_file, args.delimiter)
+    # time the phases of the run and the callbacks (if configured)
+    profiler = Profiler(args.profile, args.profile_mode, args.profile_target)
 
-    # retrieve data using API
-    entities.retrieve_data()
+    # create transport shared by all entity lists (main list, chained requests, URI input parameters)
+    transport = Transport(args.pool_size if args.pool_size else max(args.workers, DEFAULT_POOLSIZE),
+                          args.connect_timeout, args.read_timeout, args.keep_alive, args.connect_retries, cache,
+                          coalescer, JsonDecoder(args.json_decoder), profiler)
+
+    # export metrics and log progress periodically (if configured)
+    reporter = None
+    if args.metrics_file or args.progress:
+        reporter = MetricsReporter(transport.metrics, transport.rate_limiter, args.metrics_file,
+                                   args.metrics_interval, args.progress)
+        reporter.start()
+
+    # parse configuration and create entity list
+    with profiler.phase("read_configuration"):
+        config = EntityConfiguration.create_from_json(args.config_file)
+    entities = EntityList(config, args.start_index, args.chunk_size, args.workers, args.engine, transport,
+                          args.dedup_file)
 
-    # flatten output (if configured)
-    if config.flatten_output:
-        entities.flatten_output()
+    if args.stream:
+        # journal retrieved entities in output directory (restore journaled entities if resuming)
+        entities.open_journal(args.output_dir, args.resume)
 
-    if config.chained_request_name:
-        # execute chained request (if configured)
-        chained_entities = entities.execute_chained_request(args.config_dir)
-        # write chained entities to CSV file
-        chained_entities.write_to_csv(args.output_dir, args.delimiter)
+        # read, retrieve, and export entities window by window
+        Pipeline(entities, args.window_size, args.output_dir, args.delimiter, args.config_dir).run(args.input_file)
     else:
-        if config.raw_download:
-            # write raw content to output files
-            entities.save_raw_files(args.output_dir)
+        # read entities from CSV
+        with profiler.phase("read_from_csv"):
+            entities.read_from_csv(args.input_file, args.delimiter)
+
+        # journal retrieved entities in output directory (restore journaled entities if resuming)
+        entities.open_journal(args.output_dir, args.resume)
+        # stream raw downloads to the output directory while retrieving
+        entities.set_output_dir(args.output_dir)
+
+        if config.chained_request_name:
+            # retrieve data using API and execute chained requests (if configured), the chained requests of an
+            # entity are sent as soon as its data has been retrieved
+            with profiler.phase("execute_chained_request"):
+                chained_entities = entities.execute_chained_request(args.config_dir)
+            if chained_entities.configuration.raw_download:
+                # write raw content of last chained request to output files
+                with profiler.phase("save_raw_files"):
+                    chained_entities.save_raw_files(args.output_dir)
+            # write chained entities to CSV file
+            with profiler.phase("write_to_csv"):
+                chained_entities.write_to_csv(args.output_dir, args.delimiter)
+        else:
+            # retrieve data using API
+            with profiler.phase("retrieve_data"):
+                entities.retrieve_data()
+
+            # flatten output (if configured)
+            if config.flatten_output:
+                with profiler.phase("flatten_output"):
+                    entities.flatten_output()
+
+            if config.raw_download:
+                # write raw content to output files
+                with profiler.phase("save_raw_files"):
+                    entities.save_raw_files(args.output_dir)
+
+            # write entities to CSV file
+            with profiler.phase("write_to_csv"):
+                entities.write_to_csv(args.output_dir, args.delimiter)
 
-        # write entities to CSV file
-        entities.write_to_csv(args.output_dir, args.delimiter)
+    # the run has been exported, remove the journals (unless entities failed because of connection errors)
+    entities.close_journal(remove=True)
+    if reporter is not None:
+        reporter.stop()
+    profiler.write_report(args.output_dir)
+    transport.close()
 
 
 if __name__ == '__main__':
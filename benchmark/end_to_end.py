@@ -0,0 +1,248 @@
+"""
+Offline end-to-end benchmark: runs api-retriever.py with configurations from config/ against the local mock API
+(see mock_server.py) for different input sizes and reports requests per second, the p50/p99 latency of the
+entities (from sending the first request until the data has been retrieved, including retries and delays), and the
+peak resident memory of the retriever process. Usage (from the root directory of the repository):
+    python3 benchmark/end_to_end.py -s 100,1000 -w 8 -o benchmark_results.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import defaultdict, deque
+from datetime import datetime
+
+from jsmin import jsmin
+
+from mock_server import MockAPIServer, get_argument_parser as get_server_argument_parser, create_api
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_DIR = os.path.join(ROOT_DIR, "config")
+
+# log messages marking the start and the end of the retrieval of an entity (see Entity.retrieve_data)
+LOG_ENTRY_REGEX = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) \S+ INFO: '
+                             r'(Retrieving data for entity (.*)\.\.\.|Successfully retrieved data for entity (.*)\.)$')
+LOG_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+
+# configurations and functions creating the input parameters of the n-th entity
+SCENARIOS = {
+    "gh_repo___license": lambda i: {"repo_name": "user" + str(i) + "/repo" + str(i)},
+    "gh_repo___ranking": lambda i: {"min_stars": str(1000 + i * 10), "max_stars": str(1009 + i * 10)},
+    "google_query___search-results": lambda i: {"q": "query " + str(i), "gl": "de", "lr": "lang_de",
+                                                "cr": "countryDE"},
+    "dblp___venues": lambda i: {"dblp_identifier": "conf/icse/icse" + str(i), "min_length": "8"},
+    "tweet_id___conversation_replies": lambda i: {"tweet_id": str(1333899081656229888 + i)},
+}
+DEFAULT_SIZES = "100,1000"
+
+
+def rewrite_configuration(name, directory, server, keep_delays):
+    """
+    Copy a configuration from config/, such that its URI template points to the mock server.
+    :param name: Name of the configuration.
+    :param directory: Directory to write the rewritten configuration to.
+    :param server: Object of class MockAPIServer.
+    :param keep_delays: Keep the configured delays between requests (otherwise, they are set to 0).
+    :return: Path to the rewritten configuration.
+    """
+    with open(os.path.join(CONFIG_DIR, name + ".json"), encoding="utf8") as config_file:
+        config_dict = json.loads(jsmin(config_file.read()))
+    config_dict["uri_template"] = server.get_uri(config_dict["uri_template"])
+    # some of the configurations in config/ predate the log_uri option
+    config_dict.setdefault("log_uri", False)
+    if not keep_delays:
+        config_dict["delay"] = [0, 0]
+    config_path = os.path.join(directory, name + ".json")
+    with open(config_path, "w", encoding="utf8") as config_file:
+        json.dump(config_dict, config_file, indent=2)
+    return config_path
+
+
+def write_input_file(path, scenario, size):
+    """
+    Write a CSV file with input parameters for a scenario.
+    :param path: Path to the CSV file.
+    :param scenario: Function creating the input parameters of the n-th entity.
+    :param size: Number of entities.
+    """
+    rows = [scenario(i) for i in range(size)]
+    with open(path, "w", newline="", encoding="utf8") as input_file:
+        writer = csv.DictWriter(input_file, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def get_entity_latencies(log_file):
+    """
+    Get the retrieval latencies of the entities from the log file of a run.
+    :param log_file: Path to api-retriever.log.
+    :return: List with latencies in milliseconds.
+    """
+    started = defaultdict(deque)
+    latencies = []
+    with open(log_file, encoding="utf8") as log:
+        for line in log:
+            match = LOG_ENTRY_REGEX.match(line.rstrip("\n"))
+            if not match:
+                continue
+            timestamp = datetime.strptime(match.group(1), LOG_TIMESTAMP_FORMAT)
+            if match.group(3) is not None:
+                started[match.group(3)].append(timestamp)
+            elif started[match.group(4)]:
+                start = started[match.group(4)].popleft()
+                latencies.append((timestamp - start).total_seconds() * 1000)
+    return latencies
+
+
+def get_percentile(values, percentile):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))]
+
+
+def run(name, size, server, args):
+    """
+    Run api-retriever.py for one scenario and input size.
+    :param name: Name of the configuration (key in SCENARIOS).
+    :param size: Number of input entities.
+    :param server: Object of class MockAPIServer.
+    :param args: Parsed command line arguments.
+    :return: Dictionary with the results.
+    """
+    run_dir = tempfile.mkdtemp(prefix="api-retriever-benchmark-")
+    try:
+        config_path = rewrite_configuration(name, run_dir, server, args.keep_delays)
+        input_path = os.path.join(run_dir, "input.csv")
+        write_input_file(input_path, SCENARIOS[name], size)
+        output_dir = os.path.join(run_dir, "output")
+        os.mkdir(output_dir)
+
+        command = [sys.executable, os.path.join(ROOT_DIR, "api-retriever.py"), "-i", input_path, "-o", output_dir,
+                   "-c", config_path, "-cd", run_dir, "-w", str(args.workers), "-e", args.engine] + args.retriever_args
+        requests_before = server.api.get_stats()
+
+        # the log file is written to the working directory of the retriever
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=run_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        requests_after = server.api.get_stats()
+        requests = requests_after["requests"] - requests_before["requests"]
+        status_codes = {str(code): count - requests_before["status_codes"].get(code, 0)
+                        for code, count in requests_after["status_codes"].items()
+                        if count > requests_before["status_codes"].get(code, 0)}
+        latencies = get_entity_latencies(os.path.join(run_dir, "api-retriever.log"))
+
+        return {
+            "scenario": name,
+            "entities": size,
+            "exit_code": process.returncode,
+            "seconds": round(seconds, 3),
+            "requests": requests,
+            "status_codes": status_codes,
+            "bytes_received": requests_after["bytes_sent"] - requests_before["bytes_sent"],
+            "requests_per_second": round(requests / seconds, 1),
+            "retrieved_entities": len(latencies),
+            "latency_p50_ms": get_percentile(latencies, 50),
+            "latency_p99_ms": get_percentile(latencies, 99),
+            # ru_maxrss is reported in kilobytes on Linux
+            "peak_rss_mb": round(usage.ru_maxrss / 1024, 1)
+        }
+    finally:
+        if args.keep_runs:
+            print("Kept run directory " + run_dir)
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def get_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT_DIR, capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def format_value(value, digits=0):
+    if value is None:
+        return "-"
+    return ("%." + str(digits) + "f") % value
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Run api-retriever.py end to end against a local mock API.',
+                                         parents=[get_server_argument_parser()], conflict_handler='resolve')
+    arg_parser.add_argument('-p', '--port', type=int, default=0, help='port of the mock API (default: 0, meaning any '
+                                                                      'free port)', dest='port')
+    arg_parser.add_argument('-sc', '--scenarios', default=",".join(SCENARIOS.keys()),
+                            help='comma-separated list of configurations (default: all)', dest='scenarios')
+    arg_parser.add_argument('-s', '--sizes', default=DEFAULT_SIZES,
+                            help='comma-separated list of input sizes (default: ' + DEFAULT_SIZES + ')', dest='sizes')
+    arg_parser.add_argument('-w', '--workers', type=int, default=8, help='number of workers (default: 8)',
+                            dest='workers')
+    arg_parser.add_argument('-e', '--engine', choices=['requests', 'asyncio'], default='requests',
+                            help='engine for data retrieval (default: requests)', dest='engine')
+    arg_parser.add_argument('-kd', '--keep-delays', action='store_true', default=False,
+                            help='keep the configured delays between requests (default: no delays)',
+                            dest='keep_delays')
+    arg_parser.add_argument('-kr', '--keep-runs', action='store_true', default=False,
+                            help='keep the run directories (input, output, log file)', dest='keep_runs')
+    arg_parser.add_argument('-o', '--output', default=None, help='JSON file to write the results to', dest='output')
+    arg_parser.add_argument('retriever_args', nargs=argparse.REMAINDER,
+                            help='further arguments for api-retriever.py (after --)')
+    args = arg_parser.parse_args()
+    if args.retriever_args and args.retriever_args[0] == "--":
+        args.retriever_args = args.retriever_args[1:]
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            arg_parser.error("unknown scenario " + name + " (available: " + ", ".join(SCENARIOS.keys()) + ")")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    server = MockAPIServer(create_api(args), args.port)
+    server.start()
+
+    results = []
+    print("scenario".ljust(32) + "entities".rjust(9) + "requests".rjust(10) + "req/s".rjust(9) + "p50 ms".rjust(9)
+          + "p99 ms".rjust(9) + "RSS MB".rjust(8) + "exit".rjust(6))
+    try:
+        for name in scenarios:
+            for size in sizes:
+                result = run(name, size, server, args)
+                results.append(result)
+                print(name.ljust(32) + str(size).rjust(9) + str(result["requests"]).rjust(10)
+                      + format_value(result["requests_per_second"]).rjust(9)
+                      + format_value(result["latency_p50_ms"]).rjust(9)
+                      + format_value(result["latency_p99_ms"]).rjust(9)
+                      + format_value(result["peak_rss_mb"], 1).rjust(8) + str(result["exit_code"]).rjust(6))
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as output_file:
+            json.dump({
+                "version": get_version(),
+                "python": sys.version.split()[0],
+                "workers": args.workers,
+                "engine": args.engine,
+                "server": {"latency_median_ms": args.latency_median, "latency_sigma": args.latency_sigma,
+                           "error_rate": args.error_rate, "rate_limit": args.rate_limit,
+                           "rate_limit_window": args.rate_limit_window},
+                "results": results
+            }, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
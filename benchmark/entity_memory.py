@@ -0,0 +1,142 @@
+"""
+Memory benchmark: bytes per entity after creating the entities of an entity list and after retrieving their data.
+The responses are served by a local HTTP server, such that the complete retrieval (including the callbacks and the
+release of the responses) is measured. Usage (from the root directory of the repository):
+    python3 benchmark/entity_memory.py -n 5000 -w 8
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retriever.entity import Entity  # noqa: E402
+from retriever.entity_configuration import EntityConfiguration  # noqa: E402
+from retriever.entity_list import EntityList  # noqa: E402
+from retriever.transport import Transport  # noqa: E402
+
+
+def get_response(size):
+    """
+    Create a JSON response similar to the repository objects of the GitHub API.
+    :param size: Approximate size of the response in bytes.
+    :return: The response body (bytes).
+    """
+    response = {
+        "id": 1,
+        "full_name": "user/repo",
+        "license": {"key": "mit", "name": "MIT License", "spdx_id": "MIT"},
+        "owner": {"login": "user", "id": 1, "type": "User"},
+        "description": "x" * 100,
+    }
+    field = 0
+    while len(json.dumps(response)) < size:
+        response["field_" + str(field)] = "https://api.github.com/repos/user/repo/field_" + str(field)
+        field += 1
+    return json.dumps(response).encode("utf8")
+
+
+def start_server(body):
+    """
+    Start a local HTTP server answering all requests with the same JSON response.
+    :param body: The response body.
+    :return: Port of the server.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def get_configuration(port):
+    """
+    Create an entity configuration similar to gh_repo___license.
+    :param port: Port of the local HTTP server.
+    :return: Object of class EntityConfiguration.
+    """
+    return EntityConfiguration("benchmark", {
+        "input_parameters": ["repo_name"],
+        "ignore_input_duplicates": False,
+        "uri_template": "http://127.0.0.1:" + str(port) + "/repos/{repo_name}",
+        "api_keys": [],
+        "headers": {},
+        "delay": [0, 0],
+        "pre_request_callbacks": [],
+        "pre_request_callback_filter": False,
+        "output_parameter_mapping": {"license": ["license", "key"], "full_name": ["full_name"]},
+        "post_request_callbacks": [],
+        "post_request_callback_filter": False,
+        "flatten_output": False,
+        "chained_request": {},
+        "log_uri": False
+    })
+
+
+def get_traced_memory():
+    """
+    Get the memory currently allocated by Python (after a garbage collection).
+    :return: Allocated memory in bytes.
+    """
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Measure the memory usage per entity.')
+    arg_parser.add_argument('-n', '--entities', type=int, default=5000, help='number of entities', dest='entities')
+    arg_parser.add_argument('-w', '--workers', type=int, default=8, help='number of workers', dest='workers')
+    arg_parser.add_argument('-rs', '--response-size', type=int, default=5000,
+                            help='approximate size of each response in bytes', dest='response_size')
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    port = start_server(get_response(args.response_size))
+    configuration = get_configuration(port)
+    transport = Transport(pool_size=args.workers)
+
+    # warm up the connections, such that the connection pool is not counted
+    warm_up = EntityList(configuration, workers=args.workers, transport=transport)
+    warm_up.add([Entity(configuration, {"repo_name": "warm/up" + str(i)}, None) for i in range(args.workers)])
+    warm_up.retrieve_data()
+    del warm_up
+
+    tracemalloc.start()
+    baseline = get_traced_memory()
+
+    entities = EntityList(configuration, workers=args.workers, transport=transport)
+    entities.add([Entity(configuration, {"repo_name": "user/repo" + str(i)}, None) for i in range(args.entities)])
+    created = get_traced_memory() - baseline
+
+    entities.retrieve_data()
+    retrieved = get_traced_memory() - baseline
+    assert len(entities.entities) == args.entities
+
+    tracemalloc.stop()
+    transport.close()
+
+    print("entities:               " + str(args.entities))
+    print("response size (bytes):  " + str(args.response_size))
+    print("bytes/entity created:   " + str(round(created / args.entities)))
+    print("bytes/entity retrieved: " + str(round(retrieved / args.entities)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Microbenchmarks for the CPU-bound hot paths of the retriever (no network access): filtering responses, rendering
+URIs, flattening output, building CSV rows, and the callbacks processing commits and Java code. The inputs are
+derived from the sample responses in doc/. The results can be saved as a baseline (JSON) and compared with a later
+run. Usage (from the root directory of the repository):
+    python3 benchmark/microbenchmarks.py --save baseline.json
+    python3 benchmark/microbenchmarks.py --compare baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from jsmin import jsmin
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from retriever.callback_helpers import normalize_java, get_added_lines  # noqa: E402
+from retriever.callbacks import sort_commits  # noqa: E402
+from retriever.csv_exporter import CsvExporter  # noqa: E402
+from retriever.entity import Entity  # noqa: E402
+from retriever.entity_configuration import EntityConfiguration  # noqa: E402
+from retriever.entity_list import EntityList  # noqa: E402
+
+DOC_DIR = os.path.join(ROOT_DIR, "doc")
+CONFIG_DIR = os.path.join(ROOT_DIR, "config")
+
+# default number of timed repetitions per benchmark (the median is reported)
+DEFAULT_REPEAT = 7
+# default relative slowdown reported as regression when comparing with a baseline
+DEFAULT_THRESHOLD = 0.1
+
+
+def load_configuration(name):
+    """
+    Load a configuration from config/ (some of them predate the log_uri option).
+    :param name: Name of the configuration.
+    :return: Object of class EntityConfiguration.
+    """
+    with open(os.path.join(CONFIG_DIR, name + ".json"), encoding="utf8") as config_file:
+        config_dict = json.loads(jsmin(config_file.read()))
+    config_dict.setdefault("log_uri", False)
+    return EntityConfiguration(name, config_dict)
+
+
+def load_repositories(count):
+    """
+    Get repositories from the GitHub search response in doc/, repeated with distinct names.
+    :param count: Number of repositories.
+    :return: List with repository objects (as returned by the GitHub API).
+    """
+    with open(os.path.join(DOC_DIR, "gh_search.json"), encoding="utf8") as fp:
+        samples = json.load(fp)["items"]
+    repositories = []
+    for index in range(count):
+        repository = dict(samples[index % len(samples)])
+        repository["full_name"] = repository["full_name"] + "-" + str(index)
+        repositories.append(repository)
+    return repositories
+
+
+def get_java_class(repositories):
+    """
+    Create the source code of a Java class with one method per repository (with imports, comments, and
+    placeholders, such that all branches of normalize_java are exercised).
+    :param repositories: List with repository objects.
+    :return: The source code.
+    """
+    lines = ["package org.example.repositories;", "", "import java.util.List;", "import java.util.Map;", "",
+             "/*", " * Repositories from a GitHub search.", " */", "public class Repositories {"]
+    for index, repository in enumerate(repositories):
+        lines += [
+            "    // " + str(repository["description"]),
+            "    public static String getRepository" + str(index) + "(Map<String, Object> values) {",
+            "        String name = \"" + repository["full_name"] + "\";  // full name",
+            "        int stars = " + str(repository["stargazers_count"]) + ";",
+            "        ...",
+            "        return name + \"@\" + values.get(\"" + str(repository["language"]) + "\") + stars;",
+            "    }",
+            ""
+        ]
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def get_patch(source_code):
+    """
+    Create a patch adding every other line of the given source code.
+    :param source_code: The source code.
+    :return: The patch (unified diff format).
+    """
+    lines = source_code.split("\n")
+    return "@@ -1," + str(len(lines) // 2) + " +1," + str(len(lines)) + " @@\n" \
+           + "\n".join(("+" if index % 2 else " ") + line for index, line in enumerate(lines))
+
+
+class Benchmark(object):
+    """
+    A benchmark consists of a setup function creating fresh inputs (not timed) and a function processing them
+    (timed), because several of the benchmarked functions modify their input.
+    """
+
+    def __init__(self, name, description, setup, run, number=1):
+        """
+        :param name: Name of the benchmark (key in the baseline).
+        :param description: Short description of the measured operation.
+        :param setup: Function creating the input for one repetition.
+        :param run: Function processing the input.
+        :param number: Number of calls of run per repetition (for operations that are too fast to be timed once).
+        """
+        self.name = name
+        self.description = description
+        self.setup = setup
+        self.run = run
+        self.number = number
+
+    def measure(self, repeat):
+        """
+        Time the benchmark.
+        :param repeat: Number of timed repetitions.
+        :return: Dictionary with the median and minimal time per repetition (seconds) and the number of calls.
+        """
+        timings = []
+        for repetition in range(repeat + 1):
+            value = self.setup()
+            start = time.perf_counter()
+            for call in range(self.number):
+                self.run(value)
+            seconds = time.perf_counter() - start
+            # the first repetition warms up caches (e.g., compiled regular expressions)
+            if repetition > 0:
+                timings.append(seconds)
+        return {"median_s": statistics.median(timings), "min_s": min(timings), "number": self.number,
+                "repeat": repeat}
+
+
+def get_benchmarks(scale):
+    """
+    Create the benchmarks.
+    :param scale: Factor for the size of the inputs.
+    :return: List with objects of class Benchmark.
+    """
+    ranking_config = load_configuration("gh_repo___ranking")
+    repos_filter = ranking_config.output_filters["repos"]
+    repos_mapping = ranking_config.output_parameter_mapping["repos"]
+    search_response = {"total_count": 1000 * scale, "items": load_repositories(1000 * scale)}
+    repositories = load_repositories(100)
+    repos_output = repos_filter.apply({"items": repositories})
+
+    def create_ranking_entities(count):
+        entities = []
+        for index in range(count):
+            entity = Entity(ranking_config, {"min_stars": str(index * 10), "max_stars": str(index * 10 + 9)}, None)
+            entity.output_parameters = {"repos": [dict(repo) for repo in repos_output]}
+            entities.append(entity)
+        return entities
+
+    def create_flattened_entities(count):
+        return EntityList.flatten_entities(create_ranking_entities(count))
+
+    def write_csv(entities):
+        # rows are written to /dev/null, such that the disk does not add noise
+        exporter = CsvExporter(os.devnull, ",", ranking_config)
+        exporter.write(entities)
+        exporter.file.close()
+
+    uri_template = ranking_config.uri_template
+    uri_values = [{"min_stars": str(index * 10), "max_stars": str(index * 10 + 9), "page": str(index % 10 + 1)}
+                  for index in range(1000)]
+
+    def render_uris(values):
+        replace_variables = uri_template.replace_variables
+        for value in values:
+            replace_variables(value)
+
+    commits_config = load_configuration("gh_repo_path_codeblock___commits")
+    commit_dates = [repository[field] for repository in repositories
+                    for field in ("created_at", "updated_at", "pushed_at")]
+
+    def create_commit_entity():
+        entity = Entity(commits_config, {parameter: "value" for parameter in commits_config.input_parameters}, None)
+        entity.output_parameters = {"commits": [{"sha": "%040x" % index,
+                                                 "commit_date": commit_dates[index % len(commit_dates)]}
+                                                for index in range(1000 * scale)]}
+        return entity
+
+    java_class = get_java_class(load_repositories(100 * scale))
+    patch = get_patch(java_class)
+
+    return [
+        Benchmark("apply_filter", "Entity.apply_filter, ranking mapping, " + str(1000 * scale) + " list elements",
+                  lambda: search_response, lambda response: Entity.apply_filter(response, repos_mapping)),
+        Benchmark("filter_path", "compiled FilterPath.apply, ranking mapping, " + str(1000 * scale)
+                  + " list elements", lambda: search_response, repos_filter.apply),
+        Benchmark("replace_variables", "URITemplate.replace_variables, ranking template, 1000 URIs",
+                  lambda: uri_values, render_uris, number=10 * scale),
+        Benchmark("flatten_output", "EntityList.flatten_entities, " + str(10 * scale) + " entities x 100 repos",
+                  lambda: create_ranking_entities(10 * scale), EntityList.flatten_entities),
+        Benchmark("write_to_csv", "CsvExporter.write, " + str(1000 * scale) + " flattened entities",
+                  lambda: create_flattened_entities(10 * scale), write_csv),
+        Benchmark("sort_commits", "callbacks.sort_commits, " + str(1000 * scale) + " commits",
+                  create_commit_entity, sort_commits),
+        Benchmark("normalize_java", "normalize_java, " + str(len(java_class.split("\n"))) + " lines",
+                  lambda: java_class, normalize_java),
+        Benchmark("get_added_lines", "get_added_lines, " + str(len(patch.split("\n"))) + " lines",
+                  lambda: patch, get_added_lines, number=10),
+    ]
+
+
+def get_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT_DIR, capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+    :param results: Dictionary with the results per benchmark.
+    :param baseline: Dictionary with the results of the baseline per benchmark.
+    :param threshold: Relative slowdown reported as regression.
+    :return: List with the names of the regressed benchmarks.
+    """
+    regressions = []
+    print()
+    print("benchmark".ljust(20) + "baseline ms".rjust(13) + "current ms".rjust(13) + "speedup".rjust(10))
+    for name, result in results.items():
+        if name not in baseline:
+            print(name.ljust(20) + "-".rjust(13) + ("%.3f" % (result["median_s"] * 1000)).rjust(13))
+            continue
+        # compare the time per call, the number of calls may have changed
+        baseline_time = baseline[name]["median_s"] / baseline[name]["number"]
+        current_time = result["median_s"] / result["number"]
+        speedup = baseline_time / current_time
+        regressed = current_time > baseline_time * (1 + threshold)
+        if regressed:
+            regressions.append(name)
+        print(name.ljust(20) + ("%.3f" % (baseline_time * 1000)).rjust(13) + ("%.3f" % (current_time * 1000)).rjust(13)
+              + ("%.2fx" % speedup).rjust(10) + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Measure the CPU time of hot paths of the retriever.')
+    arg_parser.add_argument('-b', '--benchmarks', default=None,
+                            help='comma-separated list of benchmarks to run (default: all)', dest='benchmarks')
+    arg_parser.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+                            help='number of timed repetitions (default: ' + str(DEFAULT_REPEAT) + ')', dest='repeat')
+    arg_parser.add_argument('-sc', '--scale', type=int, default=1, help='factor for the input sizes (default: 1)',
+                            dest='scale')
+    arg_parser.add_argument('--save', default=None, help='JSON file to save the results to (baseline)', dest='save')
+    arg_parser.add_argument('--compare', default=None, help='JSON file with a baseline to compare with',
+                            dest='compare')
+    arg_parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='relative slowdown reported as regression (default: ' + str(DEFAULT_THRESHOLD) + ')',
+                            dest='threshold')
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    benchmarks = get_benchmarks(args.scale)
+    if args.benchmarks:
+        names = [name.strip() for name in args.benchmarks.split(",")]
+        unknown = [name for name in names if name not in [benchmark.name for benchmark in benchmarks]]
+        if unknown:
+            arg_parser.error("unknown benchmarks: " + ", ".join(unknown))
+        benchmarks = [benchmark for benchmark in benchmarks if benchmark.name in names]
+
+    results = {}
+    for benchmark in benchmarks:
+        result = benchmark.measure(args.repeat)
+        result["description"] = benchmark.description
+        results[benchmark.name] = result
+        print(benchmark.name.ljust(20) + ("%.3f ms" % (result["median_s"] / result["number"] * 1000)).rjust(13)
+              + " per call (min " + ("%.3f ms" % (result["min_s"] / result["number"] * 1000)) + ")  "
+              + benchmark.description)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf8") as output_file:
+            json.dump({"version": get_version(), "python": sys.version.split()[0], "scale": args.scale,
+                       "results": results}, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("scale") != args.scale:
+            print("Warning: baseline was measured with scale " + str(baseline.get("scale")) + ".")
+        if compare(results, baseline["results"], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
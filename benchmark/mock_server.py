@@ -0,0 +1,420 @@
+"""
+Local stand-in for the APIs used by the configurations in config/ (GitHub, Twitter, DBLP, Google Custom Search,
+Stack Exchange, and Airbnb). The host of a URI becomes the first segment of the path, e.g.,
+    https://api.github.com/repos/{repo_name}  ->  http://127.0.0.1:<port>/api.github.com/repos/{repo_name}
+The server answers with realistic payloads (based on the sample responses in doc/), sends rate limit headers,
+paginates search results, simulates latency (log-normal distribution), and answers a configurable fraction of
+the requests with "429 Too Many Requests". Usage (from the root directory of the repository):
+    python3 benchmark/mock_server.py -p 8080 -lm 50
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# directory with sample responses
+DOC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "doc")
+
+# default simulation parameters
+DEFAULT_LATENCY_MEDIAN = 20  # ms
+DEFAULT_LATENCY_SIGMA = 0.5
+DEFAULT_ERROR_RATE = 0.0
+DEFAULT_RATE_LIMIT = 100000  # requests per window and key
+DEFAULT_RATE_LIMIT_WINDOW = 60  # seconds
+DEFAULT_SEARCH_RESULTS = 1000  # results of GitHub searches
+DEFAULT_GOOGLE_RESULTS = 50  # results of Google searches (10 per page)
+DEFAULT_LIST_SIZE = 100  # DBLP hits, tweets per conversation, commits per repository
+DEFAULT_RAW_SIZE = 10000  # bytes per raw file
+
+
+class MockAPI(object):
+    """
+    Request handling of the mock server (independent of the HTTP server, such that it can be shared by all
+    connections). Counts the requests, the status codes of the responses, and the bytes sent.
+    """
+
+    def __init__(self, latency_median=DEFAULT_LATENCY_MEDIAN, latency_sigma=DEFAULT_LATENCY_SIGMA,
+                 error_rate=DEFAULT_ERROR_RATE, rate_limit=DEFAULT_RATE_LIMIT,
+                 rate_limit_window=DEFAULT_RATE_LIMIT_WINDOW, search_results=DEFAULT_SEARCH_RESULTS,
+                 google_results=DEFAULT_GOOGLE_RESULTS, list_size=DEFAULT_LIST_SIZE, raw_size=DEFAULT_RAW_SIZE):
+        """
+        Initialize the mock API.
+        :param latency_median: Median latency of responses in milliseconds (0 for no latency).
+        :param latency_sigma: Standard deviation of the logarithm of the latency (log-normal distribution).
+        :param error_rate: Fraction of requests answered with "429 Too Many Requests" (and "Retry-After: 1").
+        :param rate_limit: Number of requests per window and API key (or host, if no key is sent).
+        :param rate_limit_window: Length of the rate limit window in seconds.
+        :param search_results: Number of results of GitHub searches.
+        :param google_results: Number of results of Google searches.
+        :param list_size: Number of DBLP hits, tweets per conversation, and commits per repository.
+        :param raw_size: Size of raw files in bytes.
+        """
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.search_results = search_results
+        self.google_results = google_results
+        self.list_size = list_size
+        self.raw_size = raw_size
+
+        # sample repositories from a GitHub search
+        with open(os.path.join(DOC_DIR, "gh_search.json"), encoding="utf8") as fp:
+            self.gh_repos = json.load(fp)["items"]
+        with open(os.path.join(DOC_DIR, "so-api_response_a_correct.txt"), encoding="utf8") as fp:
+            self.so_answer = json.load(fp)
+
+        # rate limit windows per key: [remaining requests, reset timestamp]
+        self.rate_limits = dict()
+        self.requests = 0
+        self.status_codes = Counter()
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+        self.routes = [
+            (re.compile(r'/api\.github\.com/search/repositories'), self._github_search_repositories),
+            (re.compile(r'/api\.github\.com/search/commits'), self._github_search_commits),
+            (re.compile(r'/api\.github\.com/repos/([^/]+/[^/]+)/commits/([^/]+)'), self._github_commit),
+            (re.compile(r'/api\.github\.com/repos/([^/]+/[^/]+)/commits'), self._github_commits),
+            (re.compile(r'/api\.github\.com/repos/([^/]+/[^/]+)'), self._github_repo),
+            (re.compile(r'/api\.github\.com/users/([^/]+)'), self._github_user),
+            (re.compile(r'/raw\.githubusercontent\.com/(.+)'), self._raw_file),
+            (re.compile(r'/api\.twitter\.com/2/tweets/search/all'), self._twitter_search),
+            (re.compile(r'/dblp\.org/search/publ/api'), self._dblp_search),
+            (re.compile(r'/www\.googleapis\.com/customsearch/v1'), self._google_search),
+            (re.compile(r'/api\.stackexchange\.com/2\.2/answers/([^/]+)'), self._stackexchange_answer),
+            (re.compile(r'/api\.airbnb\.com/v2/(users|listings)/([^/]+)'), self._airbnb),
+        ]
+
+    def handle(self, path, query, headers):
+        """
+        Answer a GET request.
+        :param path: Path of the request (starting with the host of the simulated API).
+        :param query: Dictionary with the query parameters.
+        :param headers: Headers of the request.
+        :return: Tuple with status code, dictionary with headers, and body (bytes).
+        """
+        if self.latency_median > 0:
+            time.sleep(random.lognormvariate(math.log(self.latency_median / 1000), self.latency_sigma))
+
+        host = path.split("/")[1]
+        key = query.get("access_token") or query.get("key") or query.get("client_id") \
+            or headers.get("Authorization") or ""
+        response_headers = self._get_rate_limit_headers(host + ":" + key)
+
+        if response_headers["X-RateLimit-Remaining"] == "0":
+            status, body = 403, {"message": "API rate limit exceeded."}
+        elif self.error_rate > 0 and random.random() < self.error_rate:
+            status, body = 429, {"message": "Too many requests."}
+            response_headers["Retry-After"] = "1"
+        else:
+            status, body = 404, {"message": "Not Found"}
+            for pattern, handler in self.routes:
+                match = pattern.fullmatch(path)
+                if match:
+                    status, body = 200, handler(query, response_headers, *match.groups())
+                    break
+
+        if isinstance(body, bytes):
+            response_headers["Content-Type"] = "text/plain; charset=utf-8"
+        else:
+            response_headers["Content-Type"] = "application/json; charset=utf-8"
+            body = json.dumps(body).encode("utf8")
+
+        with self.lock:
+            self.requests += 1
+            self.status_codes[status] += 1
+            self.bytes_sent += len(body)
+        return status, response_headers, body
+
+    def _get_rate_limit_headers(self, key):
+        """
+        Take one request from the rate limit window of a key.
+        :param key: Host and API key of the request.
+        :return: Dictionary with rate limit headers (X-RateLimit-Remaining is "0" if the limit has been exceeded).
+        """
+        now = time.time()
+        with self.lock:
+            window = self.rate_limits.get(key)
+            if window is None or window[1] <= now:
+                window = self.rate_limits[key] = [self.rate_limit, int(now) + self.rate_limit_window]
+            exceeded = window[0] == 0
+            if not exceeded:
+                window[0] -= 1
+            return {
+                "X-RateLimit-Limit": str(self.rate_limit),
+                "X-RateLimit-Remaining": "0" if exceeded else str(max(window[0], 1)),
+                "X-RateLimit-Reset": str(window[1])
+            }
+
+    @staticmethod
+    def _get_seed(*values):
+        """
+        Get a deterministic seed for generated payloads (the same request returns the same payload).
+        """
+        return int(hashlib.md5("/".join(str(value) for value in values).encode("utf8")).hexdigest()[:8], 16)
+
+    @staticmethod
+    def _get_page(query, name, default):
+        try:
+            return int(query.get(name, default))
+        except ValueError:
+            return default
+
+    def _get_repo(self, repo_name):
+        repo = dict(self.gh_repos[MockAPI._get_seed(repo_name) % len(self.gh_repos)])
+        repo["full_name"] = repo_name
+        repo["name"] = repo_name.split("/")[-1]
+        return repo
+
+    def _github_repo(self, query, headers, repo_name):
+        return self._get_repo(repo_name)
+
+    def _github_user(self, query, headers, user_name):
+        seed = MockAPI._get_seed(user_name)
+        return {"login": user_name, "id": seed, "type": "Organization" if seed % 5 == 0 else "User",
+                "name": user_name.title(), "email": user_name + "@example.com", "public_repos": seed % 100}
+
+    def _github_search_repositories(self, query, headers):
+        page = self._get_page(query, "page", 1)
+        per_page = self._get_page(query, "per_page", 30)
+        start = (page - 1) * per_page
+        items = []
+        for index in range(start, min(start + per_page, self.search_results)):
+            items.append(self._get_repo("user" + str(index) + "/repo" + str(index)))
+        last_page = max(1, math.ceil(self.search_results / per_page))
+        if page < last_page:
+            headers["Link"] = "<" + self._get_page_uri("/api.github.com/search/repositories", query, "page", page + 1) \
+                              + ">; rel=\"next\", <" \
+                              + self._get_page_uri("/api.github.com/search/repositories", query, "page", last_page) \
+                              + ">; rel=\"last\""
+        return {"total_count": self.search_results, "incomplete_results": False, "items": items}
+
+    @staticmethod
+    def _get_page_uri(path, query, parameter, page):
+        return path + "?" + urllib.parse.urlencode({**query, parameter: page})
+
+    def _get_commit(self, repo_name, sha):
+        seed = MockAPI._get_seed(repo_name, sha)
+        author = {"name": "Author " + str(seed % 50), "email": "author" + str(seed % 50) + "@example.com",
+                  "date": "2018-%02d-%02dT12:00:00Z" % (seed % 12 + 1, seed % 28 + 1)}
+        return {
+            "sha": sha,
+            "url": "https://api.github.com/repos/" + repo_name + "/commits/" + sha,
+            "html_url": "https://github.com/" + repo_name + "/commit/" + sha,
+            "commit": {"author": author, "committer": author, "message": "Commit message " + str(seed)},
+            "author": {"login": "author" + str(seed % 50)},
+            "repository": self._get_repo(repo_name)
+        }
+
+    def _github_commits(self, query, headers, repo_name):
+        return [self._get_commit(repo_name, "%040x" % MockAPI._get_seed(repo_name, index))
+                for index in range(self.list_size)]
+
+    def _github_commit(self, query, headers, repo_name, sha):
+        commit = self._get_commit(repo_name, sha)
+        commit["files"] = [{
+            "filename": "src/File" + str(index) + ".java",
+            "status": "modified",
+            "patch": "@@ -1,3 +1,4 @@\n public class File" + str(index) + " {\n+    int x = " + str(index) + ";\n }"
+        } for index in range(10)]
+        return commit
+
+    def _github_search_commits(self, query, headers):
+        page = self._get_page(query, "page", 1)
+        per_page = self._get_page(query, "per_page", 30)
+        start = (page - 1) * per_page
+        items = [self._get_commit("user" + str(index % 10) + "/repo" + str(index % 10), "%040x" % index)
+                 for index in range(start, min(start + per_page, self.search_results))]
+        return {"total_count": self.search_results, "incomplete_results": False, "items": items}
+
+    def _raw_file(self, query, headers, path):
+        line = ("// " + path + "\n").encode("utf8")
+        return (line * (self.raw_size // len(line) + 1))[:self.raw_size]
+
+    def _twitter_search(self, query, headers):
+        conversation_id = query.get("query", "").split(":")[-1]
+        tweets = []
+        for index in range(self.list_size):
+            seed = MockAPI._get_seed(conversation_id, index)
+            tweets.append({
+                "id": str(seed), "conversation_id": conversation_id, "author_id": str(seed % 1000),
+                "created_at": "2020-12-01T12:00:00.000Z", "in_reply_to_user_id": str(seed % 997),
+                "referenced_tweets": [{"type": "replied_to", "id": conversation_id}],
+                "text": "Reply  " + str(index) + "\nto the conversation " + conversation_id,
+                "possibly_sensitive": False,
+                "public_metrics": {"retweet_count": seed % 7, "reply_count": seed % 5, "like_count": seed % 11,
+                                   "quote_count": seed % 3}
+            })
+        users = [{"id": str(index), "username": "user" + str(index), "name": "User " + str(index),
+                  "url": "", "location": "", "description": "Description\nof user " + str(index),
+                  "created_at": "2010-01-01T00:00:00.000Z", "verified": False,
+                  "public_metrics": {"followers_count": index, "following_count": index, "tweet_count": index,
+                                     "listed_count": 0}} for index in range(min(self.list_size, 10))]
+        return {"data": tweets, "includes": {"users": users, "tweets": tweets[:1]},
+                "meta": {"result_count": len(tweets)}}
+
+    def _dblp_search(self, query, headers):
+        venue = query.get("q", "")
+        hits = []
+        for index in range(self.list_size):
+            seed = MockAPI._get_seed(venue, index)
+            first_page = seed % 500 + 1
+            authors = ["Author " + str(seed % 100) + " 0001", "Author " + str(seed % 77)]
+            hits.append({"@score": "1", "@id": str(seed), "info": {
+                "authors": {"author": authors if index % 4 else authors[0]},
+                "title": "Paper &amp; Title " + str(index) + ".",
+                "venue": "ICSE", "pages": str(first_page) + "-" + str(first_page + seed % 12), "year": "2018",
+                "type": "Conference and Workshop Papers", "key": "conf/icse/" + str(seed),
+                "doi": "10.1145/" + str(seed), "ee": "https://doi.org/10.1145/" + str(seed),
+                "url": "https://dblp.org/rec/conf/icse/" + str(seed)
+            }})
+        return {"result": {"query": venue, "status": {"@code": "200", "text": "OK"},
+                           "hits": {"@total": str(len(hits)), "@computed": str(len(hits)), "@sent": str(len(hits)),
+                                    "@first": "0", "hit": hits}}}
+
+    def _google_search(self, query, headers):
+        start = self._get_page(query, "start", 1)
+        items = [{"kind": "customsearch#result", "title": "Result " + str(index) + " for " + query.get("q", ""),
+                  "link": "https://example.com/" + str(MockAPI._get_seed(query.get("q", ""), index)),
+                  "snippet": "Snippet " + str(index)}
+                 for index in range(start, min(start + 10, self.google_results + 1))]
+        request = {"totalResults": str(self.google_results), "count": len(items), "startIndex": start}
+        queries = {"request": [request]}
+        if start + 10 <= self.google_results:
+            queries["nextPage"] = [{**request, "startIndex": start + 10}]
+        return {"kind": "customsearch#search", "queries": queries, "items": items}
+
+    def _stackexchange_answer(self, query, headers, answer_id):
+        answer = json.loads(json.dumps(self.so_answer))
+        for item in answer.get("items", []):
+            item["answer_id"] = int(answer_id) if answer_id.isdigit() else answer_id
+        return answer
+
+    def _airbnb(self, query, headers, kind, entity_id):
+        seed = MockAPI._get_seed(kind, entity_id)
+        if kind == "users":
+            return {"user": {"id": int(entity_id), "first_name": "Host " + str(seed % 100),
+                             "listings_count": seed % 5, "reviewee_count": seed % 50, "created_at": "2015-01-01"}}
+        return {"listing": {"id": int(entity_id), "city": "Berlin", "price": seed % 200, "bedrooms": seed % 4,
+                            "reviews_count": seed % 70, "user_id": seed % 10000}}
+
+    def get_stats(self):
+        """
+        Get the number of requests, status codes, and bytes sent so far.
+        :return: Dictionary with the statistics.
+        """
+        with self.lock:
+            return {"requests": self.requests, "status_codes": dict(self.status_codes), "bytes_sent": self.bytes_sent}
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """
+    HTTP server for the mock API (one thread per connection, keep-alive enabled).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, api, port=0):
+        """
+        Create the server (bound to localhost).
+        :param api: Object of class MockAPI.
+        :param port: Port to listen on (default: 0, meaning any free port).
+        """
+        super().__init__(("127.0.0.1", port), MockAPIRequestHandler)
+        self.api = api
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def get_uri(self, uri):
+        """
+        Rewrite a URI of a simulated API to the mock server.
+        :param uri: URI (or URI template), e.g., https://api.github.com/repos/{repo_name}.
+        :return: The rewritten URI, e.g., http://127.0.0.1:<port>/api.github.com/repos/{repo_name}.
+        """
+        return re.sub(r'^https?://', "http://127.0.0.1:" + str(self.port) + "/", uri)
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MockAPIRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        uri = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(uri.query, keep_blank_values=True))
+        status, headers, body = self.server.api.handle(urllib.parse.unquote(uri.path), query, self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def get_argument_parser():
+    arg_parser = argparse.ArgumentParser(description='Local stand-in for the APIs used in config/.')
+    arg_parser.add_argument('-p', '--port', type=int, default=8080, help='port (default: 8080)', dest='port')
+    arg_parser.add_argument('-lm', '--latency-median', type=float, default=DEFAULT_LATENCY_MEDIAN,
+                            help='median latency in ms (default: ' + str(DEFAULT_LATENCY_MEDIAN) + ')',
+                            dest='latency_median')
+    arg_parser.add_argument('-ls', '--latency-sigma', type=float, default=DEFAULT_LATENCY_SIGMA,
+                            help='standard deviation of the log-normal latency distribution (default: '
+                                 + str(DEFAULT_LATENCY_SIGMA) + ')', dest='latency_sigma')
+    arg_parser.add_argument('-er', '--error-rate', type=float, default=DEFAULT_ERROR_RATE,
+                            help='fraction of requests answered with 429 (default: ' + str(DEFAULT_ERROR_RATE) + ')',
+                            dest='error_rate')
+    arg_parser.add_argument('-rl', '--rate-limit', type=int, default=DEFAULT_RATE_LIMIT,
+                            help='requests per rate limit window and key (default: ' + str(DEFAULT_RATE_LIMIT) + ')',
+                            dest='rate_limit')
+    arg_parser.add_argument('-rlw', '--rate-limit-window', type=int, default=DEFAULT_RATE_LIMIT_WINDOW,
+                            help='length of the rate limit window in seconds (default: '
+                                 + str(DEFAULT_RATE_LIMIT_WINDOW) + ')', dest='rate_limit_window')
+    return arg_parser
+
+
+def create_api(args):
+    """
+    Create the mock API from the parsed command line arguments (see get_argument_parser).
+    """
+    return MockAPI(args.latency_median, args.latency_sigma, args.error_rate, args.rate_limit, args.rate_limit_window)
+
+
+def main():
+    args = get_argument_parser().parse_args()
+    server = MockAPIServer(create_api(args), args.port)
+    print("Mock API listening on http://127.0.0.1:" + str(server.port) + "/<host>/<path>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark for rendering URIs: renders URIs using the URI template of an entity configuration and creates entities
+(which render their URI and copy their parameters). Usage (from the root directory of the repository):
+    python3 benchmark/uri_rendering.py -n 10000000 -e 1000000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retriever.entity import Entity  # noqa: E402
+from retriever.entity_configuration import EntityConfiguration  # noqa: E402
+
+# number of distinct parameter values that are rendered repeatedly
+DISTINCT_VALUES = 1000
+
+
+def get_configuration():
+    """
+    Create an entity configuration with input parameters, a range variable, and an API key.
+    :return: Object of class EntityConfiguration.
+    """
+    return EntityConfiguration("benchmark", {
+        "input_parameters": ["repo_name", "path", "branch"],
+        "ignore_input_duplicates": False,
+        "uri_template": "https://api.github.com/repos/{repo_name}/contents/{path}?ref={branch}&page={page|1;11;1}"
+                        "&access_token={api_key_1}",
+        "api_keys": ["0123456789abcdef0123456789abcdef01234567"],
+        "headers": {},
+        "delay": [0, 0],
+        "pre_request_callbacks": [],
+        "pre_request_callback_filter": False,
+        "output_parameter_mapping": {"content": ["content"]},
+        "post_request_callbacks": [],
+        "post_request_callback_filter": False,
+        "flatten_output": False,
+        "chained_request": {},
+        "log_uri": False
+    })
+
+
+def get_values():
+    """
+    Create values for the input parameters and the range variable.
+    :return: List with dictionaries.
+    """
+    return [{
+        "repo_name": "user" + str(i) + "/repo" + str(i),
+        "path": "src/main/java/File" + str(i) + ".java",
+        "branch": "master",
+        "page": str(i % 10 + 1)
+    } for i in range(DISTINCT_VALUES)]
+
+
+def report(name, count, seconds):
+    print(name.ljust(20) + str(count).rjust(10) + " in " + ("%.2f" % seconds).rjust(6) + " s, "
+          + ("%.0f" % (count / seconds)).rjust(9) + " per second")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Measure the time needed to render URIs.')
+    arg_parser.add_argument('-n', '--uris', type=int, default=10000000, help='number of URIs to render', dest='uris')
+    arg_parser.add_argument('-e', '--entities', type=int, default=1000000, help='number of entities to create',
+                            dest='entities')
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    configuration = get_configuration()
+    uri_template = configuration.uri_template
+    values = get_values()
+    values_with_keys = [{**value, "api_key_1": configuration.api_keys[0]} for value in values]
+
+    # render URIs directly
+    start = time.perf_counter()
+    for repetition in range(args.uris // DISTINCT_VALUES):
+        for value in values_with_keys:
+            uri_template.replace_variables(value)
+    report("URIs", args.uris // DISTINCT_VALUES * DISTINCT_VALUES, time.perf_counter() - start)
+
+    # create entities (range entities, like EntityList._create_range_entity)
+    start = time.perf_counter()
+    for repetition in range(args.entities // DISTINCT_VALUES):
+        for value in values:
+            Entity(configuration, value, None)
+    report("entities", args.entities // DISTINCT_VALUES * DISTINCT_VALUES, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,9 +28,9 @@ def validate_code_block_normalization(entity):
         code_block_normalized = str(entity.input_parameters["code_block_normalized"])
 
         if normalize_java(code_block) == code_block_normalized:
-            logger.info("Normalization successfully validated for entity " + str(entity))
+            logger.info("Normalization successfully validated for entity %s", entity)
         else:
-            logger.error("Validation of normalization failed for entity " + str(entity))
+            logger.error("Validation of normalization failed for entity %s", entity)
 
     except KeyError as e:
         raise IllegalConfigurationError("Input parameter missing: " + str(e))
@@ -55,7 +55,9 @@ def check_if_next_page_exists(entity):
     next_page_exists =  entity.predecessor.json_response and "nextPage" in entity.predecessor.json_response["queries"]
 
     if not next_page_exists:
-        logger.info("Last result page reached for entity " + str(entity) + ".")
+        logger.info("Last result page reached for entity %s.", entity)
+        # do not create entities for the remaining pages
+        entity.stop_expansion()
 
     return next_page_exists
 
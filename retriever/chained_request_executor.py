@@ -0,0 +1,237 @@
+import asyncio
+import logging
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+
+class ChainedRequestTask(object):
+    """
+    Chain of entities of one level of chained requests (see EntityList._get_chains), together with the tasks for the
+    chained requests of its entities.
+    """
+
+    def __init__(self, level, chain):
+        """
+        Initialize a task.
+        :param level: Index of the level of chained requests (0 for the entities read from the input file).
+        :param chain: List of entities that depend on their predecessor.
+        """
+        self.level = level
+        self.chain = chain
+        # retrieved entities of the chain (filtered and flattened if configured)
+        self.entities = None
+        # tasks for the chained requests, one list per retrieved entity
+        self.children = []
+
+
+class ChainedRequestExecutor(object):
+    """
+    Pipelined executor for chained requests. The chained requests of an entity are scheduled as soon as the data for
+    the entity has been retrieved, such that requests of different levels are in flight at the same time (instead of
+    waiting for all entities of a level before starting the next one). Chained requests can be nested, e.g.,
+    commits -> files of a commit -> raw file. Each entity is retrieved exactly once; when choosing the next chain,
+    the workers prefer deeper levels, which keeps the number of pending entities small.
+    The retrieved entities of each level are kept in the order of their parents.
+    """
+
+    def __init__(self, entities, config_dir):
+        """
+        Read the configurations of all levels of chained requests.
+        :param entities: Entity list (object of class EntityList) with a configured chained request.
+        :param config_dir: Path to directory with entity configurations as JSON files.
+        """
+        # entity lists providing configuration, transport, and journal for each level
+        self.levels = [entities]
+        names = {entities.configuration.name}
+        while self.levels[-1].configuration.chained_request_name:
+            chained_request_name = self.levels[-1].configuration.chained_request_name
+            if chained_request_name in names:
+                logger.error("Chained request <" + str(chained_request_name) + "> of configuration <"
+                             + str(self.levels[-1].configuration.name) + "> would create a cycle and is ignored.")
+                break
+            names.add(chained_request_name)
+            self.levels.append(self.levels[-1].create_chained_request_list(config_dir))
+
+        self.workers = entities.workers
+        self.engine = entities.engine
+        self.transport = entities.transport
+
+        # tasks that are ready to be retrieved, one queue per level
+        self.ready = None
+        # number of retrieved and restored chains per level
+        self.retrieved = None
+        self.restored = None
+
+    def execute(self, entities):
+        """
+        Retrieve data for the entities in a list and for all levels of their chained requests.
+        :param entities: Entity list (object of class EntityList) with the entities to retrieve; it is updated with
+            the retrieved entities (filtered and flattened if configured).
+        :return: Entity list with the retrieved entities of the last level of chained requests.
+        """
+        logger.info("Executing " + str(len(self.levels) - 1) + " level(s) of chained requests...")
+
+        self.ready = [deque() for _ in self.levels]
+        self.retrieved = [0] * len(self.levels)
+        self.restored = [0] * len(self.levels)
+
+        with self.transport.profiler.phase("resolve_range_vars"):
+            entities.resolve_range_vars()
+        tasks = [ChainedRequestTask(0, chain) for chain in entities._get_chains()]
+        for task in tasks:
+            self._schedule(task)
+
+        if self.engine == "asyncio":
+            self.transport.run_async(self._execute_async(), self.workers)
+        else:
+            self._execute_concurrently()
+
+        for index, level in enumerate(self.levels):
+            if self.restored[index] > 0:
+                logger.info("Restored " + str(self.restored[index]) + " of "
+                            + str(self.restored[index] + self.retrieved[index]) + " chains of entities of <"
+                            + str(level.configuration.name) + "> from journal.")
+
+        entities.entities = list(ChainedRequestExecutor._collect(tasks, 0))
+        chained_request_entities = self.levels[-1].create_window(
+            list(ChainedRequestExecutor._collect(tasks, len(self.levels) - 1))
+        )
+        logger.info("Data for " + str(len(chained_request_entities.entities)) + " chained request entities has been "
+                    + "saved.")
+        return chained_request_entities
+
+    def _schedule(self, task):
+        """
+        Restore a task from the journal (if resuming) or add it to the tasks that are ready to be retrieved.
+        :param task: Object of class ChainedRequestTask.
+        """
+        journal = self.levels[task.level].journal
+        if journal is not None:
+            results = journal.restore(task.chain)
+            if results is not None:
+                self.restored[task.level] += 1
+                self._complete(task, results)
+                return
+        self.ready[task.level].append(task)
+        self.transport.metrics.add_chains(self.levels[task.level].configuration.name, 1)
+
+    def _next_task(self):
+        """
+        Get the next task to retrieve, preferring deeper levels.
+        :return: Object of class ChainedRequestTask, None if no task is ready.
+        """
+        for ready in reversed(self.ready):
+            if ready:
+                return ready.popleft()
+        return None
+
+    def _complete(self, task, results):
+        """
+        Filter and flatten the retrieved entities of a task and schedule their chained requests.
+        :param task: Object of class ChainedRequestTask.
+        :param results: List with the return values of entity.retrieve_data.
+        """
+        level = self.levels[task.level]
+        configuration = level.configuration
+
+        # filter entities according to the return value of entity.retrieve_data (see EntityList.retrieve_data)
+        task.entities = [entity for entity, result in zip(task.chain, results)
+                         if result or not configuration.post_request_callback_filter]
+        if configuration.flatten_output:
+            task.entities = level.flatten_entities(task.entities)
+
+        if task.level + 1 == len(self.levels):
+            return
+
+        chained_request_level = self.levels[task.level + 1]
+        for entity in task.entities:
+            window = chained_request_level.create_window(
+                entity.get_chained_request_entities(chained_request_level.configuration)
+            )
+            window.resolve_range_vars()
+            children = [ChainedRequestTask(task.level + 1, chain) for chain in window._get_chains()]
+            task.children.append(children)
+            for child in children:
+                self._schedule(child)
+
+    def _execute_concurrently(self):
+        """
+        Retrieve the scheduled tasks using a pool of worker threads that share the session of the transport.
+        At most one task per worker is submitted, such that tasks scheduled later (chained requests) are not queued
+        behind all tasks of the previous level.
+        """
+        logger.info("Retrieving data using " + str(self.workers) + " workers...")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = dict()
+            while True:
+                while len(futures) < self.workers:
+                    task = self._next_task()
+                    if task is None:
+                        break
+                    futures[executor.submit(self.levels[task.level]._retrieve_chain, task.chain, executor)] = task
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = futures.pop(future)
+                    self.retrieved[task.level] += 1
+                    self._complete(task, future.result())
+
+    async def _execute_async(self):
+        """
+        Retrieve the scheduled tasks using worker coroutines that share the aiohttp session of the transport.
+        """
+        logger.info("Retrieving data using the asyncio engine with " + str(self.workers) + " workers...")
+        condition = asyncio.Condition()
+        # number of tasks being retrieved (their chained requests may still be scheduled)
+        active = 0
+        # requests of all levels (including pages retrieved in parallel) share the slots of the workers
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def worker():
+            nonlocal active
+            while True:
+                async with condition:
+                    task = self._next_task()
+                    while task is None and active > 0:
+                        await condition.wait()
+                        task = self._next_task()
+                    if task is None:
+                        return
+                    active += 1
+
+                results = await self.levels[task.level]._retrieve_chain_async(task.chain, semaphore)
+
+                async with condition:
+                    active -= 1
+                    self.retrieved[task.level] += 1
+                    self._complete(task, results)
+                    condition.notify_all()
+
+        await asyncio.gather(*[worker() for _ in range(self.workers)])
+
+    @staticmethod
+    def _collect(tasks, level):
+        """
+        Collect the retrieved entities of a level in the order of their parents.
+        :param tasks: List of tasks.
+        :param level: Index of the level.
+        :return: Generator yielding entities.
+        """
+        for task in tasks:
+            if task.level == level:
+                yield from task.entities
+            else:
+                for children in task.children:
+                    yield from ChainedRequestExecutor._collect(children, level)
+
+    def close(self):
+        """
+        Close the journals of the chained requests.
+        """
+        for level in self.levels[1:]:
+            level.close_journal()
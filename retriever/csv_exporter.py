@@ -0,0 +1,219 @@
+import codecs
+import csv
+import io
+import logging
+import os
+
+from util.log import Truncated
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# number of rows encoded and written at once
+BATCH_SIZE = 1000
+
+# columns with information about the retrieval of an entity (exported if configured)
+META_COLUMNS = {
+    "_uri": lambda entity: entity.uri,
+    "_attempts": lambda entity: entity.attempts
+}
+
+
+class CsvExporter(object):
+    """
+    Incremental exporter that writes entities to a CSV file as they are produced.
+    The columns are either declared using the optional property "output_columns" of the entity configuration or
+    derived from the input parameters and the output parameter mapping.
+    If callbacks add or remove output parameters (in the latter case, the column is removed if the parameter is
+    missing for at least one entity), added parameters are spilled into additional columns at the end of each row
+    and the file is rewritten once with the final header when the exporter is closed.
+    """
+
+    def __init__(self, file_path, delimiter, configuration):
+        """
+        Create the CSV file and write its header.
+        :param file_path: Path to the CSV file.
+        :param delimiter: Column delimiter in CSV file (typically ',').
+        :param configuration: The entity configuration (object of class EntityConfiguration).
+        """
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.file_path = file_path
+        self.delimiter = delimiter
+        self.configuration = configuration
+
+        # input parameters that are also output parameters (validated while exporting)
+        output_parameters = configuration.output_parameter_mapping.keys()
+        self.validation_parameters = [parameter for parameter in configuration.input_parameters
+                                      if parameter in output_parameters]
+
+        # meta columns, e.g., ["_uri", "_attempts"]
+        meta_columns = []
+        if configuration.log_uri:
+            meta_columns.append("_uri")
+        if configuration.log_attempts:
+            meta_columns.append("_attempts")
+
+        # columns are fixed if they have been declared
+        self.declared = configuration.output_columns is not None
+        if self.declared:
+            columns = list(configuration.output_columns)
+            columns += [column for column in meta_columns if column not in columns]
+        else:
+            columns = configuration.input_parameters + [
+                parameter for parameter in output_parameters if parameter not in self.validation_parameters
+            ] + meta_columns
+
+        # columns of the rows in the file, parameters added by callbacks are appended
+        self.columns = columns
+        # output parameters expected for each entity, parameters added by callbacks, and parameters missing for at
+        # least one entity (only tracked if the columns have not been declared)
+        self.expected_parameters = set(output_parameters)
+        self.parameters_added = []
+        self.parameters_removed = set()
+        # precompiled projection of entities to rows
+        self.meta_indices = []
+        self._compile()
+
+        self.exported = 0
+        # write UTF8-encoded CSV file (see also http://stackoverflow.com/a/844443)
+        self.file = codecs.open(file_path, 'w', encoding='utf8')
+        self.writer = csv.writer(self.file, delimiter=delimiter)
+        self.writer.writerow(self.columns)
+
+    def _compile(self):
+        """
+        Compile the projection of entities to rows for the current columns.
+        """
+        self.meta_indices = [(index, META_COLUMNS[column]) for index, column in enumerate(self.columns)
+                             if column in META_COLUMNS]
+
+    def write(self, entities):
+        """
+        Append entities to the CSV file.
+        :param entities: List of entities.
+        """
+        for start in range(0, len(entities), BATCH_SIZE):
+            self._write_batch(entities[start:start + BATCH_SIZE])
+
+    def _write_batch(self, entities):
+        """
+        Project a batch of entities to rows and append them to the CSV file.
+        :param entities: List of entities.
+        """
+        columns = self.columns
+        meta_indices = self.meta_indices
+        rows = []
+
+        for entity in entities:
+            output_parameters = entity.output_parameters
+            input_parameters = entity.input_parameters
+
+            if not self.declared and output_parameters.keys() != self.expected_parameters:
+                # output parameter added and/or removed by a callback function
+                self._update_columns(output_parameters)
+                columns = self.columns
+                meta_indices = self.meta_indices
+
+            for parameter in self.validation_parameters:
+                self._validate(entity, parameter)
+
+            row = [output_parameters[column] if column in output_parameters else input_parameters.get(column)
+                   for column in columns]
+            for index, getter in meta_indices:
+                row[index] = getter(entity)
+            rows.append(row)
+
+        self._write_rows(entities, rows)
+        self.exported += len(rows)
+
+    def _update_columns(self, output_parameters):
+        """
+        Update the columns if a callback added or removed output parameters.
+        :param output_parameters: Output parameters of an entity.
+        """
+        self.parameters_removed.update(self.expected_parameters.difference(output_parameters.keys()))
+        for parameter in output_parameters.keys():
+            if parameter not in self.expected_parameters and parameter not in self.parameters_added:
+                self.parameters_added.append(parameter)
+                # spill added parameter into a new column (the header is fixed when the exporter is closed)
+                self.columns = self.columns + [parameter]
+                self._compile()
+
+    def _write_rows(self, entities, rows):
+        """
+        Write rows to the CSV file in bulk. If a row cannot be encoded, the rows are written one by one,
+        skipping rows that cannot be encoded.
+        :param entities: List of entities corresponding to the rows.
+        :param rows: List of rows.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=self.delimiter).writerows(rows)
+        try:
+            self.file.write(buffer.getvalue())
+        except UnicodeEncodeError:
+            for entity, row in zip(entities, rows):
+                try:
+                    self.writer.writerow(row)
+                except UnicodeEncodeError:
+                    logger.error("Encoding error while writing data for entity: %s", entity)
+        self.file.flush()
+
+    @staticmethod
+    def _validate(entity, parameter):
+        """
+        Validate that the retrieved value of a parameter matches its input value.
+        :param entity: The entity.
+        :param parameter: Parameter that is both input and output parameter.
+        """
+        if entity.output_parameters.get(parameter):
+            if str(entity.input_parameters[parameter]) == str(entity.output_parameters[parameter]):
+                logger.info("Validation of parameter %s successful for entity %s.", parameter, entity)
+            else:
+                logger.error("Validation of parameter %s failed for entity %s: Expected: %s, Actual: %s. "
+                             "Retrieved value will be exported.", parameter, entity,
+                             Truncated(entity.input_parameters[parameter]),
+                             Truncated(entity.output_parameters[parameter]))
+        else:
+            logger.error("Validation of parameter %s failed for entity %s: Empty value.", parameter, entity)
+
+    def close(self):
+        """
+        Close the CSV file, rewrite it with the final header if callbacks added or removed output parameters.
+        """
+        self.file.close()
+
+        if self.parameters_added or self.parameters_removed:
+            self._rewrite()
+
+        logger.info(str(self.exported) + ' entities have been exported.')
+
+    def _rewrite(self):
+        """
+        Rewrite the CSV file with the final columns: columns of removed parameters are dropped, columns of added
+        parameters are moved before the meta columns.
+        """
+        logger.info("Output parameters have been added or removed by callbacks, rewriting " + self.file_path + "...")
+
+        final_columns = [column for column in self.columns
+                         if column not in self.parameters_removed and column not in META_COLUMNS
+                         and column not in self.parameters_added]
+        final_columns += self.parameters_added
+        final_columns += [column for column in self.columns if column in META_COLUMNS]
+        indices = [self.columns.index(column) for column in final_columns]
+
+        temp_path = self.file_path + ".tmp"
+        with codecs.open(self.file_path, encoding='utf8') as source, \
+                codecs.open(temp_path, 'w', encoding='utf8') as target:
+            reader = csv.reader(source, delimiter=self.delimiter)
+            writer = csv.writer(target, delimiter=self.delimiter)
+            # skip preliminary header
+            next(reader, None)
+            writer.writerow(final_columns)
+            for row in reader:
+                # rows written before a parameter was added are shorter
+                row += [""] * (len(self.columns) - len(row))
+                writer.writerow([row[index] for index in indices])
+        os.replace(temp_path, self.file_path)
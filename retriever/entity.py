@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import time
@@ -6,71 +7,100 @@ from random import randint
 from _socket import gaierror
 
 import os
-from collections import OrderedDict
+import requests
+import urllib.parse
 
 from urllib3.exceptions import MaxRetryError, NewConnectionError
 
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only required for the asyncio engine
+    aiohttp = None
+
+from retriever.filter_path import FilterPath
+from retriever.pagination import Pagination, LINK_PAGINATION
+from retriever.raw_download import RawDownload, RAW_CHUNK_SIZE
+from retriever.response_cache import ResponseCache
 from util.exceptions import IllegalArgumentError, IllegalConfigurationError
+from util.log import Truncated
 from util.regex import FLATTEN_OPERATOR_REGEX
 
 # get root logger
 logger = logging.getLogger('api-retriever_logger')
 
+# connection errors (e.g., connection resets) that are retried according to the retry policy
+CONNECTION_ERRORS = (gaierror,
+                     ConnectionError,
+                     MaxRetryError,
+                     NewConnectionError,
+                     requests.exceptions.ConnectionError,
+                     requests.exceptions.ChunkedEncodingError,
+                     requests.exceptions.Timeout)
+ASYNC_CONNECTION_ERRORS = (aiohttp.ClientConnectionError,
+                           aiohttp.ClientPayloadError,
+                           asyncio.TimeoutError) if aiohttp else ()
+
 
 class Entity(object):
     """
     Class representing one API entity for which information should be retrieved over an API.
+    Entities use slots and plain dicts (which preserve the insertion order), because a run may keep millions of them
+    in memory.
     """
 
-    def __init__(self, configuration, input_parameter_values, predecessor):
+    __slots__ = ("configuration", "input_parameters", "output_parameters", "uri", "predecessor", "root_entity",
+                 "expansion_stopped", "json_response", "next_uri", "attempts", "key_removed")
+
+    def __init__(self, configuration, input_parameter_values, predecessor, uri=None):
         """
         To initialize an entity, a corresponding entity configuration together
         and values for the input parameter(s) are needed.
         :param configuration: an object of class EntityConfiguration
         :param input_parameter_values: A dictionary with values for the input parameters defined in the configuration.
         :param predecessor: predecessor in entity list
+        :param uri: URI of the entity (default: None, meaning that it is rendered using the URI template)
         """
 
         # corresponding entity configuration
         self.configuration = configuration
-        # parameters needed to identify entity (or for validation)
-        self.input_parameters = OrderedDict.fromkeys(configuration.input_parameters)
         # parameters that should be retrieved using the API
-        self.output_parameters = OrderedDict.fromkeys(configuration.output_parameter_mapping.keys())
-        # destination path for raw download
-        self.destination = None
-
-        # set values for input parameters
-        for parameter in configuration.input_parameters:
-            if parameter in input_parameter_values:
-                self.input_parameters[parameter] = input_parameter_values[parameter]
-            else:
-                raise IllegalArgumentError("Illegal input parameter: " + parameter)
+        self.output_parameters = dict.fromkeys(configuration.output_parameter_mapping.keys())
 
-        # get uri for this entity from uri template in the configuration
-        uri_variable_values = {
-            **self.input_parameters
-        }
-
-        # add values for API keys
-        for i in range(0, len(self.configuration.api_keys)):
-            uri_variable_values["api_key_" + str(i+1)] = self.configuration.api_keys[i]
-
-        # set values for range variables
-        for range_var_name in configuration.range_vars:
-            if range_var_name not in input_parameter_values:
-                continue
-            uri_variable_values[range_var_name] = input_parameter_values[range_var_name]
-
-        self.uri = self.configuration.uri_template.replace_variables(uri_variable_values)
+        # parameters needed to identify entity (or for validation)
+        try:
+            self.input_parameters = {parameter: input_parameter_values[parameter]
+                                     for parameter in configuration.input_parameters}
+        except KeyError as e:
+            raise IllegalArgumentError("Illegal input parameter: " + str(e.args[0]))
+
+        if uri is None:
+            # get uri for this entity from uri template in the configuration (API keys are inserted when the
+            # configuration is loaded)
+            uri_variable_values = self.input_parameters
+            if configuration.range_vars:
+                # set values for range variables
+                uri_variable_values = dict(uri_variable_values)
+                for range_var_name in configuration.range_vars:
+                    if range_var_name in input_parameter_values:
+                        uri_variable_values[range_var_name] = input_parameter_values[range_var_name]
+            uri = configuration.uri_template.replace_variables(uri_variable_values)
+        self.uri = uri
 
         # set predecessor
         self.predecessor = predecessor
         # root entity is set if range variables are used
         self.root_entity = None
+        # set for root entities if no further entities should be created for its range variables
+        self.expansion_stopped = False
 
-        # store JSON response data (may be needed by callbacks)
+        # store JSON response data (may be needed by callbacks, released once the chain has been retrieved)
         self.json_response = None
+        # URI of the next page from the Link header of the response (if link pagination is configured)
+        self.next_uri = None
+        # number of attempts made to retrieve the data
+        self.attempts = 0
+        # an entity removes at most one key from the key pool (if all keys are rejected, the resource is the problem)
+        self.key_removed = False
 
     def equals(self, other_entity):
         """
@@ -89,186 +119,502 @@ class Entity(object):
                 return False
         return True
 
+    def get_key(self):
+        """
+        Get a hashable key for this entity according to its input parameters (needed to remove duplicates in constant
+        time). Two entities have the same key if they are equal according to the method equals.
+        :return: Tuple with the values of the input parameters (values that are not strings are serialized as JSON).
+        """
+        return tuple(value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+                     for value in self.input_parameters.values())
+
     def __str__(self):
-        return str(dict(self.input_parameters))  # cast OrderedDict to dict for a more compact string representation
+        return str(self.input_parameters)
+
+    def stop_expansion(self):
+        """
+        Stop the (lazy) expansion of the range variables of the root entity of this entity, i.e., do not create
+        entities for the remaining range values (e.g., because the last result page has been reached).
+        """
+        if self.root_entity is not None:
+            self.root_entity.expansion_stopped = True
+
+    def release(self):
+        """
+        Release the JSON response and the reference to the predecessor once no callback can need them anymore
+        (called after the chain of this entity has been retrieved, see EntityList._retrieve_chain).
+        """
+        self.json_response = None
+        self.predecessor = None
+
+    def create_page(self, uri):
+        """
+        Create an entity for the next page of this entity (see Pagination).
+        :param uri: URI of the next page.
+        :return: Entity with the same input parameters, having this entity as predecessor.
+        """
+        page = Entity(self.configuration, self.input_parameters, self, uri)
+        # pages are retrieved sequentially after the first page
+        page.root_entity = self if self.root_entity is None else self.root_entity
+        return page
+
+    def get_host(self):
+        """
+        Get the host of the URI of this entity (used as rate limit bucket).
+        :return: The network location of the URI.
+        """
+        return urllib.parse.urlsplit(self.uri).netloc
 
-    def retrieve_data(self, session):
+    def retrieve_data(self, transport):
         """
-        Retrieve information about entity using an existing session.
-        :param session: Requests session to use for data retrieval.
+        Retrieve information about entity using an existing transport.
+        :param transport: Transport (object of class Transport) to use for data retrieval.
         :return: True if data about entity has been successfully retrieved and no filter callback excluded this entity,
             False otherwise.
         """
 
         try:
-            logger.info("Retrieving data for entity " + str(self) + "...")
+            logger.info("Retrieving data for entity %s...", self)
 
             # execute pre_request_callbacks
-            for callback in self.configuration.pre_request_callbacks:
-                result = callback(self)
-                # if pre request filtering is enabled, apply filter
-                if self.configuration.pre_request_callback_filter and not result:
-                    return False
+            if not self._execute_pre_request_callbacks(transport):
+                return False
+
+            # retrieve data and return flag indicating successful request
+            return self._retrieve_data(transport)
 
-            # reduce request frequency as configured
-            delay = randint(self.configuration.delay_min,
-                            self.configuration.delay_max)  # delay between requests in milliseconds
-            time.sleep(delay / 1000)  # sleep for delay ms to prevent getting blocked
+        except CONNECTION_ERRORS:
+            transport.metrics.record_entity(self.configuration.name, False)
+            logger.error("An error occurred while retrieving data for entity  %s.", self)
+
+    async def retrieve_data_async(self, transport):
+        """
+        Retrieve information about entity using the aiohttp session of an existing transport (asyncio engine).
+        :param transport: Transport (object of class Transport) to use for data retrieval.
+        :return: True if data about entity has been successfully retrieved and no filter callback excluded this entity,
+            False otherwise.
+        """
+
+        try:
+            logger.info("Retrieving data for entity %s...", self)
+
+            # execute pre_request_callbacks
+            if not self._execute_pre_request_callbacks(transport):
+                return False
 
             # retrieve data and return flag indicating successful request
-            return self._retrieve_data(session, delay)
+            return await self._retrieve_data_async(transport)
 
-        except (gaierror,
-                ConnectionError,
-                MaxRetryError,
-                NewConnectionError):
-            logger.error("An error occurred while retrieving data for entity  " + str(self) + ".")
+        except ASYNC_CONNECTION_ERRORS:
+            transport.metrics.record_entity(self.configuration.name, False)
+            logger.error("An error occurred while retrieving data for entity  %s.", self)
 
-    def _retrieve_data(self, session, delay):
+    def _execute_pre_request_callbacks(self, transport):
+        """
+        Execute the configured pre_request_callbacks.
+        :param transport: Transport of the run (its profiler times the callbacks, its metrics count the entities
+            excluded by filter callbacks).
+        :return: False if pre request filtering is enabled and a callback excluded this entity, True otherwise.
         """
-        Retrieve data, handling "Too Many Requests" HTTP response ode
-        :param session: Session to use for the request(s).
-        :param delay: Delay until next request.
+        name = self.configuration.name
+        for callback in self.configuration.pre_request_callbacks:
+            result = transport.profiler.call_callback(name, callback, self)
+            # if pre request filtering is enabled, apply filter
+            if self.configuration.pre_request_callback_filter and not result:
+                transport.metrics.record_filtered(name, callback)
+                return False
+        return True
+
+    def _get_delay(self):
+        """
+        Get a random delay between two requests as configured
+        (used if the API does not send rate limit headers).
+        :return: Delay in milliseconds.
+        """
+        return randint(self.configuration.delay_min, self.configuration.delay_max)
+
+    def _retrieve_data(self, transport):
+        """
+        Retrieve data, sharing the response with entities that send an identical request (if configured).
+        :param transport: Transport to use for the request(s).
         :return: True if response was processed successfully, False otherwise.
         """
+        if transport.coalescer is None or self._uses_link_header() or self._streams_raw_download():
+            body = self._fetch(transport)
+        else:
+            body = transport.coalescer.fetch(self._get_request_key(), lambda: self._fetch(transport))
 
-        if len(self.configuration.headers) > 0:
-            response = session.get(self.uri, headers=self.configuration.headers)
+        return self._complete_retrieval(body, transport)
+
+    async def _retrieve_data_async(self, transport):
+        """
+        Retrieve data using aiohttp, sharing the response with entities that send an identical request
+        (if configured).
+        :param transport: Transport to use for the request(s).
+        :return: True if response was processed successfully, False otherwise.
+        """
+        if transport.coalescer is None or self._uses_link_header() or self._streams_raw_download():
+            body = await self._fetch_async(transport)
         else:
-            response = session.get(self.uri)
-
-        if response.ok:
-            logger.info("Successfully retrieved data for entity " + str(self) + ".")
-
-            if self.configuration.raw_download:
-                # raw download
-                self.output_parameters[self.configuration.raw_parameter] = response.content
-                # join path to destination file
-                dest_file = ""
-                for part in self.configuration.output_parameter_mapping["destination"]:
-                    if part not in self.input_parameters:
-                        raise IllegalConfigurationError("Destination parameter "
-                                                        + part
-                                                        + " not found in input parameters.")
-                    dest_file = os.path.join(dest_file, self.input_parameters[part])
-                self.output_parameters["destination"] = dest_file
+            body = await transport.coalescer.fetch_async(self._get_request_key(),
+                                                         lambda: self._fetch_async(transport))
+
+        return self._complete_retrieval(body, transport)
+
+    def _complete_retrieval(self, body, transport):
+        """
+        Record the result of the retrieval and process the response (if any).
+        :param body: The response body (None if the request failed).
+        :param transport: Transport used for the request(s).
+        :return: True if response was processed successfully, False otherwise.
+        """
+        metrics = transport.metrics
+        metrics.record_entity(self.configuration.name, body is not None)
+        if body is None:
+            return False
+
+        start = time.perf_counter()
+        result = self._process_response(body, transport)
+        metrics.record_processing(time.perf_counter() - start)
+        return result
+
+    def _uses_link_header(self):
+        """
+        Check if the Link header of the response is needed (link pagination). Such requests are not coalesced,
+        because only the response body is shared.
+        :return: True if link pagination is configured, False otherwise.
+        """
+        pagination = self.configuration.pagination
+        return pagination is not None and pagination.type == LINK_PAGINATION
+
+    def _streams_raw_download(self):
+        """
+        Check if the raw response content is streamed to a file while it is received (see RawDownload). Such
+        requests are neither cached nor coalesced, because the content is not kept in memory.
+        :return: True if raw download is configured and the output directory is known, False otherwise.
+        """
+        return self.configuration.raw_download and self.configuration.raw_dir is not None
+
+    def _get_request_key(self):
+        """
+        Get a key identifying the request for this entity (used to coalesce identical requests).
+        :return: Tuple with URI and configured headers.
+        """
+        return self.uri, json.dumps(self.configuration.headers, sort_keys=True)
+
+    def _fetch(self, transport):
+        """
+        Send the request for this entity, retrying "Too Many Requests", server errors, and connection errors
+        as configured.
+        :param transport: Transport to use for the request(s).
+        :return: The response body (bytes, or object of class RawDownload if the raw response content is streamed
+            to a file), None if the request failed.
+        """
+
+        streaming = self._streams_raw_download()
+        cache = None if streaming else transport.cache
+        cache_key, cached_response = self._lookup_cache(cache)
+        if cached_response is not None and cache.is_fresh(cached_response):
+            return self._use_cached_response(cache, cached_response, False, transport.metrics)
+
+        rate_limiter = transport.rate_limiter
+        metrics = transport.metrics
+        host = self.get_host()
+        while True:
+            self.attempts += 1
+            if self.attempts > 1:
+                metrics.record_retry(host)
+            uri, headers, bucket, api_key = self._prepare_request(rate_limiter, cached_response)
+            wait = self._get_wait(rate_limiter, bucket)
+            time.sleep(wait)
+            metrics.record_sleep(wait)
+            start = time.perf_counter()
+            try:
+                response = transport.get(uri, headers, streaming)
+                if streaming and response.ok:
+                    # write raw content to a temporary file while it is received
+                    rate_limiter.update(bucket, response.headers)
+                    download = RawDownload.download(self.configuration.raw_dir, response.iter_content(RAW_CHUNK_SIZE))
+                    metrics.record_response(host, time.perf_counter() - start, response.status_code, download.size)
+                    return download
+            except CONNECTION_ERRORS:
+                metrics.record_response(host, time.perf_counter() - start, None, 0)
+                if not self._check_retry():
+                    raise
             else:
-                # JSON API call
-                # deserialize JSON string
-                json_response = json.loads(response.text)
-                self.json_response = json_response
-                # extract parameters according to parameter mapping
-                self._extract_output_parameters(json_response)
-
-            # execute post_request_callbacks
-            for callback in self.configuration.post_request_callbacks:
-                result = callback(self)
-                # check if callback implements filter
-                if isinstance(result, bool):
-                    if not result:
-                        logger.info("Entity removed because of filter callback " + str(callback) + ": " + str(self))
-                        return False
-
-            return True
-
-        elif response.status_code == 429: # "Too Many Requests"
-            time.sleep(2 * delay / 1000)  # sleep longer than before
-            return self._retrieve_data(session, 2 * delay)
+                # the content has been read by the session (the request is not streamed)
+                metrics.record_response(host, time.perf_counter() - start, response.status_code,
+                                        len(response.content))
+                rate_limiter.update(bucket, response.headers)
+                if response.status_code == 304 and cached_response is not None:  # "Not Modified"
+                    return self._use_cached_response(cache, cached_response, True, metrics)
+                if response.ok:
+                    if self._uses_link_header():
+                        self.next_uri = Pagination.get_next_link(self.uri, response.headers.get("Link"))
+                    if cache is not None:
+                        cache.store(cache_key, response.headers, response.content)
+                    # JSON responses are decoded from the bytes as well (see JsonDecoder)
+                    return response.content
+                if not self._check_retry(response.status_code, response.headers, response.content, api_key):
+                    return None
+
+    async def _fetch_async(self, transport):
+        """
+        Send the request for this entity using aiohttp, retrying "Too Many Requests", server errors,
+        and connection errors as configured.
+        :param transport: Transport to use for the request(s).
+        :return: The response body (bytes, or object of class RawDownload if the raw response content is streamed
+            to a file), None if the request failed.
+        """
+
+        streaming = self._streams_raw_download()
+        cache = None if streaming else transport.cache
+        cache_key, cached_response = self._lookup_cache(cache)
+        if cached_response is not None and cache.is_fresh(cached_response):
+            return self._use_cached_response(cache, cached_response, False, transport.metrics)
+
+        rate_limiter = transport.rate_limiter
+        metrics = transport.metrics
+        host = self.get_host()
+        while True:
+            self.attempts += 1
+            if self.attempts > 1:
+                metrics.record_retry(host)
+            uri, headers, bucket, api_key = self._prepare_request(rate_limiter, cached_response)
+            wait = self._get_wait(rate_limiter, bucket)
+            await asyncio.sleep(wait)
+            metrics.record_sleep(wait)
+            start = time.perf_counter()
+            try:
+                async with transport.get_async(uri, headers) as response:
+                    rate_limiter.update(bucket, response.headers)
+                    if response.ok and streaming:
+                        # write raw content to a temporary file while it is received
+                        download = await RawDownload.download_async(self.configuration.raw_dir,
+                                                                    response.content.iter_chunked(RAW_CHUNK_SIZE))
+                        metrics.record_response(host, time.perf_counter() - start, response.status, download.size)
+                        return download
+                    content = await response.read()
+                    metrics.record_response(host, time.perf_counter() - start, response.status, len(content))
+                    if response.status == 304 and cached_response is not None:  # "Not Modified"
+                        return self._use_cached_response(cache, cached_response, True, metrics)
+                    if response.ok:
+                        if self._uses_link_header():
+                            self.next_uri = Pagination.get_next_link(self.uri, response.headers.get("Link"))
+                        if cache is not None:
+                            cache.store(cache_key, response.headers, content)
+                        # JSON responses are decoded from the bytes as well (see JsonDecoder)
+                        return content
+                    if not self._check_retry(response.status, response.headers, content, api_key):
+                        return None
+            except ASYNC_CONNECTION_ERRORS:
+                metrics.record_response(host, time.perf_counter() - start, None, 0)
+                if not self._check_retry():
+                    raise
+
+    def _lookup_cache(self, cache):
+        """
+        Look up the response for this entity in the response cache.
+        :param cache: The response cache (None if no cache is configured).
+        :return: Tuple with cache key and cached response (both None if not available).
+        """
+        if cache is None:
+            return None, None
+        cache_key = ResponseCache.get_key(self.uri, self.configuration.headers)
+        return cache_key, cache.lookup(cache_key)
+
+    def _use_cached_response(self, cache, cached_response, revalidated, metrics):
+        """
+        Use a response from the response cache.
+        :param cache: The response cache.
+        :param cached_response: The cached response (object of class CachedResponse).
+        :param revalidated: True if the server confirmed that the cached response did not change.
+        :param metrics: Metrics of the run, counting the responses used from the cache.
+        :return: The cached response body.
+        """
+        metrics.record_cached(self.get_host())
+        if revalidated:
+            cache.touch(cached_response, True)
+        if self._uses_link_header():
+            self.next_uri = Pagination.get_next_link(self.uri, cached_response.link)
+        logger.info("Using cached response for entity %s.", self)
+        return cached_response.body
+
+    def _prepare_request(self, rate_limiter, cached_response):
+        """
+        Prepare the next request, selecting the least-exhausted API key if a key pool is configured.
+        :param rate_limiter: Rate limiter that knows the rate limit state of each key.
+        :param cached_response: Cached response to revalidate (None if not available).
+        :return: Tuple with URI, headers, rate limit bucket, and selected API key (None if no key pool is configured).
+        """
+        host = self.get_host()
+        key_pool = self.configuration.key_pool
+        if key_pool is None:
+            uri, headers, bucket, api_key = self.uri, self.configuration.headers, host, None
+        else:
+            api_key = key_pool.acquire(rate_limiter, host)
+            uri, headers = key_pool.apply(api_key, self.uri, self.configuration.headers)
+            bucket = key_pool.get_bucket(host, api_key)
+
+        if cached_response is not None:
+            headers = cached_response.add_validators(headers)
+
+        return uri, headers, bucket, api_key
+
+    def _get_wait(self, rate_limiter, bucket):
+        """
+        Get the time to wait before the current attempt.
+        Before the first attempt, the request frequency is reduced according to the rate limit headers of the API
+        (or as configured). Before retries, exponential backoff with jitter is used,
+        or longer if requested by the API (Retry-After header or exhausted rate limit).
+        :param rate_limiter: Rate limiter that knows the rate limit state of the bucket.
+        :param bucket: Rate limit bucket of the request.
+        :return: Time to wait in seconds.
+        """
+        if self.attempts == 1:
+            return rate_limiter.reserve(bucket, self._get_delay())
+        backoff = self.configuration.retry_policy.get_backoff(self.attempts - 1)
+        return max(backoff / 1000, rate_limiter.reserve(bucket, backoff))
 
+    def _check_retry(self, status_code=None, headers=None, content=None, api_key=None):
+        """
+        Log a failed attempt and check if it should be retried according to the retry policy.
+        If the API rejected a key from the key pool, the key is removed and the request is retried with another key.
+        :param status_code: HTTP status code of the response (None for connection errors).
+        :param headers: Headers of the response (None for connection errors).
+        :param content: Content of the response (None for connection errors).
+        :param api_key: API key from the key pool used for the request (None if no key pool is configured).
+        :return: True if the request should be retried, False otherwise.
+        """
+        retry_policy = self.configuration.retry_policy
+        key_pool = self.configuration.key_pool
+
+        if status_code is None:
+            error = "Connection error"
+        elif retry_policy.should_retry(status_code, headers):
+            error = "Error " + str(status_code)
+        elif key_pool is not None and not self.key_removed and key_pool.is_rejected(status_code, content) \
+                and key_pool.remove(api_key):
+            self.key_removed = True
+            error = "Error " + str(status_code) + " (API key rejected)"
         else:
-            logger.error("Error " + str(response.status_code) + ": Could not retrieve data for entity " + str(self)
-                         + ". Response: " + str(response.content))
+            logger.error("Error %s: Could not retrieve data for entity %s. Response: %s", status_code, self,
+                         Truncated(content))
+            return False
+
+        if self.attempts >= retry_policy.max_attempts:
+            logger.error("%s: Giving up on entity %s after %d attempts.", error, self, self.attempts)
             return False
 
+        logger.info("%s: Retrying entity %s (attempt %d of %d)...", error, self, self.attempts + 1,
+                    retry_policy.max_attempts)
+        return True
+
+    def _process_response(self, body, transport):
+        """
+        Process the body of a successful response and execute the post_request_callbacks.
+        :param body: The response content (bytes, or object of class RawDownload if the raw response content has been
+            streamed to a file).
+        :param transport: Transport of the run (with the decoder for JSON responses).
+        :return: True if response was processed successfully and no filter callback excluded this entity,
+            False otherwise.
+        """
+
+        logger.info("Successfully retrieved data for entity %s.", self)
+
+        if self.configuration.raw_download:
+            # raw download
+            self.output_parameters[self.configuration.raw_parameter] = body
+            # join path to destination file
+            dest_file = ""
+            for part in self.configuration.output_parameter_mapping["destination"]:
+                if part not in self.input_parameters:
+                    raise IllegalConfigurationError("Destination parameter "
+                                                    + part
+                                                    + " not found in input parameters.")
+                dest_file = os.path.join(dest_file, self.input_parameters[part])
+            self.output_parameters["destination"] = dest_file
+        else:
+            # JSON API call
+            # deserialize JSON response (only the needed parts if incremental parsing is configured)
+            if self.configuration.json_prefixes is None:
+                json_response = transport.json_decoder.decode(body)
+            else:
+                json_response = transport.json_decoder.decode_incrementally(body, self.configuration.json_prefixes)
+            self.json_response = json_response
+            # extract parameters according to parameter mapping
+            self._extract_output_parameters(json_response)
+
+        # execute post_request_callbacks
+        result = self._execute_post_request_callbacks(transport)
+
+        if isinstance(body, RawDownload):
+            # move streamed file to its destination, unless the entity has been removed by a filter callback
+            if result or not self.configuration.post_request_callback_filter:
+                self._save_raw_download(body)
+            else:
+                body.discard()
+
+        return result
+
+    def _execute_post_request_callbacks(self, transport):
+        """
+        Execute the configured post_request_callbacks.
+        :param transport: Transport of the run (its profiler times the callbacks, its metrics count the entities
+            excluded by filter callbacks).
+        :return: False if a filter callback excluded this entity, True otherwise.
+        """
+        name = self.configuration.name
+        for callback in self.configuration.post_request_callbacks:
+            result = transport.profiler.call_callback(name, callback, self)
+            # check if callback implements filter
+            if isinstance(result, bool):
+                if not result:
+                    logger.info("Entity removed because of filter callback %s: %s", callback, self)
+                    transport.metrics.record_filtered(name, callback)
+                    return False
+        return True
+
+    def _save_raw_download(self, download):
+        """
+        Move a raw download streamed to a temporary file to its destination in the output directory and replace the
+        raw content parameter with the path, size, and digest of the file.
+        :param download: Object of class RawDownload.
+        """
+        destination = self.output_parameters.get("destination", None)
+        if not destination:
+            download.discard()
+            raise IllegalConfigurationError("Destination path not configured for entity " + str(self))
+
+        dest_file = os.path.join(self.configuration.raw_dir, destination)
+        logger.info("Writing %s...", dest_file)
+        download.move(dest_file)
+        self.output_parameters[self.configuration.raw_parameter] = download.to_dict()
+
     def _extract_output_parameters(self, json_response):
         """
         Extracts and saves all parameters defined in the output parameter mapping.
         :param json_response: The API response as JSON object.
         """
 
-        # extract data for all parameters according to access path defined in the entity configuration
-        for parameter in self.configuration.output_parameter_mapping.keys():
-            parameter_filter = self.configuration.output_parameter_mapping[parameter]
-            filter_result = Entity.apply_filter(json_response, parameter_filter)
-            self.output_parameters[parameter] = filter_result
+        # extract data for all parameters using the access paths compiled by the entity configuration
+        output_parameters = self.output_parameters
+        for parameter, output_filter in self.configuration.output_filters.items():
+            output_parameters[parameter] = output_filter.apply(json_response)
 
     @staticmethod
     def apply_filter(json_response, parameter_filter):
         """
         Use an access path (e.g., ["user", "first_name"]) to filter a nested dictionary.
+        The output parameters of entities are extracted using the access paths compiled by the entity configuration;
+        this method compiles the access path for each call (see FilterPath).
         :param json_response: The JSON response to filter.
         :param parameter_filter: A list with keys for filtering a nested dictionary
             or with the list matching operator "*" followed by an optional parameter mapping for the list elements.
-        :return: The extracted value if the filter has successfully been applied 
+        :return: The extracted value if the filter has successfully been applied
             (can be a simple value, dict, or list), None otherwise.
         """
-
-        # start with whole JSON response
-        filtered_response = json_response
-
-        # apply the filter path
-        for pos in range(len(parameter_filter)):
-            current_filter = parameter_filter[pos]
-
-            if current_filter == "*":  # list matching operator
-                extracted_list = []
-                if isinstance(filtered_response, list):
-                    if pos == len(parameter_filter) - 1:  # if no further arguments are provided, save complete list
-                        for element in filtered_response:
-                            extracted_list.append(element)
-                    elif pos == len(parameter_filter) - 2:  # next element is mapping for list element parameters
-                        if isinstance(parameter_filter[pos + 1], dict):
-                            list_element_filter = parameter_filter[pos + 1]
-                            for element in filtered_response:
-                                filtered_element = OrderedDict.fromkeys(list_element_filter.keys())
-                                for parameter in filtered_element.keys():
-                                    filtered_element[parameter] = \
-                                        Entity.apply_filter(element, list_element_filter[parameter])
-                                extracted_list.append(filtered_element)
-                        else:
-                            raise IllegalArgumentError("The list matching operator must be succeeded by a filter "
-                                                       "object.")
-                    else:
-                        raise IllegalArgumentError("The list matching operator must be the last or second-last element "
-                                                   "of  the filter path.")
-                else:
-                    raise IllegalArgumentError("List matching operator reached, but current position in response is "
-                                               "not a list.")
-                # return extracted list as defined by the list matching operator
-                return extracted_list
-
-            else:
-                # normal filter path
-                if not isinstance(current_filter, list) and not isinstance(current_filter, dict):
-                    try:
-                        # filter may be an index for a list
-                        if isinstance(filtered_response, list) and Entity.parsable_as_int(current_filter):
-                            index = int(current_filter)
-                            filtered_response = filtered_response[index]
-                        else:
-                            # use current string as dictionary key to filter the response
-                            if filtered_response[current_filter] is None:
-                                logger.info("Result for filter " + current_filter + " was None.")
-                                return "None"
-                            else:
-                                filtered_response = filtered_response[current_filter]
-                    except (KeyError, IndexError):
-                        logger.error("Could not apply filter <" + str(current_filter) + "> to response "
-                                     + str(filtered_response) + ".")
-                        return None
-                else:
-                    raise IllegalArgumentError("A filter path must only contain filter strings or the list matching "
-                                               "operator (optionally followed by a filter object).")
-
-        return filtered_response
-
-    @staticmethod
-    def parsable_as_int(s):
-        try:
-            int(s)
-            return True
-        except ValueError:
-            return False
+        return FilterPath(parameter_filter).apply(json_response)
 
     def get_chained_request_entities(self, chained_request_config):
         """
@@ -344,10 +690,12 @@ class Entity(object):
                                 for inner_parameter in inner_parameters:
                                     flattened_input_parameters_chained_request[inner_parameter] = \
                                         list_element[inner_parameter]
-                                chained_request_entities.append(Entity(chained_request_config, flattened_input_parameters_chained_request, None))
+                                chained_request_entities.append(Entity._create_chained_request_entity(
+                                    chained_request_config, flattened_input_parameters_chained_request))
 
                 else:  # no flatten parameters defined
-                    chained_request_entities.append(Entity(chained_request_config, input_parameters_chained_request, None))
+                    chained_request_entities.append(Entity._create_chained_request_entity(
+                        chained_request_config, input_parameters_chained_request))
 
             except KeyError as e:
                 raise IllegalConfigurationError("Reading chained request from configuration failed: Parameter "
@@ -356,5 +704,22 @@ class Entity(object):
             raise IllegalArgumentError("Configuration <" + str(chained_request_config.name) + "> provided, but <"
                                        + str(self.configuration.chained_request_name) + "> needed for chained request.")
 
-        return chained_request_entities
+        # skip chained requests whose URI cannot be rendered
+        return [entity for entity in chained_request_entities if entity is not None]
+
+    @staticmethod
+    def _create_chained_request_entity(chained_request_config, input_parameter_values):
+        """
+        Create an entity for a chained request.
+        :param chained_request_config: The configuration to use for the chained request.
+        :param input_parameter_values: A dictionary with values for the input parameters of the chained request.
+        :return: The entity, None if a value needed for its URI is missing (e.g., because the output parameter it is
+            selected from could not be retrieved).
+        """
+        missing_variables = chained_request_config.uri_template.get_missing_variables(input_parameter_values)
+        if missing_variables:
+            logger.error("Skipping chained request <%s> for input parameters %s: Value for URI variable(s) %s missing.",
+                         chained_request_config.name, Truncated(input_parameter_values), ", ".join(missing_variables))
+            return None
+        return Entity(chained_request_config, input_parameter_values, None)
 
@@ -8,7 +8,12 @@ import os
 from jsmin import jsmin
 
 from retriever import callbacks
+from retriever.filter_path import FilterPath
+from retriever.json_decoder import JsonDecoder
+from retriever.key_pool import KeyPool, KEY_POOL_VARIABLE
+from retriever.pagination import Pagination
 from retriever.range_var import RangeVar
+from retriever.retry_policy import RetryPolicy
 from util.exceptions import IllegalArgumentError, IllegalConfigurationError
 from util.regex import RANGE_VAR_REGEX
 from util.uri_template import URITemplate
@@ -45,40 +50,80 @@ class EntityConfiguration(object):
             self.headers = config_dict["headers"]
             # API keys to include in the uri_template
             self.api_keys = config_dict["api_keys"]
+            # optionally, a pool of API keys can be rotated (inserted as {api_key} in uri_template and headers)
+            self.key_pool = KeyPool(config_dict["api_key_pool"]) if "api_key_pool" in config_dict else None
             # check if api key configured when required for uri_template
             uri_vars = self.uri_template.get_variables()
             self.range_vars = OrderedDict()
             for var in uri_vars:
                 # validate API variables
-                if var.startswith("api_key") and not self.api_keys:
+                if var == KEY_POOL_VARIABLE:
+                    if not self.key_pool:
+                        raise IllegalConfigurationError("API key pool required for URI template, but not configured.")
+                    # the key is inserted for each request (see KeyPool.apply)
+                    self.uri_template.add_optional_variable(var)
+                elif var.startswith("api_key") and not self.api_keys:
                     raise IllegalConfigurationError("API key required for URI template, but not configured.")
                 # check for range variables {name|start;stop;step}
                 if RANGE_VAR_REGEX.fullmatch(var):
                     range_var = RangeVar(var)
                     self.range_vars[range_var.name] = range_var
                     self.uri_template.replace_range_variable(range_var)
+            # API keys are the same for all entities, insert them when compiling the URI template
+            self.uri_template.bind_variables({"api_key_" + str(i + 1): api_key
+                                              for i, api_key in enumerate(self.api_keys)})
             # configure if duplicate values in the input files should be ignored.
             self.ignore_input_duplicates = config_dict["ignore_input_duplicates"]
             # configure the randomized delay interval (ms) between two API requests (trying to prevent getting blocked)
             self.delay_min = config_dict["delay"][0]
             self.delay_max = config_dict["delay"][1]
+            # configure retries of failed requests (optional, see RetryPolicy for defaults)
+            self.retry_policy = RetryPolicy.create_from_dict(config_dict.get("retry", {}))
+            # configure native pagination (optional, see Pagination)
+            self.pagination = None
+            if "pagination" in config_dict:
+                self.pagination = Pagination.create_from_dict(config_dict["pagination"])
+                if self.range_vars:
+                    raise IllegalConfigurationError("Pagination and range variables cannot be combined.")
             # dictionary with mapping of parameter names to values in the response
             self.output_parameter_mapping = config_dict["output_parameter_mapping"]
             # check if raw download is configured
             self.raw_download = False
             self.raw_parameter = None
+            # directory raw downloads are streamed to while retrieving (None if the raw content is kept in memory
+            # until it is exported, see EntityList.set_output_dir)
+            self.raw_dir = None
             for parameter in self.output_parameter_mapping.keys():
                 if len(self.output_parameter_mapping[parameter]) == 1\
                         and self.output_parameter_mapping[parameter][0] == "<raw_response>":
                     self.raw_download = True
                     self.raw_parameter = parameter
                     break
+            # compile the access paths of the output parameters (validated when the configuration is loaded)
+            self.output_filters = OrderedDict()
+            if not self.raw_download:
+                for parameter, parameter_filter in self.output_parameter_mapping.items():
+                    self.output_filters[parameter] = FilterPath(parameter_filter)
+            # optionally, large JSON responses can be parsed incrementally, building only the parts of the response
+            # needed by the output parameter mapping and the pagination (callbacks only see these parts)
+            self.json_prefixes = None
+            if config_dict.get("incremental_parsing", False) and not self.raw_download:
+                paths = [output_filter.path for output_filter in self.output_filters.values()]
+                if self.pagination is not None:
+                    paths += [path for path in [self.pagination.cursor, self.pagination.has_more,
+                                                self.pagination.items, self.pagination.total] if path]
+                self.json_prefixes = JsonDecoder.get_prefixes(paths)
+                if self.json_prefixes is None:
+                    logger.info("The output parameter mapping needs the whole response, incremental parsing is "
+                                "not used.")
             if self.raw_download:
                 # destination parameter has to be set when using raw download
                 if "destination" not in self.output_parameter_mapping:
                     raise IllegalConfigurationError("If raw download is configured, destination parameter must be set.")
                 if not isinstance(self.output_parameter_mapping["destination"], list):
                     raise IllegalConfigurationError("Destination parameter must be an array.")
+                if self.pagination is not None:
+                    raise IllegalConfigurationError("Pagination is not supported for raw downloads.")
 
             # configure if pre request callbacks should be used to filter before retrieving data
             self.pre_request_callback_filter = config_dict["pre_request_callback_filter"]
@@ -103,6 +148,14 @@ class EntityConfiguration(object):
                 self.chained_request_name = chained_request["name"]
                 self.chained_request_input_parameters = chained_request["input_parameters"]
             self.log_uri = config_dict["log_uri"]
+            # optionally, the columns of the exported CSV file can be declared (default: derived from the input
+            # parameters and the output parameter mapping)
+            self.output_columns = config_dict.get("output_columns", None)
+            if self.output_columns is not None and (not isinstance(self.output_columns, list)
+                                                    or not all(isinstance(c, str) for c in self.output_columns)):
+                raise IllegalConfigurationError("Output columns must be an array of parameter names.")
+            # optionally, the number of attempts needed to retrieve the data can be exported
+            self.log_attempts = config_dict.get("log_attempts", False)
 
         except KeyError as e:
             raise IllegalConfigurationError("Reading configuration failed: Parameter " + str(e) + " not found.")
@@ -1,44 +1,76 @@
+import asyncio
 import codecs
 import csv
-import json
+import itertools
 import logging
 import os
-import requests
 
-from _socket import gaierror
 from collections import OrderedDict
-from orderedset import OrderedSet
-from urllib3.exceptions import MaxRetryError, NewConnectionError
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import DEFAULT_POOLSIZE
 
-from retriever.entity import Entity
+from retriever.chained_request_executor import ChainedRequestExecutor
+from retriever.entity import Entity, CONNECTION_ERRORS
+from retriever.csv_exporter import CsvExporter
 from retriever.entity_configuration import EntityConfiguration
+from retriever.input_key_set import InputKeySet
+from retriever.journal import Journal
+from retriever.transport import Transport
 from util.exceptions import IllegalArgumentError, IllegalConfigurationError
 
 # get root logger
 logger = logging.getLogger('api-retriever_logger')
 
+# engines that can be used for data retrieval
+ENGINES = ["requests", "asyncio"]
+
 
 class EntityList(object):
     """ List of API entities. """
 
-    def __init__(self, configuration, start_index=0, chunk_size=0):
+    def __init__(self, configuration, start_index=0, chunk_size=0, workers=1, engine="requests", transport=None,
+                 dedup_file=None):
         """
         To initialize the list, an entity configuration is needed.
         :param configuration: Object of class EntityConfiguration.
+        :param workers: Number of workers used to retrieve data concurrently (default: 1, meaning sequential).
+            For the asyncio engine, this is the maximum number of requests in flight.
+        :param engine: Engine used for data retrieval, either "requests" (worker threads sharing a requests session)
+            or "asyncio" (coroutines sharing an aiohttp session).
+        :param transport: Object of class Transport shared by all lists of a run (default: None, create new one).
+        :param dedup_file: Path to a temporary SQLite database for detecting duplicates in the input file
+            (default: None, meaning that the keys of imported entities are kept in memory).
         """
 
         assert start_index >= 0
         assert chunk_size >= 0
+        assert workers >= 1
+
+        if engine not in ENGINES:
+            raise IllegalArgumentError("Unknown engine: " + str(engine))
+        if engine == "asyncio":
+            Transport.check_async_support()
 
         self.configuration = configuration
         # list that stores entity objects
         self.entities = []
-        # session for data retrieval
-        self.session = requests.Session()
+        # engine and number of workers (threads or coroutines) used during data retrieval
+        self.engine = engine
+        self.workers = workers
+        # transport for data retrieval (connection pool must be large enough for all workers to reuse connections)
+        self.transport = transport if transport else Transport(pool_size=max(workers, DEFAULT_POOLSIZE))
         # index of first element to import from input_file (default: 0)
         self.start_index = start_index
         # number of elements to import from input_file (default: 0, meaning max.)
         self.chunk_size = chunk_size
+        # database for detecting duplicates in large input files (None if keys are kept in memory)
+        self.dedup_file = dedup_file
+        # journal of completed entities (None if not configured, see open_journal)
+        self.journal = None
+        # lists of the chained requests of this list (their journals are closed together with the journal of this list)
+        self.chained_request_lists = []
+        # output directory raw downloads are streamed to (None if not configured, see set_output_dir)
+        self.output_dir = None
 
     def add(self, entities):
         error_message = "Argument must be object of class Entity or class EntityList."
@@ -66,6 +98,16 @@ class EntityList(object):
         :param input_file: Path to the CSV file.
         :param delimiter: Column delimiter in CSV file (typically ',').
         """
+        self.entities.extend(self.iter_csv(input_file, delimiter))
+
+    def iter_csv(self, input_file, delimiter):
+        """
+        Lazily create entities from the input parameter values in a CSV file (header required).
+        The file is read row by row, such that large input files can be streamed (see Pipeline).
+        :param input_file: Path to the CSV file.
+        :param delimiter: Column delimiter in CSV file (typically ',').
+        :return: Generator yielding the entities (without duplicates if ignore_input_duplicates is configured).
+        """
 
         # read CSV as UTF-8 encoded file (see also http://stackoverflow.com/a/844443)
         with codecs.open(input_file, encoding='utf8') as fp:
@@ -94,13 +136,13 @@ class EntityList(object):
 
                     try:
                         # retrieve data
-                        response = self.session.get(uri)
+                        response = self.transport.get(uri)
 
                         if response.ok:
                             logger.info("Successfully retrieved data for URI input parameter " + str(uri_parameter) + ".")
 
-                            # deserialize JSON string
-                            json_response = json.loads(response.text)
+                            # deserialize JSON response
+                            json_response = self.transport.json_decoder.decode(response.content)
 
                             filter_result = Entity.apply_filter(json_response, response_filter)
                             uri_input_parameters[uri_parameter] = filter_result
@@ -111,10 +153,7 @@ class EntityList(object):
                                                             + str(uri_parameter) + ". Response: "
                                                             + str(response.content))
 
-                    except (gaierror,
-                            ConnectionError,
-                            MaxRetryError,
-                            NewConnectionError):
+                    except CONNECTION_ERRORS:
                         logger.error("An error occurred while retrieving data for URI input parameter "
                                      + str(uri_parameter) + ".")
 
@@ -144,6 +183,10 @@ class EntityList(object):
             # read CSV file
             predecessor = None
             current_index = 0
+            imported = 0
+            duplicates = 0
+            # keys of imported entities (to detect duplicates)
+            imported_keys = InputKeySet(self.dedup_file) if self.configuration.ignore_input_duplicates else None
             for row in reader:
                 # only read value from start_index to start_index+chunk_size-1 (if chunk_size is 0, read until the end)
                 if current_index < self.start_index:
@@ -177,44 +220,80 @@ class EntityList(object):
                     predecessor = new_entity
 
                     # if ignore_input_duplicates is configured, check if entity already exists
-                    if self.configuration.ignore_input_duplicates:
-                        entity_exists = False
-                        for entity in self.entities:
-                            if entity.equals(new_entity):
-                                entity_exists = True
-                        if not entity_exists:
-                            # add new entity to list
-                            self.entities.append(new_entity)
-                    else:  # ignore_input_duplicates is false
-                        # add new entity to list
-                        self.entities.append(new_entity)
+                    if imported_keys is not None and not imported_keys.add(new_entity.get_key()):
+                        duplicates += 1
+                    else:
+                        imported += 1
+                        yield new_entity
                 else:
                     raise IllegalArgumentError("Wrong CSV format.")
 
                 current_index += 1
 
-        logger.info(str(len(self.entities)) + " entities have been imported.")
+            if imported_keys is not None:
+                imported_keys.close()
+                logger.info(str(duplicates) + " duplicate(s) in the input file have been ignored.")
+
+        logger.info(str(imported) + " entities have been imported.")
 
     def resolve_range_vars(self):
         """
-        Create entities within range if range var is configured
+        Create the first entity within range for each entity if range vars are configured. The entities for the
+        remaining range values are created lazily while the chain of the first entity is retrieved, such that no
+        entities are created for range values after the expansion has been stopped (see Entity.stop_expansion).
         """
         if len(self.configuration.range_vars) > 0:
             new_entities = list()
-            for range_var_name in self.configuration.range_vars.keys():
-                range_var = self.configuration.range_vars.get(range_var_name)
-                for entity in self.entities:
-                    for i in range(range_var.start, range_var.stop, range_var.step):
-                        new_entity = Entity(entity.configuration, {
-                                **entity.input_parameters,
-                                range_var_name: str(i)
-                            }, None)
-                        new_entity.root_entity = entity
-                        new_entities.append(new_entity)
-                self.entities = new_entities
-                new_entities = list()
+            for entity in self.entities:
+                for range_values in self._iter_range_values():
+                    new_entities.append(self._create_range_entity(entity, range_values, None))
+                    break
+            self.entities = new_entities
         self.set_predecessors()
 
+    def _iter_range_values(self, skip=0):
+        """
+        Iterate over all combinations of values of the configured range variables (the first variable changes
+        slowest).
+        :param skip: Number of combinations to skip.
+        :return: Generator yielding dictionaries with the values of the range variables.
+        """
+        range_var_names = list(self.configuration.range_vars.keys())
+        ranges = [range(range_var.start, range_var.stop, range_var.step)
+                  for range_var in self.configuration.range_vars.values()]
+        for values in itertools.islice(itertools.product(*ranges), skip, None):
+            yield {name: str(value) for name, value in zip(range_var_names, values)}
+
+    @staticmethod
+    def _create_range_entity(root_entity, range_values, predecessor):
+        """
+        Create an entity for a combination of range values.
+        :param root_entity: Entity read from the input file.
+        :param range_values: Dictionary with the values of the range variables.
+        :param predecessor: Predecessor of the new entity.
+        :return: The new entity.
+        """
+        new_entity = Entity(root_entity.configuration, {
+                **root_entity.input_parameters,
+                **range_values
+            }, predecessor)
+        new_entity.root_entity = root_entity
+        return new_entity
+
+    def _expand_chain(self, chain):
+        """
+        Lazily create the entities for the remaining range values of a chain, until the expansion is stopped.
+        :param chain: List of entities derived from the same root entity (the created entities are appended to it).
+        :return: Generator yielding the created entities.
+        """
+        root_entity = chain[0].root_entity
+        for range_values in self._iter_range_values(len(chain)):
+            if root_entity.expansion_stopped:
+                logger.info("Range expansion stopped for entity %s.", root_entity)
+                return
+            chain.append(self._create_range_entity(root_entity, range_values, chain[-1]))
+            yield chain[-1]
+
     def retrieve_data(self):
         """
         Retrieve data for all entities in the list.
@@ -222,21 +301,234 @@ class EntityList(object):
         # retrieve data and filter list according to the return value of entity.retrieve_data
         # (may be false, e.g., because of filter callback)
 
-        self.resolve_range_vars()
+        with self.transport.profiler.phase("resolve_range_vars"):
+            self.resolve_range_vars()
+
+        # restore chains of entities from the journal (if resuming), retrieve the remaining ones
+        chains = self._get_chains()
+        chain_results = [None] * len(chains)
+        pending = []
+        for index, chain in enumerate(chains):
+            if self.journal is not None:
+                chain_results[index] = self.journal.restore(chain)
+            if chain_results[index] is None:
+                pending.append(index)
+        if len(pending) < len(chains):
+            logger.info("Restored " + str(len(chains) - len(pending)) + " of " + str(len(chains))
+                        + " chains of entities from journal.")
+        pending_chains = [chains[index] for index in pending]
+        self.transport.metrics.add_chains(self.configuration.name, len(pending_chains))
+
+        if self.engine == "asyncio":
+            pending_results = self.transport.run_async(self._retrieve_data_async(pending_chains), self.workers)
+        elif self.workers > 1:
+            pending_results = self._retrieve_data_concurrently(pending_chains)
+        else:
+            pending_results = [self._retrieve_chain(chain) for chain in pending_chains]
+
+        for index, results in zip(pending, pending_results):
+            chain_results[index] = results
 
+        # chains may have been extended by pagination
+        self.entities = [entity for chain in chains for entity in chain]
         if self.configuration.post_request_callback_filter:
-            self.entities = [entity for entity in self.entities if entity.retrieve_data(self.session)]
-        else:
-            for entity in self.entities:
-                entity.retrieve_data(self.session)
+            results = [result for results in chain_results for result in results]
+            self.entities = [entity for entity, result in zip(self.entities, results) if result]
 
         logger.info("Data for " + str(len(self.entities)) + " entities has been saved.")
 
+    def _retrieve_data_concurrently(self, chains):
+        """
+        Retrieve data for chains of entities using a pool of worker threads that share the session of the transport.
+        Entities derived from the same root entity (range variables) are retrieved sequentially by one worker,
+        because callbacks such as check_if_next_page_exists depend on the response of the predecessor.
+        :param chains: List of chains (lists of entities).
+        :return: List with the return values of entity.retrieve_data per chain, in the same order as the chains.
+        """
+        logger.info("Retrieving data using " + str(self.workers) + " workers...")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # map preserves the order of the chains, so the results can be matched with the entities
+            return list(executor.map(lambda chain: self._retrieve_chain(chain, executor), chains))
+
+    def _retrieve_chain(self, chain, executor=None):
+        """
+        Sequentially retrieve data for a chain of entities, journal the chain once it has been retrieved, and release
+        the responses of its entities (callbacks such as check_if_next_page_exists only need the responses of the
+        predecessors within the chain).
+        If range variables are configured, the entities for the remaining range values are created and retrieved.
+        If pagination is configured, the next pages are retrieved and appended to the chain.
+        :param chain: List of entities that depend on their predecessor.
+        :param executor: Executor of the workers that retrieve the chains (None if the chain is retrieved without
+            workers), idle workers help retrieving pages that are known in advance.
+        :return: List with the return values of entity.retrieve_data.
+        """
+        results = [entity.retrieve_data(self.transport) for entity in chain]
+        if self.configuration.range_vars:
+            results.extend(entity.retrieve_data(self.transport) for entity in self._expand_chain(chain))
+
+        pagination = self.configuration.pagination
+        if pagination is not None:
+            uris, last = pagination.get_next_uris(chain)
+            while results[-1] and uris:
+                pages = self._append_pages(chain, uris)
+                results.extend(self._retrieve_pages(pages, executor))
+                if last:
+                    break
+                uris, last = pagination.get_next_uris(chain)
+
+        if self.journal is not None:
+            self.journal.write(chain, results)
+        # release the responses, no callback of this chain can need them anymore
+        for entity in chain:
+            entity.release()
+        self.transport.metrics.complete_chain(self.configuration.name)
+        return results
+
+    async def _retrieve_chain_async(self, chain, semaphore=None):
+        """
+        Sequentially retrieve data for a chain of entities using the asyncio engine (see _retrieve_chain).
+        :param chain: List of entities that depend on their predecessor.
+        :param semaphore: Semaphore with one slot per worker, shared by all chains of the run (None if the number of
+            requests in flight does not need to be bounded), such that pages retrieved in parallel do not exceed the
+            number of workers.
+        :return: List with the return values of entity.retrieve_data_async.
+        """
+        results = [await self._retrieve_entity_async(entity, semaphore) for entity in chain]
+        if self.configuration.range_vars:
+            for entity in self._expand_chain(chain):
+                results.append(await self._retrieve_entity_async(entity, semaphore))
+
+        pagination = self.configuration.pagination
+        if pagination is not None:
+            uris, last = pagination.get_next_uris(chain)
+            while results[-1] and uris:
+                pages = self._append_pages(chain, uris)
+                # remaining pages are known, retrieve them in parallel (bounded by the slots of the workers)
+                results.extend(await asyncio.gather(*[self._retrieve_entity_async(page, semaphore)
+                                                      for page in pages]))
+                if last:
+                    break
+                uris, last = pagination.get_next_uris(chain)
+
+        if self.journal is not None:
+            self.journal.write(chain, results)
+        # release the responses, no callback of this chain can need them anymore
+        for entity in chain:
+            entity.release()
+        self.transport.metrics.complete_chain(self.configuration.name)
+        return results
+
+    async def _retrieve_entity_async(self, entity, semaphore):
+        """
+        Retrieve data for an entity using the asyncio engine, holding a slot of the workers while the entity is
+        retrieved (a worker waiting for pages retrieved in parallel holds no slot, thus it cannot block them).
+        :param entity: The entity.
+        :param semaphore: Semaphore with one slot per worker (None to retrieve the entity without a slot).
+        :return: The return value of entity.retrieve_data_async.
+        """
+        if semaphore is None:
+            return await entity.retrieve_data_async(self.transport)
+        async with semaphore:
+            return await entity.retrieve_data_async(self.transport)
+
+    def _retrieve_pages(self, pages, executor):
+        """
+        Retrieve pages that are known in advance (e.g., from the total number of results). The pages are submitted to
+        the executor of the workers, such that idle workers retrieve them in parallel without exceeding the number of
+        workers. Pages that no worker has started yet are retrieved by the current worker, which thus only waits for
+        pages that are being retrieved (no deadlock if all workers are busy).
+        :param pages: List of entities.
+        :param executor: Executor of the workers (None to retrieve the pages sequentially).
+        :return: List with the return values of entity.retrieve_data.
+        """
+        if executor is None or len(pages) == 1:
+            return [page.retrieve_data(self.transport) for page in pages]
+
+        futures = [executor.submit(page.retrieve_data, self.transport) for page in pages]
+        return [page.retrieve_data(self.transport) if future.cancel() else future.result()
+                for page, future in zip(pages, futures)]
+
+    @staticmethod
+    def _append_pages(chain, uris):
+        """
+        Append entities for the next pages to a chain.
+        :param chain: List of entities that depend on their predecessor.
+        :param uris: List with the URIs of the next pages.
+        :return: List with the appended entities.
+        """
+        pages = []
+        for uri in uris:
+            chain.append(chain[-1].create_page(uri))
+            pages.append(chain[-1])
+        return pages
+
+    async def _retrieve_data_async(self, chains):
+        """
+        Retrieve data for chains of entities using coroutines that share the aiohttp session of the transport.
+        A fixed number of worker coroutines consume the chains of entities, which bounds the number of requests
+        in flight (and the number of coroutines in memory) by the number of workers.
+        :param chains: List of chains (lists of entities).
+        :return: List with the return values of entity.retrieve_data_async per chain, in the same order as the chains.
+        """
+        logger.info("Retrieving data using the asyncio engine with " + str(self.workers) + " workers...")
+
+        chain_results = [None] * len(chains)
+        # all workers share one iterator (no locking needed, because the event loop runs in a single thread)
+        pending_chains = iter(enumerate(chains))
+        # requests of all chains (including pages retrieved in parallel) share the slots of the workers
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def worker():
+            for index, chain in pending_chains:
+                chain_results[index] = await self._retrieve_chain_async(chain, semaphore)
+
+        await asyncio.gather(*[worker() for _ in range(min(self.workers, len(chains)))])
+
+        return chain_results
+
+    def _get_chains(self):
+        """
+        Split the entity list into chains of consecutive entities that share the same root entity.
+        Entities without root entity are independent of each other and form chains of length one.
+        :return: List of chains (lists of entities) in the order of the entity list.
+        """
+        chains = []
+        for entity in self.entities:
+            if chains and entity.root_entity is not None and entity.root_entity == chains[-1][-1].root_entity:
+                chains[-1].append(entity)
+            else:
+                chains.append([entity])
+        return chains
+
     def execute_chained_request(self, config_dir):
         """
-        Execute the chained request for all entities in the list.
+        Retrieve data for all entities in the list and execute their chained requests (including nested chained
+        requests). The chained requests of an entity are sent as soon as its data has been retrieved.
+        :param config_dir: Path to directory with entity configurations as JSON files.
+        :return: The entities retrieved by the last level of chained requests.
+        """
+        executor = self.create_chained_request_executor(config_dir)
+        try:
+            return executor.execute(self)
+        finally:
+            executor.close()
+
+    def create_chained_request_executor(self, config_dir):
+        """
+        Create an executor for the chained requests of this list (see ChainedRequestExecutor).
         :param config_dir: Path to directory with entity configurations as JSON files.
-        :return: The entities retrieved by the chained requests.
+        :return: Object of class ChainedRequestExecutor.
+        """
+        executor = ChainedRequestExecutor(self, config_dir)
+        self.chained_request_lists = executor.levels[1:]
+        return executor
+
+    def create_chained_request_list(self, config_dir):
+        """
+        Read the configuration for the chained request and create an empty list for the chained request entities.
+        :param config_dir: Path to directory with entity configurations as JSON files.
+        :return: Empty entity list using the configuration of the chained request.
         """
 
         # derive path to JSON file with configuration for chained request
@@ -248,23 +540,82 @@ class EntityList(object):
         logger.info("Reading entity configuration for chained request:")
         chained_request_config = EntityConfiguration.create_from_json(config_file_path)
 
-        if chained_request_config.name == self.configuration.chained_request_name:
-            logger.info("Executing chained requests...")
+        if chained_request_config.name != self.configuration.chained_request_name:
+            raise IllegalConfigurationError("Configuration name <" + str(chained_request_config.name)
+                                            + "> is not identical to chained request name <"
+                                            + str(self.configuration.chained_request_name) + ">.")
 
-            chained_request_entities = EntityList(chained_request_config)
-            for entity in self.entities:
-                # get chained request entities
-                chained_request_entities.add(entity.get_chained_request_entities(chained_request_config))
-                # set predecessors
-                chained_request_entities.set_predecessors()
-                # retrieve data for chained entities
-                chained_request_entities.retrieve_data()
+        chained_request_entities = EntityList(chained_request_config, workers=self.workers, engine=self.engine,
+                                              transport=self.transport)
+        if self.journal is not None:
+            chained_request_entities.open_journal(os.path.dirname(self.journal.path), self.journal.resume)
+        if self.output_dir is not None:
+            chained_request_entities.set_output_dir(self.output_dir)
+        return chained_request_entities
 
-            return chained_request_entities
+    def create_window(self, entities=None):
+        """
+        Create a list for a window of entities that shares configuration, workers, transport, and journal with this
+        list (used by Pipeline to process large input files in windows of bounded size and by ChainedRequestExecutor
+        for the chained requests of an entity).
+        :param entities: List with the entities of the window (default: None, meaning an empty list).
+        :return: Object of class EntityList.
+        """
+        window = EntityList(self.configuration, workers=self.workers, engine=self.engine, transport=self.transport)
+        window.journal = self.journal
+        window.output_dir = self.output_dir
+        if entities:
+            # drop reference to the previous window, such that it can be garbage collected
+            entities[0].predecessor = None
+            window.add(entities)
+        return window
+
+    def get_output_name(self):
+        """
+        Get the base name of the output files (CSV file and journal) for this list.
+        :return: Name of the entity configuration, followed by the index range if a chunk size is configured.
+        """
+        if self.chunk_size != 0:
+            # if the entities are streamed, the number of imported entities is not known in advance
+            count = min(len(self.entities), self.chunk_size) if self.entities else self.chunk_size
+            return '{0}_{1}-{2}'.format(self.configuration.name, str(self.start_index),
+                                        str(self.start_index + count - 1))
+        return self.configuration.name
+
+    def open_journal(self, output_dir, resume=False):
+        """
+        Journal completed entities in the output directory, such that an interrupted run can be resumed.
+        Must be called after the entities have been read, because the journal is named like the CSV file
+        (including the index range of the imported entities).
+        :param output_dir: Target directory for the journal file.
+        :param resume: Restore entities from an existing journal instead of retrieving them again.
+        """
+        # API keys are not written to the journal
+        secrets = list(self.configuration.api_keys)
+        if self.configuration.key_pool is not None:
+            secrets += list(self.configuration.key_pool.positions)
+        self.journal = Journal(os.path.join(output_dir, self.get_output_name() + '.journal'), resume, secrets)
 
-        raise IllegalConfigurationError("Configuration name <" + str(chained_request_config.name)
-                                        + "> is not identical to chained request name <"
-                                        + str(self.configuration.chained_request_name) + ">.")
+    def set_output_dir(self, output_dir):
+        """
+        Stream raw downloads to their destination in the output directory while the data is retrieved, instead of
+        keeping the raw content in memory until save_raw_files is called (also applies to chained requests created
+        afterwards).
+        :param output_dir: Target directory for exported files.
+        """
+        self.output_dir = output_dir
+        if self.configuration.raw_download:
+            self.configuration.raw_dir = os.path.join(output_dir, self.configuration.name)
+
+    def close_journal(self, remove=False):
+        """
+        Close the journal of this list and the journals of its chained requests (if any).
+        :param remove: Remove the journals once the run has been exported (journals of runs in which entities failed
+            because of connection errors are kept for resuming).
+        """
+        for entity_list in [self] + self.chained_request_lists:
+            if entity_list.journal is not None:
+                entity_list.journal.close(remove)
 
     def write_to_csv(self, output_dir, delimiter):
         """
@@ -277,97 +628,25 @@ class EntityList(object):
             logger.info("Nothing to export.")
             return
 
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        if self.chunk_size != 0:
-            filename = '{0}_{1}-{2}.csv'.format(self.configuration.name, str(self.start_index),
-                                                str(self.start_index + min(len(self.entities), self.chunk_size) - 1))
-        else:
-            filename = '{0}.csv'.format(self.configuration.name)
-
-        file_path = os.path.join(output_dir, filename)
-
-        # write entity list to UTF8-encoded CSV file (see also http://stackoverflow.com/a/844443)
-        with codecs.open(file_path, 'w', encoding='utf8') as fp:
-            logger.info('Exporting entities to ' + file_path + '...')
-            writer = csv.writer(fp, delimiter=delimiter)
-
-            # check if input and output parameters overlap -> validate these parameters later
-            validation_parameters = OrderedSet(self.configuration.input_parameters).intersection(
-                OrderedSet(self.configuration.output_parameter_mapping.keys())
-            )
-
-            # get column names for CSV file (start with input parameters)
-            column_names = self.configuration.input_parameters + [
-                parameter for parameter in self.configuration.output_parameter_mapping.keys()
-                if parameter not in validation_parameters
-            ]
-
-            # check if an output parameter has been added and/or removed by a callback function and update column names
-            parameters_removed = OrderedSet()
-            parameters_added = OrderedSet()
-            for entity in self.entities:
-                parameters_removed.update(OrderedSet(self.configuration.output_parameter_mapping.keys()).difference(
-                    OrderedSet(entity.output_parameters.keys()))
-                )
-                parameters_added.update(OrderedSet(entity.output_parameters.keys()).difference(
-                    OrderedSet(self.configuration.output_parameter_mapping.keys()))
-                )
-            for parameter in parameters_removed:
-                column_names.remove(parameter)
-            for parameter in parameters_added:
-                column_names.append(parameter)
-
-            if self.configuration.log_uri:
-                column_names.append("_uri")
-
-            # write header of CSV file
-            writer.writerow(column_names)
-
-            for entity in self.entities:
-                try:
-                    row = OrderedDict.fromkeys(column_names)
-
-                    # check validation parameters
-                    for parameter in validation_parameters:
-                        if entity.output_parameters[parameter]:
-                            if str(entity.input_parameters[parameter]) == str(entity.output_parameters[parameter]):
-                                logger.info("Validation of parameter " + parameter + " successful for entity "
-                                            + str(entity) + ".")
-                            else:
-                                logger.error("Validation of parameter " + parameter + " failed for entity "
-                                             + str(entity)
-                                             + ": Expected: " + str(entity.input_parameters[parameter])
-                                             + ", Actual: " + str(entity.output_parameters[parameter])
-                                             + ". Retrieved value will be exported.")
-                        else:
-                            logger.error("Validation of parameter " + parameter + " failed for entity " + str(entity)
-                                         + ": Empty value.")
-
-                    # write data
-                    for column_name in column_names:
-                        if column_name in entity.output_parameters.keys():
-                            row[column_name] = entity.output_parameters[column_name]
-                        elif column_name in entity.input_parameters.keys():
-                            row[column_name] = entity.input_parameters[column_name]
-                        if column_name == "_uri":
-                            row[column_name] = entity.uri
-
-                    if len(row) == len(column_names):
-                        writer.writerow(list(row.values()))
-                    else:
-                        raise IllegalArgumentError(str(len(column_names) - len(row)) + " parameter(s) is/are missing "
-                                                                                       "for entity " + str(entity))
+        exporter = self.create_exporter(output_dir, delimiter)
+        exporter.write(self.entities)
+        exporter.close()
 
-                except UnicodeEncodeError:
-                    logger.error("Encoding error while writing data for entity: " + str(entity))
-
-            logger.info(str(len(self.entities)) + ' entities have been exported.')
+    def create_exporter(self, output_dir, delimiter):
+        """
+        Create an exporter that writes entities to the CSV file for this list.
+        :param output_dir: Target directory for generated CSV file.
+        :param delimiter: Column delimiter in CSV file (typically ',').
+        :return: Object of class CsvExporter.
+        """
+        file_path = os.path.join(output_dir, self.get_output_name() + '.csv')
+        logger.info('Exporting entities to ' + file_path + '...')
+        return CsvExporter(file_path, delimiter, self.configuration)
 
     def save_raw_files(self, output_dir):
         """
-        Export raw content from entities to files.
+        Export raw content from entities to files (raw content that has been streamed to its destination while
+        retrieving, see set_output_dir, is only marked as downloaded).
         :param output_dir: Target directory for exported files.
         """
 
@@ -384,7 +663,11 @@ class EntityList(object):
             if not entity.configuration.raw_download:
                 raise IllegalConfigurationError("Raw download not configured for entity " + str(entity))
 
-            if entity.output_parameters[entity.configuration.raw_parameter] is not None:
+            raw_content = entity.output_parameters[entity.configuration.raw_parameter]
+            if isinstance(raw_content, dict):
+                # already streamed to its destination while retrieving (path, size, and digest, see RawDownload)
+                entity.output_parameters["downloaded"] = True
+            elif raw_content is not None:
                 if "destination" not in entity.output_parameters.keys() or not entity.output_parameters["destination"]:
                     raise IllegalConfigurationError("Destination path not configured for entity " + str(entity))
 
@@ -394,10 +677,10 @@ class EntityList(object):
                 if not os.path.exists(dest_dir):
                     os.makedirs(dest_dir)
 
-                logger.info("Writing " + str(dest_file) + "...")
+                logger.info("Writing %s...", dest_file)
                 # see http://stackoverflow.com/a/13137873
                 with open(dest_file, 'wb') as f:
-                    f.write(entity.output_parameters[entity.configuration.raw_parameter])
+                    f.write(raw_content)
 
                 # add downloaded flag to output
                 entity.output_parameters["downloaded"] = True
@@ -416,11 +699,19 @@ class EntityList(object):
         i.e. converts them to separate columns.
         """
         logger.info("Flattening output...")
+        self.entities = EntityList.flatten_entities(self.entities)
 
+    @staticmethod
+    def flatten_entities(entities):
+        """
+        Flattens the entries of output parameters that is a list of dicts (see flatten_output).
+        :param entities: List of entities with retrieved data.
+        :return: List with the flattened entities (the given list if no list parameter has been found).
+        """
         # search for list parameter
         list_parameter_name = None
         other_parameters = list()
-        for entity in self.entities:
+        for entity in entities:
             for parameter_name in entity.output_parameters.keys():
                 parameter = entity.output_parameters.get(parameter_name)
                 # only process one output parameter
@@ -433,12 +724,12 @@ class EntityList(object):
 
         if list_parameter_name is None:
             logger.info("No list parameter found.")
-            return
+            return entities
 
         logger.info("Flattening output for parameter \"" + list_parameter_name + "\"...")
 
         flattened_entities = list()
-        for entity in self.entities:
+        for entity in entities:
             list_parameter = entity.output_parameters.get(list_parameter_name)
             # remove output parameter to be flattened
             entity.output_parameters.pop(list_parameter_name)
@@ -450,16 +741,17 @@ class EntityList(object):
             for element in list_parameter:
                 if not isinstance(element, dict):
                     logger.info("List elements must be dicts, aborting...")
-                    return
+                    return entities
 
-                flattened_entity = Entity(entity.configuration, entity.input_parameters, entity.predecessor)
+                flattened_entity = Entity(entity.configuration, entity.input_parameters, entity.predecessor,
+                                          entity.uri)
                 # add old and new output parameters
                 flattened_entity.output_parameters = {
                     **entity.output_parameters,
                     **element
                 }
-                flattened_entity.uri = entity.uri
+                flattened_entity.attempts = entity.attempts
                 flattened_entities.append(flattened_entity)
 
         # replace entities with flattened ones
-        self.entities = flattened_entities
+        return flattened_entities
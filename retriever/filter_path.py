@@ -0,0 +1,180 @@
+import logging
+
+from operator import itemgetter
+
+from util.exceptions import IllegalArgumentError, IllegalConfigurationError
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# list matching operator
+LIST_OPERATOR = "*"
+
+
+class FilterPath(object):
+    """
+    Compiled access path (e.g., ["user", "first_name"]) of the output parameter mapping, used to extract a value from
+    a JSON response. The path may end with the list matching operator "*", optionally followed by a parameter mapping
+    for the list elements (e.g., ["items", "*", {"name": ["full_name"]}]).
+    The path is validated and compiled once when the configuration is loaded, such that extracting a value only
+    needs one lookup per step. The elements of lists are extracted as dicts (ordered like the parameter mapping).
+    """
+
+    def __init__(self, path):
+        """
+        Compile an access path.
+        :param path: A list with keys for filtering a nested dictionary (or indices for lists), optionally followed by
+            the list matching operator and a parameter mapping for the list elements.
+        """
+        if not isinstance(path, list):
+            raise IllegalConfigurationError("A filter path must be an array: " + str(path))
+
+        self.path = path
+        # list of tuples with dictionary key and list index (None if the key cannot be used as index)
+        self.steps = []
+        # True if the path ends with the list matching operator
+        self.list_operator = False
+        # compiled parameter mapping for list elements (None if the complete list should be extracted)
+        self.element_filters = None
+        self.element_parameters = None
+        self.element_extractors = None
+        self.element_getter = None
+
+        for position, step in enumerate(path):
+            if step == LIST_OPERATOR:
+                self._compile_list_operator(path[position + 1:])
+                break
+            if isinstance(step, list) or isinstance(step, dict):
+                raise IllegalConfigurationError("A filter path must only contain filter strings or the list matching "
+                                                "operator (optionally followed by a filter object): " + str(path))
+            self.steps.append((step, FilterPath._get_index(step)))
+
+        # compiled function for the steps
+        self.extract_steps = self._compile_steps()
+
+    def _compile_list_operator(self, remaining_path):
+        """
+        Compile the list matching operator and the parameter mapping for list elements.
+        :param remaining_path: Elements of the path after the list matching operator.
+        """
+        self.list_operator = True
+        if len(remaining_path) == 0:
+            return
+        if len(remaining_path) > 1:
+            raise IllegalConfigurationError("The list matching operator must be the last or second-last element of the "
+                                            "filter path: " + str(self.path))
+        if not isinstance(remaining_path[0], dict):
+            raise IllegalConfigurationError("The list matching operator must be succeeded by a filter object: "
+                                            + str(self.path))
+        self.element_filters = [(parameter, FilterPath(element_path))
+                                for parameter, element_path in remaining_path[0].items()]
+        self.element_parameters = [parameter for parameter, _ in self.element_filters]
+        # element paths without list matching operator are extracted by their compiled function directly
+        self.element_extractors = [element_filter.apply if element_filter.list_operator or not element_filter.steps
+                                   else element_filter.extract_steps for _, element_filter in self.element_filters]
+        # if all element paths are single dictionary keys, the values are fetched at once
+        if all(not element_filter.list_operator and len(element_filter.steps) == 1
+               and element_filter.steps[0][1] is None for _, element_filter in self.element_filters):
+            self.element_getter = itemgetter(*[element_filter.steps[0][0]
+                                               for _, element_filter in self.element_filters])
+
+    @staticmethod
+    def _get_index(step):
+        """
+        Get the list index for a step of the path.
+        :param step: Key of the step.
+        :return: The step as integer, None if it cannot be used as list index.
+        """
+        try:
+            return int(step)
+        except (TypeError, ValueError):
+            return None
+
+    def _compile_steps(self):
+        """
+        Compile the steps of the path (before the list matching operator) into a function.
+        :return: Function extracting the value at the end of the steps from a JSON response (the string "None" if a
+            value on the path is None, None if the path does not exist).
+        """
+        steps = self.steps
+
+        if len(steps) == 1 and steps[0][1] is None:
+            # single dictionary key (most common case)
+            key = steps[0][0]
+
+            def extract_key(value):
+                try:
+                    value = value[key]
+                except (KeyError, IndexError, TypeError):
+                    return self._log_miss(value)
+                if value is None:
+                    logger.info("Result for filter %s was None.", key)
+                    return "None"
+                return value
+
+            return extract_key
+
+        def extract_path(value):
+            response = value
+            try:
+                for key, index in steps:
+                    if index is not None and isinstance(value, list):
+                        value = value[index]
+                    else:
+                        # use current key as dictionary key to filter the response
+                        value = value[key]
+                        if value is None:
+                            logger.info("Result for filter %s was None.", key)
+                            return "None"
+            except (KeyError, IndexError, TypeError):
+                return self._log_miss(response)
+            return value
+
+        return extract_path
+
+    def _log_miss(self, json_response):
+        """
+        Log that the path does not exist in a response (the response itself is not logged, because it may be large).
+        :param json_response: The JSON response.
+        :return: None
+        """
+        logger.error("Could not apply filter path %s to response of type %s.", self.path, type(json_response).__name__)
+        return None
+
+    def apply(self, json_response):
+        """
+        Extract a value from a JSON response.
+        :param json_response: The JSON response to filter.
+        :return: The extracted value if the filter has successfully been applied (can be a simple value, dict, or
+            list), None otherwise.
+        """
+        filtered_response = self.extract_steps(json_response) if self.steps else json_response
+
+        if not self.list_operator or filtered_response is None or filtered_response == "None":
+            return filtered_response
+
+        if not isinstance(filtered_response, list):
+            raise IllegalArgumentError("List matching operator reached, but current position in response is not "
+                                       "a list.")
+        if self.element_filters is None:
+            # save complete list
+            return list(filtered_response)
+        # apply mapping for list element parameters
+        parameters = self.element_parameters
+        extractors = self.element_extractors
+        getter = self.element_getter
+        if getter is None or len(parameters) == 1:
+            return [dict(zip(parameters, [extract(element) for extract in extractors]))
+                    for element in filtered_response]
+
+        extracted_list = []
+        for element in filtered_response:
+            try:
+                values = getter(element)
+            except (KeyError, IndexError, TypeError):
+                values = None
+            if values is None or None in values:
+                # missing or None values are handled (and logged) by the compiled functions
+                values = [extract(element) for extract in extractors]
+            extracted_list.append(dict(zip(parameters, values)))
+        return extracted_list
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# number of inserted keys after which the on-disk set is committed
+COMMIT_INTERVAL = 10000
+
+
+class InputKeySet(object):
+    """
+    Set of the keys of imported entities (see Entity.get_key), used to detect duplicates in the input file in
+    constant time per row. By default, the keys are kept in memory. For input files that are too large for that,
+    the keys can be stored in a temporary SQLite database instead (only a hash of each key is stored).
+    """
+
+    def __init__(self, path=None):
+        """
+        Create an empty set.
+        :param path: Path to a temporary SQLite database (default: None, meaning that the keys are kept in memory).
+            An existing database is cleared and the file is removed when the set is closed.
+        """
+        self.path = path
+        self.keys = None
+        self.connection = None
+        self.uncommitted = 0
+
+        if path is None:
+            self.keys = set()
+        else:
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self.connection = sqlite3.connect(path)
+            # the database is only needed during the import, durability is not required
+            self.connection.execute("PRAGMA journal_mode=OFF")
+            self.connection.execute("PRAGMA synchronous=OFF")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS input_keys (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+            self.connection.execute("DELETE FROM input_keys")
+            logger.info("Storing input keys for duplicate detection in " + str(path) + ".")
+
+    def add(self, key):
+        """
+        Add a key to the set.
+        :param key: Hashable key (tuple of strings).
+        :return: True if the key was not in the set, False otherwise (i.e., the entity is a duplicate).
+        """
+        if self.keys is not None:
+            size = len(self.keys)
+            self.keys.add(key)
+            return len(self.keys) > size
+
+        digest = hashlib.blake2b(json.dumps(key).encode("utf-8"), digest_size=16).digest()
+        cursor = self.connection.execute("INSERT OR IGNORE INTO input_keys VALUES (?)", (digest,))
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_INTERVAL:
+            self.connection.commit()
+            self.uncommitted = 0
+        return cursor.rowcount == 1
+
+    def close(self):
+        """
+        Release the set (removes the temporary database).
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            os.remove(self.path)
+        self.keys = None
@@ -0,0 +1,239 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.parse
+
+from collections import Counter
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# key of JSON objects that encode binary values (e.g., raw downloads)
+BYTES_KEY = "__bytes__"
+# placeholder for secrets (API keys) in the URIs stored in the journal, followed by the index of the secret
+SECRET_PLACEHOLDER = "{journal_secret_"
+
+
+class Journal(object):
+    """
+    Append-only journal of completed entities, written while the data is retrieved.
+    Each line is a JSON object with the ID of an entity (SHA-256 hash of its URI, which may contain API keys), the
+    return value of its retrieval, the number of attempts, and the output parameters. If a run is resumed, journaled
+    entities are restored instead of retrieved again.
+    Entities that depend on their predecessor (range variables) are journaled as one chain once the whole chain has
+    been retrieved, because callbacks such as check_if_next_page_exists need the responses of the predecessors.
+    Entities that failed because of connection errors are not journaled, i.e., they are retrieved again.
+    Entities appended to a chain while it is retrieved (lazily expanded range variables and pagination) are journaled
+    with the first entity of the chain (their URIs are stored with API keys replaced by placeholders) and appended to
+    the chain again when it is restored.
+    Duplicate input rows (if duplicates are not ignored) have the same URI and are journaled once per row, thus each
+    restored entity takes one of the records with its ID.
+    The journal is removed once the run has been exported, unless entities failed because of connection errors.
+    When resuming, only the byte offsets of the records are kept in memory and each record is read when its entity
+    is restored, such that the memory usage of streamed runs does not grow with the size of the journal.
+    """
+
+    def __init__(self, path, resume=False, secrets=None):
+        """
+        Open a journal.
+        :param path: Path to the journal file.
+        :param resume: Restore entities from an existing journal and append to it (default: False, meaning that an
+            existing journal is overwritten).
+        :param secrets: List with values that must not be written to the journal (e.g., API keys).
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.resume = resume
+        # secrets as inserted into URIs (as is and URL-encoded)
+        self.secrets = []
+        for secret in secrets or []:
+            for value in [secret, urllib.parse.quote(secret, safe="")]:
+                if value and value not in self.secrets:
+                    self.secrets.append(value)
+        # False once a chain has not been journaled because of a connection error (the journal is kept for resuming)
+        self.complete = True
+        # byte offsets of the journaled records by ID (loaded when resuming, removed once they have been restored)
+        self.offsets = dict()
+        # file the records are read from when they are restored (None if not resuming)
+        self.reader = None
+
+        complete = True
+        if resume and os.path.exists(path):
+            complete = self._load()
+            self.reader = open(path, 'rb')
+
+        self.file = open(path, 'a' if resume else 'w', encoding='utf8')
+        if not complete:
+            # terminate truncated last line
+            self.file.write("\n")
+        # the journal is shared by all workers
+        self.lock = threading.Lock()
+
+    def _load(self):
+        """
+        Index the records of an existing journal by their byte offsets. A truncated last line (e.g., after a crash) is
+        ignored.
+        :return: True if the last line of the journal is complete, False otherwise.
+        """
+        complete = True
+        count = 0
+        offset = 0
+        with open(self.path, 'rb') as fp:
+            for line_number, line in enumerate(fp, 1):
+                line_offset = offset
+                offset += len(line)
+                complete = line.endswith(b"\n")
+                try:
+                    entity_id = json.loads(line)["id"]
+                except (ValueError, KeyError, TypeError):
+                    logger.error("Ignoring malformed record in line " + str(line_number) + " of journal "
+                                 + str(self.path) + ".")
+                    continue
+                self.offsets.setdefault(entity_id, []).append(line_offset)
+                count += 1
+
+        logger.info("Resuming from journal " + str(self.path) + " with " + str(count) + " entities.")
+        return complete
+
+    def _read(self, offset):
+        """
+        Read a record from the journal.
+        :param offset: Byte offset of the record.
+        :return: Dictionary with the record.
+        """
+        with self.lock:
+            self.reader.seek(offset)
+            line = self.reader.readline()
+        return json.loads(line, object_hook=Journal._decode)
+
+    def restore(self, chain):
+        """
+        Restore a chain of entities from the journal.
+        :param chain: List of entities that depend on their predecessor (journaled entities that have been appended
+            while retrieving the chain are appended to it).
+        :return: List with the journaled return values of entity.retrieve_data, None if the chain has not been
+            journaled completely.
+        """
+        first_offsets = self.offsets.get(Journal.get_id(chain[0].uri))
+        if not first_offsets:
+            return None
+        first_record = self._read(first_offsets[0])
+        uris = [entity.uri for entity in chain] + [self._reveal(page) for page in first_record.get("pages", [])]
+        ids = [Journal.get_id(uri) for uri in uris]
+        if not self._contains(ids):
+            return None
+
+        for uri in uris[len(chain):]:
+            chain.append(chain[-1].create_page(uri))
+
+        records = []
+        for entity, entity_id in zip(chain, ids):
+            # each record is restored once, such that the memory is freed while the run progresses
+            id_offsets = self.offsets[entity_id]
+            offset = id_offsets.pop(0)
+            if not id_offsets:
+                del self.offsets[entity_id]
+            record = first_record if not records else self._read(offset)
+            entity.output_parameters = record["output_parameters"]
+            entity.attempts = record["attempts"]
+            records.append(record)
+        return [record["result"] for record in records]
+
+    def _contains(self, ids):
+        """
+        Check if the journal contains a record for each ID (IDs that occur several times need several records).
+        :param ids: List with IDs.
+        :return: True if all IDs have been journaled, False otherwise.
+        """
+        return all(len(self.offsets.get(entity_id, ())) >= count for entity_id, count in Counter(ids).items())
+
+    @staticmethod
+    def get_id(uri):
+        """
+        Get the ID of an entity in the journal.
+        :param uri: The URI of the entity.
+        :return: Hex digest of the SHA-256 hash of the URI.
+        """
+        return hashlib.sha256(uri.encode("utf8")).hexdigest()
+
+    def _hide(self, uri):
+        """
+        Replace the secrets in a URI by placeholders.
+        """
+        for index, secret in enumerate(self.secrets):
+            uri = uri.replace(secret, SECRET_PLACEHOLDER + str(index) + "}")
+        return uri
+
+    def _reveal(self, uri):
+        """
+        Replace the placeholders in a URI by the secrets (see _hide).
+        """
+        for index, secret in enumerate(self.secrets):
+            uri = uri.replace(SECRET_PLACEHOLDER + str(index) + "}", secret)
+        return uri
+
+    def write(self, chain, results):
+        """
+        Append a retrieved chain of entities to the journal (and flush it, such that it survives a crash).
+        :param chain: List of entities that depend on their predecessor.
+        :param results: List with the return values of entity.retrieve_data.
+        """
+        if None in results:
+            # connection error, retrieve chain again when resuming
+            self.complete = False
+            return
+
+        records = [{
+            "id": Journal.get_id(entity.uri),
+            "result": result,
+            "attempts": entity.attempts,
+            "output_parameters": entity.output_parameters
+        } for entity, result in zip(chain, results)]
+        # entities appended to the chain while retrieving it (range variables and pagination)
+        pages = [self._hide(entity.uri) for entity in chain[1:]]
+        if pages:
+            records[0]["pages"] = pages
+
+        lines = [json.dumps(record, default=Journal._encode) + "\n" for record in records]
+
+        with self.lock:
+            self.file.writelines(lines)
+            self.file.flush()
+
+    @staticmethod
+    def _encode(value):
+        """
+        Encode values that cannot be serialized as JSON (binary values are encoded using Base64).
+        """
+        if isinstance(value, bytes):
+            return {BYTES_KEY: base64.b64encode(value).decode("ascii")}
+        return str(value)
+
+    @staticmethod
+    def _decode(json_object):
+        """
+        Decode binary values encoded by _encode.
+        """
+        if len(json_object) == 1 and BYTES_KEY in json_object:
+            return base64.b64decode(json_object[BYTES_KEY])
+        return json_object
+
+    def close(self, remove=False):
+        """
+        Close the journal file.
+        :param remove: Remove the journal file if all chains have been journaled, i.e., if the run has been exported
+            and resuming it would not retrieve any entity again (default: False).
+        """
+        with self.lock:
+            self.file.close()
+            if self.reader is not None:
+                self.reader.close()
+            if remove and self.complete and os.path.exists(self.path):
+                os.remove(self.path)
+                logger.info("Removed journal " + str(self.path) + ", all entities have been exported.")
@@ -0,0 +1,147 @@
+import io
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # orjson is optional (faster decoding)
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson is only required for incremental parsing
+    ijson = None
+
+from util.exceptions import IllegalArgumentError, IllegalConfigurationError
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# available JSON decoders ("auto" selects orjson if it is installed)
+JSON_DECODERS = ["auto", "json", "orjson"]
+DEFAULT_JSON_DECODER = "auto"
+
+
+class JsonDecoder(object):
+    """
+    Decoder for JSON responses, which are decoded directly from the response bytes (instead of decoding the bytes to
+    a string first). The standard library is used by default, orjson is used if it is installed (or selected).
+    Optionally, very large responses can be parsed incrementally using ijson, in which case only the parts of the
+    response that are needed (e.g., by the output parameter mapping) are built.
+    """
+
+    def __init__(self, name=DEFAULT_JSON_DECODER):
+        """
+        Initialize the decoder.
+        :param name: One of "auto", "json", "orjson".
+        """
+        if name not in JSON_DECODERS:
+            raise IllegalArgumentError("Unknown JSON decoder: " + str(name))
+        if name == "auto":
+            name = "json" if orjson is None else "orjson"
+        if name == "orjson" and orjson is None:
+            raise IllegalConfigurationError("The JSON decoder orjson requires the package orjson "
+                                            "(pip3 install orjson).")
+
+        self.name = name
+        self.loads = json.loads if orjson is None or name == "json" else orjson.loads
+        logger.info("Using JSON decoder " + name + ".")
+
+    def decode(self, body):
+        """
+        Decode a JSON response.
+        :param body: The response body (bytes).
+        :return: The decoded JSON object.
+        """
+        try:
+            return self.loads(body)
+        except ValueError:
+            if self.loads is json.loads:
+                raise
+            # orjson only accepts UTF-8, the standard library detects UTF-16 and UTF-32 as well
+            return json.loads(body)
+
+    @staticmethod
+    def decode_incrementally(body, prefixes):
+        """
+        Parse a JSON response incrementally and build only the values at the given prefixes, parsing stops once all
+        of them have been found.
+        :param body: The response body (bytes).
+        :param prefixes: List of prefixes (lists of dictionary keys, see get_prefix), no prefix may be contained in
+            another one.
+        :return: Dictionary that only contains the values at the given prefixes (nested like in the response).
+        """
+        # prefixes in the notation of ijson, e.g., "queries.request"
+        remaining = {".".join(prefix): prefix for prefix in prefixes}
+        document = dict()
+        builder = None
+        keys = None
+        depth = 0
+
+        for prefix, event, value in ijson.parse(io.BytesIO(body), use_float=True):
+            if builder is None:
+                if prefix not in remaining or event in ("map_key", "end_map", "end_array"):
+                    continue
+                # value at prefix starts
+                keys = remaining.pop(prefix)
+                builder = ijson.common.ObjectBuilder()
+                depth = 0
+
+            builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+
+            if depth == 0:
+                # value at prefix is complete, insert it into the document
+                parent = document
+                for key in keys[:-1]:
+                    parent = parent.setdefault(key, dict())
+                parent[keys[-1]] = builder.value
+                builder = None
+                if not remaining:
+                    break
+
+        return document
+
+    @staticmethod
+    def get_prefix(path):
+        """
+        Get the prefix of an access path that can be parsed incrementally, i.e., the leading dictionary keys
+        (list indices, the list matching operator, and keys that are ambiguous in the notation of ijson end the
+        prefix).
+        :param path: Access path (e.g., ["queries", "request", "0", "totalResults"]).
+        :return: List with the leading dictionary keys (e.g., ["queries", "request"]).
+        """
+        prefix = []
+        for key in path:
+            if not isinstance(key, str) or key == "*" or key == "item" or "." in key:
+                break
+            try:
+                int(key)
+                break
+            except ValueError:
+                prefix.append(key)
+        return prefix
+
+    @staticmethod
+    def get_prefixes(paths):
+        """
+        Get the prefixes that need to be parsed incrementally for a list of access paths.
+        :param paths: List of access paths.
+        :return: List of prefixes without prefixes that are contained in other ones, None if one of the paths needs
+            the whole response.
+        """
+        if ijson is None:
+            raise IllegalConfigurationError("Incremental parsing requires the package ijson (pip3 install ijson).")
+
+        prefixes = []
+        for prefix in sorted(JsonDecoder.get_prefix(path) for path in paths):
+            if len(prefix) == 0:
+                return None
+            # skip prefix if the value of a shorter (sorted first) prefix contains it
+            if prefixes and prefix[:len(prefixes[-1])] == prefixes[-1]:
+                continue
+            prefixes.append(prefix)
+        return prefixes
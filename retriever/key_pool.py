@@ -0,0 +1,119 @@
+import logging
+import threading
+import urllib.parse
+
+from util.exceptions import IllegalConfigurationError
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# variable in URI template and header values that is replaced with the selected key
+KEY_POOL_VARIABLE = "api_key"
+# messages in the body of a 403 response indicating invalid credentials (e.g., GitHub: "Bad credentials")
+BAD_CREDENTIALS_MESSAGES = [b"Bad credentials"]
+
+
+class KeyPool(object):
+    """
+    Pool of API keys (e.g., GitHub access tokens) that are rotated to multiply the available request budget.
+    Each request uses the least-exhausted key according to the rate limit state of that key,
+    which the rate limiter tracks separately for each key.
+    The selected key replaces the variable {api_key} in the URI template and in the header values, e.g.:
+        "headers": {"Authorization": "token {api_key}"},
+        "api_key_pool": ["<token_1>", "<token_2>"]
+    Keys that are rejected by the API (401, or 403 with a bad credentials message) are removed from the pool.
+    Other 403 responses (e.g., "Resource not accessible") concern the requested resource, not the key.
+    """
+
+    def __init__(self, keys):
+        """
+        Initialize a key pool.
+        :param keys: List with API keys.
+        """
+        if not isinstance(keys, list) or len(keys) == 0:
+            raise IllegalConfigurationError("API key pool must be a non-empty array.")
+
+        # keys that have not been rejected by the API
+        self.keys = list(keys)
+        # position of keys in the configuration (used to identify keys in the log without revealing them)
+        self.positions = {key: position for position, key in enumerate(keys, 1)}
+        # number of requests per key (used to rotate keys with the same budget)
+        self.usage = dict.fromkeys(keys, 0)
+        # the key pool is shared by all workers
+        self.lock = threading.Lock()
+
+    def acquire(self, rate_limiter, host):
+        """
+        Select the least-exhausted key for the next request to a host.
+        :param rate_limiter: Rate limiter that knows the rate limit state of each key.
+        :param host: The host of the request.
+        :return: The selected API key.
+        """
+        with self.lock:
+            api_key = max(self.keys, key=lambda key: self._get_priority(rate_limiter, host, key))
+            self.usage[api_key] += 1
+            return api_key
+
+    def _get_priority(self, rate_limiter, host, api_key):
+        """
+        Prioritize keys by remaining requests (unknown counts as unlimited), then by earliest reset,
+        then by least usage.
+        """
+        budget = rate_limiter.get_budget(self.get_bucket(host, api_key))
+        if budget is None:
+            return float("inf"), 0, -self.usage[api_key]
+        remaining, reset = budget
+        return remaining, -reset, -self.usage[api_key]
+
+    def get_bucket(self, host, api_key):
+        """
+        Get the rate limit bucket for requests to a host using a key.
+        :param host: The host of the request.
+        :param api_key: The API key.
+        :return: Name of the bucket.
+        """
+        return host + " (key " + str(self.positions[api_key]) + ")"
+
+    @staticmethod
+    def apply(api_key, uri, headers):
+        """
+        Insert a key into a URI and headers.
+        :param api_key: The API key.
+        :param uri: URI that may contain the variable {api_key}.
+        :param headers: Dictionary with headers whose values may contain the variable {api_key}.
+        :return: Tuple with URI and headers.
+        """
+        placeholder = "{" + KEY_POOL_VARIABLE + "}"
+        uri = uri.replace(placeholder, urllib.parse.quote(api_key))
+        headers = {name: value.replace(placeholder, api_key) for name, value in headers.items()}
+        return uri, headers
+
+    @staticmethod
+    def is_rejected(status_code, content):
+        """
+        Check if a response indicates that the API rejected the key.
+        :param status_code: HTTP status code of the response.
+        :param content: Content of the response (bytes).
+        :return: True for 401 and for 403 with a bad credentials message, False otherwise.
+        """
+        if status_code == 401:
+            return True
+        return status_code == 403 and content is not None \
+            and any(message in content for message in BAD_CREDENTIALS_MESSAGES)
+
+    def remove(self, api_key):
+        """
+        Remove a rejected key from the pool. The last key is never removed.
+        :param api_key: The API key.
+        :return: True if another key is available for retrying the request, False otherwise.
+        """
+        with self.lock:
+            if api_key not in self.keys:
+                # already removed by another worker
+                return len(self.keys) > 0
+            if len(self.keys) == 1:
+                return False
+            self.keys.remove(api_key)
+            logger.error("API key " + str(self.positions[api_key]) + " rejected, removed it from the pool ("
+                         + str(len(self.keys)) + " keys left).")
+            return True
@@ -0,0 +1,409 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from collections import Counter
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# upper bounds (s) of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# default interval (s) between two exports of the metrics
+DEFAULT_METRICS_INTERVAL = 10
+# metrics files with this extension are written in the Prometheus text format, other files as JSON
+PROMETHEUS_EXTENSION = ".prom"
+# prefix of the Prometheus metric names
+PROMETHEUS_PREFIX = "api_retriever_"
+
+
+class Histogram(object):
+    """ Histogram with fixed buckets (like Prometheus histograms, the bucket counts are not cumulative here). """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # the last count is for values above the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_quantile(self, quantile):
+        """
+        Estimate a quantile by linear interpolation within the bucket containing it.
+        :param quantile: The quantile (between 0 and 1).
+        :return: The estimated value, None if no value has been observed.
+        """
+        if self.count == 0:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0
+                if index == len(self.buckets):
+                    # above the largest bucket, nothing is known about the distribution
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": _round(self.get_quantile(0.5)),
+            "p90": _round(self.get_quantile(0.9)),
+            "p99": _round(self.get_quantile(0.99)),
+            "buckets": {str(bound): count for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts)}
+        }
+
+
+class HostMetrics(object):
+    """ Metrics of the requests sent to one host. """
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.requests = 0
+        self.response_bytes = 0
+        # number of responses per status code ("error" for connection errors)
+        self.status_codes = Counter()
+        self.retries = 0
+        self.cached = 0
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "response_bytes": self.response_bytes,
+            "status_codes": dict(self.status_codes),
+            "retries": self.retries,
+            "cached": self.cached,
+            "latency": self.latency.to_dict()
+        }
+
+
+class ConfigurationMetrics(object):
+    """ Progress and results of the entities of one entity configuration. """
+
+    def __init__(self):
+        # chains of entities (see EntityList._get_chains) to retrieve and retrieved so far
+        self.chains = 0
+        self.chains_completed = 0
+        self.retrieved = 0
+        self.failed = 0
+        # entities removed by filter callbacks, per callback
+        self.filtered = Counter()
+
+    def to_dict(self):
+        return {
+            "chains": self.chains,
+            "chains_completed": self.chains_completed,
+            "retrieved": self.retrieved,
+            "failed": self.failed,
+            "filtered": dict(self.filtered)
+        }
+
+
+class Metrics(object):
+    """
+    Metrics collected in the retrieval path, shared by all entity lists and workers of a run (see Transport):
+    latency histograms, response bytes, status codes, and retries per host, the time spent sleeping (delays and
+    rate limits), waiting for responses (I/O), and processing responses (decoding and callbacks), as well as the
+    progress and the filter drops per entity configuration.
+    The time spent is summed over all workers, so the shares (not the absolute values) show whether a run is
+    throttled, network-bound, or CPU-bound.
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.hosts = dict()
+        self.configurations = dict()
+        self.sleep_time = 0.0
+        self.io_time = 0.0
+        self.processing_time = 0.0
+        # the metrics are shared by all workers
+        self.lock = threading.Lock()
+
+    def _get_host(self, host):
+        host_metrics = self.hosts.get(host)
+        if host_metrics is None:
+            host_metrics = self.hosts[host] = HostMetrics()
+        return host_metrics
+
+    def _get_configuration(self, name):
+        configuration_metrics = self.configurations.get(name)
+        if configuration_metrics is None:
+            configuration_metrics = self.configurations[name] = ConfigurationMetrics()
+        return configuration_metrics
+
+    def record_response(self, host, seconds, status_code, size):
+        """
+        Record a response (or a connection error).
+        :param host: Host of the request.
+        :param seconds: Time from sending the request until the response has been read.
+        :param status_code: HTTP status code (None for connection errors).
+        :param size: Size of the response body in bytes.
+        """
+        with self.lock:
+            host_metrics = self._get_host(host)
+            host_metrics.requests += 1
+            host_metrics.latency.observe(seconds)
+            host_metrics.response_bytes += size
+            host_metrics.status_codes["error" if status_code is None else str(status_code)] += 1
+            self.io_time += seconds
+
+    def record_retry(self, host):
+        with self.lock:
+            self._get_host(host).retries += 1
+
+    def record_cached(self, host):
+        with self.lock:
+            self._get_host(host).cached += 1
+
+    def record_sleep(self, seconds):
+        with self.lock:
+            self.sleep_time += seconds
+
+    def record_processing(self, seconds):
+        with self.lock:
+            self.processing_time += seconds
+
+    def record_entity(self, name, retrieved):
+        """
+        Record the result of the retrieval of an entity.
+        :param name: Name of the entity configuration.
+        :param retrieved: True if the data has been retrieved, False if the retrieval failed.
+        """
+        with self.lock:
+            configuration_metrics = self._get_configuration(name)
+            if retrieved:
+                configuration_metrics.retrieved += 1
+            else:
+                configuration_metrics.failed += 1
+
+    def record_filtered(self, name, callback):
+        """
+        Record an entity removed by a filter callback.
+        :param name: Name of the entity configuration.
+        :param callback: The callback function.
+        """
+        with self.lock:
+            self._get_configuration(name).filtered[callback.__name__] += 1
+
+    def add_chains(self, name, count):
+        with self.lock:
+            self._get_configuration(name).chains += count
+
+    def complete_chain(self, name):
+        with self.lock:
+            self._get_configuration(name).chains_completed += 1
+
+    def to_dict(self, rate_limiter=None):
+        """
+        Get a snapshot of the metrics.
+        :param rate_limiter: Rate limiter of the run (optional, to include the remaining requests per bucket).
+        :return: Dictionary with the metrics.
+        """
+        with self.lock:
+            snapshot = {
+                "timestamp": round(time.time(), 3),
+                "elapsed": round(time.time() - self.start_time, 3),
+                "time": {"sleep": round(self.sleep_time, 6), "io": round(self.io_time, 6),
+                         "processing": round(self.processing_time, 6)},
+                "hosts": {host: host_metrics.to_dict() for host, host_metrics in self.hosts.items()},
+                "configurations": {name: configuration_metrics.to_dict()
+                                   for name, configuration_metrics in self.configurations.items()}
+            }
+        snapshot["rate_limits"] = dict()
+        if rate_limiter is not None:
+            for bucket, (remaining, reset) in rate_limiter.get_budgets().items():
+                snapshot["rate_limits"][bucket] = {"remaining": remaining, "reset": reset}
+        return snapshot
+
+    @staticmethod
+    def to_prometheus(snapshot):
+        """
+        Convert a snapshot (see to_dict) into the Prometheus text format.
+        :param snapshot: Dictionary with the metrics.
+        :return: String with the metrics.
+        """
+        lines = []
+
+        def add(name, metric_type, description, samples):
+            lines.append("# HELP " + PROMETHEUS_PREFIX + name + " " + description)
+            lines.append("# TYPE " + PROMETHEUS_PREFIX + name + " " + metric_type)
+            for suffix, labels, value in samples:
+                lines.append(PROMETHEUS_PREFIX + name + suffix + _format_labels(labels) + " " + _format_value(value))
+
+        hosts = snapshot["hosts"]
+        latency_samples = []
+        for host, host_metrics in hosts.items():
+            cumulative = 0
+            for bound, count in host_metrics["latency"]["buckets"].items():
+                cumulative += count
+                latency_samples.append(("_bucket", {"host": host, "le": bound}, cumulative))
+            latency_samples.append(("_sum", {"host": host}, host_metrics["latency"]["sum"]))
+            latency_samples.append(("_count", {"host": host}, host_metrics["latency"]["count"]))
+        add("request_duration_seconds", "histogram", "Time from sending a request until the response has been read.",
+            latency_samples)
+        add("response_bytes_total", "counter", "Size of the response bodies.",
+            [("", {"host": host}, host_metrics["response_bytes"]) for host, host_metrics in hosts.items()])
+        add("responses_total", "counter", "Responses per status code (error: connection error).",
+            [("", {"host": host, "status": status}, count) for host, host_metrics in hosts.items()
+             for status, count in host_metrics["status_codes"].items()])
+        add("retries_total", "counter", "Retried requests.",
+            [("", {"host": host}, host_metrics["retries"]) for host, host_metrics in hosts.items()])
+        add("cached_responses_total", "counter", "Responses used from the response cache.",
+            [("", {"host": host}, host_metrics["cached"]) for host, host_metrics in hosts.items()])
+        add("time_seconds_total", "counter", "Time spent by all workers sleeping, waiting for responses, and "
+                                             "processing responses.",
+            [("", {"activity": activity}, seconds) for activity, seconds in snapshot["time"].items()])
+        add("rate_limit_remaining", "gauge", "Remaining requests in the current rate limit window.",
+            [("", {"bucket": bucket}, limit["remaining"]) for bucket, limit in snapshot["rate_limits"].items()])
+        add("rate_limit_reset_timestamp_seconds", "gauge", "Reset of the current rate limit window.",
+            [("", {"bucket": bucket}, limit["reset"]) for bucket, limit in snapshot["rate_limits"].items()])
+
+        configurations = snapshot["configurations"]
+        add("chains", "gauge", "Chains of entities to retrieve.",
+            [("", {"configuration": name}, metrics["chains"]) for name, metrics in configurations.items()])
+        add("chains_completed_total", "counter", "Chains of entities retrieved.",
+            [("", {"configuration": name}, metrics["chains_completed"]) for name, metrics in configurations.items()])
+        add("entities_total", "counter", "Entities per result of the retrieval.",
+            [("", {"configuration": name, "result": result}, metrics[result])
+             for name, metrics in configurations.items() for result in ("retrieved", "failed")])
+        add("filtered_entities_total", "counter", "Entities removed by filter callbacks.",
+            [("", {"configuration": name, "callback": callback}, count)
+             for name, metrics in configurations.items() for callback, count in metrics["filtered"].items()])
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def get_progress(snapshot):
+        """
+        Get a progress line for a snapshot (see to_dict), including an estimate of the remaining time for the
+        configuration retrieved first (the main list).
+        :param snapshot: Dictionary with the metrics.
+        :return: String with the progress line.
+        """
+        parts = []
+        eta = None
+        for name, metrics in snapshot["configurations"].items():
+            chains, completed = metrics["chains"], metrics["chains_completed"]
+            part = name + ": " + str(completed) + "/" + str(chains) + " chains"
+            if chains:
+                part += " (" + str(round(100 * completed / chains, 1)) + "%)"
+            parts.append(part)
+            if eta is None and completed:
+                eta = snapshot["elapsed"] * (chains - completed) / completed
+
+        requests = sum(host_metrics["requests"] for host_metrics in snapshot["hosts"].values())
+        retries = sum(host_metrics["retries"] for host_metrics in snapshot["hosts"].values())
+        errors = sum(count for host_metrics in snapshot["hosts"].values()
+                     for status, count in host_metrics["status_codes"].items() if not status.startswith("2"))
+        total_time = sum(snapshot["time"].values())
+        line = "Progress: " + ", ".join(parts) if parts else "Progress: no entities"
+        line += "; " + str(requests) + " requests (" + str(round(requests / max(snapshot["elapsed"], 0.001), 1)) \
+                + "/s, " + str(retries) + " retries, " + str(errors) + " errors)"
+        if total_time > 0:
+            line += "; time: " + ", ".join(str(round(100 * seconds / total_time)) + "% " + activity
+                                           for activity, seconds in snapshot["time"].items())
+        if eta is not None:
+            line += "; ETA " + time.strftime("%H:%M:%S", time.gmtime(eta))
+        return line
+
+
+class MetricsReporter(object):
+    """
+    Background thread that periodically writes the metrics of a run to a file (JSON, or the Prometheus text format if
+    the file name ends with .prom) and/or logs a progress line.
+    """
+
+    def __init__(self, metrics, rate_limiter=None, metrics_file=None, interval=DEFAULT_METRICS_INTERVAL,
+                 progress=False):
+        """
+        :param metrics: Object of class Metrics.
+        :param rate_limiter: Rate limiter of the run (optional, to export the remaining requests per bucket).
+        :param metrics_file: Path to the metrics file (optional).
+        :param interval: Interval between two exports in seconds.
+        :param progress: Log a progress line in each interval (default: False).
+        """
+        assert interval > 0
+
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.metrics_file = metrics_file
+        self.interval = interval
+        self.progress = progress
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def report(self):
+        """
+        Write the metrics file and log the progress line (if configured).
+        """
+        snapshot = self.metrics.to_dict(self.rate_limiter)
+        if self.metrics_file is not None:
+            try:
+                self._write(snapshot)
+            except OSError as e:
+                logger.error("Could not write metrics to " + str(self.metrics_file) + ": " + str(e))
+        if self.progress:
+            logger.info(Metrics.get_progress(snapshot))
+
+    def _write(self, snapshot):
+        """
+        Replace the metrics file atomically, such that readers never see a partially written file.
+        :param snapshot: Dictionary with the metrics.
+        """
+        temp_file = self.metrics_file + ".tmp"
+        with open(temp_file, "w", encoding="utf8") as fp:
+            if self.metrics_file.endswith(PROMETHEUS_EXTENSION):
+                fp.write(Metrics.to_prometheus(snapshot))
+            else:
+                json.dump(snapshot, fp, indent=2)
+        os.replace(temp_file, self.metrics_file)
+
+    def stop(self):
+        """
+        Stop the reporter and export the final metrics.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.report()
+
+
+def _round(value):
+    return None if value is None else round(value, 6)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(name + "=\"" + str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+                          + "\"" for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
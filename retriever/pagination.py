@@ -0,0 +1,218 @@
+import re
+import urllib.parse
+
+import requests
+
+from util.exceptions import IllegalConfigurationError
+
+# pagination types
+LINK_PAGINATION = "link"
+CURSOR_PAGINATION = "cursor"
+OFFSET_PAGINATION = "offset"
+PAGINATION_TYPES = [LINK_PAGINATION, CURSOR_PAGINATION, OFFSET_PAGINATION]
+# maximum number of pages requested at once if the total number of results is known (totals may be estimates)
+OFFSET_BATCH_SIZE = 20
+
+
+class Pagination(object):
+    """
+    Native pagination of API responses. Starting from the first page (the URI of the entity), the next pages are
+    retrieved until the results run out, each page becoming an entity that shares the input parameters of the first
+    page (like range variables, but without requesting pages beyond the last one).
+    Configured using the optional "pagination" object in the entity configuration, e.g.:
+        "pagination": {"type": "link"}
+            follows the URI in the "Link: <...>; rel="next"" header of each response (e.g., GitHub).
+        "pagination": {"type": "cursor", "cursor": ["next_token"], "parameter": "next_token", "has_more": ["has_more"]}
+            reads the cursor from the response and sets it as query parameter (if no parameter is configured, the
+            cursor must be the URI of the next page); retrieval stops when the cursor is missing or "has_more" is false.
+        "pagination": {"type": "offset", "parameter": "start", "start": 1, "limit": 10, "items": ["items"],
+                       "total": ["queries", "request", "0", "totalResults"]}
+            increments the query parameter by the page size (limit); retrieval stops when a page contains fewer
+            items than the limit. If the total number of results is configured, it is read from the first page and
+            the remaining pages are retrieved in parallel, in batches of at most OFFSET_BATCH_SIZE pages (retrieval
+            also stops when a batch ends with a page that contains fewer items than the limit, because totals such as
+            Google's totalResults are only estimates).
+    The optional property "max_pages" limits the number of pages per entity.
+    """
+
+    def __init__(self, pagination_type, max_pages=None, cursor=None, parameter=None, has_more=None, start=0,
+                 limit=None, items=None, total=None):
+        """
+        Initialize a pagination.
+        :param pagination_type: One of "link", "cursor", "offset".
+        :param max_pages: Maximum number of pages per entity (default: None, meaning no limit).
+        :param cursor: Access path of the cursor in the response (cursor pagination).
+        :param parameter: Query parameter for cursor or offset.
+        :param has_more: Access path of a flag indicating that more pages exist (cursor pagination, optional).
+        :param start: Offset of the first page (offset pagination).
+        :param limit: Number of items per page (offset pagination).
+        :param items: Access path of the items in the response (offset pagination).
+        :param total: Access path of the total number of items in the response (offset pagination, optional).
+        """
+        if pagination_type not in PAGINATION_TYPES:
+            raise IllegalConfigurationError("Unknown pagination type: " + str(pagination_type))
+        if max_pages is not None and max_pages < 1:
+            raise IllegalConfigurationError("Maximum number of pages must be at least 1.")
+        if pagination_type == CURSOR_PAGINATION and not cursor:
+            raise IllegalConfigurationError("Cursor pagination requires the access path of the cursor.")
+        if pagination_type == OFFSET_PAGINATION and (not parameter or not limit or not items):
+            raise IllegalConfigurationError("Offset pagination requires parameter, limit, and access path of items.")
+
+        self.type = pagination_type
+        self.max_pages = max_pages
+        self.cursor = cursor
+        self.parameter = parameter
+        self.has_more = has_more
+        self.start = start
+        self.limit = limit
+        self.items = items
+        self.total = total
+
+    def get_next_uris(self, chain):
+        """
+        Get the URIs of the next page(s) after the last retrieved page.
+        :param chain: List with the retrieved pages (entities), starting with the first page.
+        :return: Tuple with list of URIs (empty if the last page has been reached) and flag indicating that no pages
+            follow these URIs (True if the last batch of pages is known from the total number of results).
+        """
+        if self.max_pages is not None and len(chain) >= self.max_pages:
+            return [], True
+        remaining_pages = None if self.max_pages is None else self.max_pages - len(chain)
+
+        page = chain[-1]
+        if self.type == LINK_PAGINATION:
+            uri = page.next_uri
+        elif self.type == CURSOR_PAGINATION:
+            uri = self._get_cursor_uri(page)
+        else:
+            if self.total is not None:
+                batch = self._get_offset_batch(chain, remaining_pages)
+                if batch is not None:
+                    return batch
+            uri = self._get_offset_uri(page, len(chain))
+
+        # stop if the API returns the same page again
+        if uri is None or uri == page.uri:
+            return [], True
+        return [uri], False
+
+    def _get_cursor_uri(self, page):
+        """
+        Get the URI of the next page from the cursor in a response.
+        :param page: The retrieved page (entity).
+        :return: The URI of the next page, None if the last page has been reached.
+        """
+        if self.has_more is not None and not Pagination._get_value(page.json_response, self.has_more):
+            return None
+        cursor = Pagination._get_value(page.json_response, self.cursor)
+        if cursor is None or cursor == "":
+            return None
+        if self.parameter is None:
+            # cursor is the (possibly relative) URI of the next page
+            return urllib.parse.urljoin(page.uri, str(cursor))
+        return Pagination.set_query_parameter(page.uri, self.parameter, cursor)
+
+    def _get_offset_uri(self, page, page_count):
+        """
+        Get the URI of the next page by incrementing the offset.
+        :param page: The retrieved page (entity).
+        :param page_count: Number of retrieved pages.
+        :return: The URI of the next page, None if the last page has been reached (fewer items than the limit).
+        """
+        items = Pagination._get_value(page.json_response, self.items)
+        if not isinstance(items, list) or len(items) < self.limit:
+            return None
+        return Pagination.set_query_parameter(page.uri, self.parameter, self.start + page_count * self.limit)
+
+    def _get_offset_batch(self, chain, remaining_pages):
+        """
+        Get the URIs of the next batch of pages from the total number of results on the first page.
+        :param chain: List with the retrieved pages (entities), starting with the first page.
+        :param remaining_pages: Maximum number of pages that may still be retrieved (None if there is no limit).
+        :return: Tuple like get_next_uris, None if the total number of results is not available.
+        """
+        try:
+            total = int(Pagination._get_value(chain[0].json_response, self.total))
+        except (TypeError, ValueError):
+            return None
+        if len(chain) > 1 and self._get_offset_uri(chain[-1], len(chain)) is None:
+            # the last page contains fewer items than the limit, the total has been overestimated
+            return [], True
+        offsets = range(self.start + len(chain) * self.limit, self.start + total, self.limit)
+        batch_size = OFFSET_BATCH_SIZE if remaining_pages is None else min(OFFSET_BATCH_SIZE, remaining_pages)
+        uris = [Pagination.set_query_parameter(chain[0].uri, self.parameter, offset)
+                for offset in offsets[:batch_size]]
+        return uris, len(offsets) <= batch_size
+
+    @staticmethod
+    def _get_value(json_response, path):
+        """
+        Get a value from a response using an access path (like Entity.apply_filter, but without logging missing
+        values, which are expected on the last page).
+        :param json_response: The JSON response.
+        :param path: List with keys (or list indices).
+        :return: The value, None if the path does not exist.
+        """
+        value = json_response
+        for key in path:
+            try:
+                if isinstance(value, list):
+                    value = value[int(key)]
+                else:
+                    value = value[key]
+            except (KeyError, IndexError, ValueError, TypeError):
+                return None
+        return value
+
+    @staticmethod
+    def set_query_parameter(uri, name, value):
+        """
+        Set a query parameter in a URI (the remaining URI is not re-encoded, such that variables like {api_key}
+        are preserved).
+        :param uri: The URI.
+        :param name: Name of the query parameter.
+        :param value: Value of the query parameter.
+        :return: The URI with the query parameter.
+        """
+        value = urllib.parse.quote(str(value), safe="")
+        pattern = re.compile(r'([?&]' + re.escape(name) + r'=)[^&#]*')
+        if pattern.search(uri):
+            return pattern.sub(lambda match: match.group(1) + value, uri, count=1)
+        return uri + ("&" if "?" in uri else "?") + name + "=" + value
+
+    @staticmethod
+    def get_next_link(uri, link_header):
+        """
+        Get the URI of the next page from a Link header.
+        :param uri: URI of the request (relative links are resolved against it).
+        :param link_header: Value of the Link header (may be None).
+        :return: The URI of the next page, None if the header does not contain a link with rel="next".
+        """
+        if not link_header:
+            return None
+        for link in requests.utils.parse_header_links(link_header):
+            if link.get("rel") == "next" and link.get("url"):
+                return urllib.parse.urljoin(uri, link["url"])
+        return None
+
+    @classmethod
+    def create_from_dict(cls, pagination_dict):
+        """
+        Create pagination from the (optional) "pagination" object in an entity configuration.
+        :param pagination_dict: Dictionary with the pagination configuration.
+        :return: Object of class Pagination.
+        """
+        if "type" not in pagination_dict:
+            raise IllegalConfigurationError("Pagination type not configured.")
+        for path in ["cursor", "has_more", "items", "total"]:
+            if path in pagination_dict and not isinstance(pagination_dict[path], list):
+                raise IllegalConfigurationError("Pagination property " + path + " must be an access path (array).")
+        return cls(pagination_dict["type"],
+                   max_pages=pagination_dict.get("max_pages", None),
+                   cursor=pagination_dict.get("cursor", None),
+                   parameter=pagination_dict.get("parameter", None),
+                   has_more=pagination_dict.get("has_more", None),
+                   start=pagination_dict.get("start", 0),
+                   limit=pagination_dict.get("limit", None),
+                   items=pagination_dict.get("items", None),
+                   total=pagination_dict.get("total", None))
@@ -0,0 +1,127 @@
+import logging
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# default number of input entities processed per window
+DEFAULT_WINDOW_SIZE = 1000
+
+
+class Pipeline(object):
+    """
+    Streaming pipeline that processes the rows of an input file in windows of bounded size:
+    CSV reader -> range variable expansion -> retrieval (including callbacks) -> flattening
+    -> chained requests (pipelined, see ChainedRequestExecutor) or raw download -> CSV writer.
+    Only the entities of the current window are kept in memory, such that the memory usage does not grow with the
+    size of the input file. Within a window, the entities are retrieved using the workers of the entity list.
+    """
+
+    def __init__(self, entities, window_size, output_dir, delimiter, config_dir):
+        """
+        Initialize a pipeline.
+        :param entities: Empty entity list (object of class EntityList) with configuration, workers, and transport.
+        :param window_size: Number of input entities processed per window.
+        :param output_dir: Target directory for generated files.
+        :param delimiter: Column delimiter in CSV files (typically ',').
+        :param config_dir: Path to directory with entity configurations as JSON files (for chained requests).
+        """
+        assert window_size >= 1
+
+        self.entities = entities
+        self.window_size = window_size
+        self.output_dir = output_dir
+        self.delimiter = delimiter
+        self.config_dir = config_dir
+
+        # exporter writing the CSV file incrementally (created when the first window is exported)
+        self.exporter = None
+
+    def run(self, input_file):
+        """
+        Process all entities in an input file.
+        :param input_file: Path to the CSV file with the input parameters.
+        """
+        configuration = self.entities.configuration
+        # stream raw downloads to the output directory while retrieving
+        self.entities.set_output_dir(self.output_dir)
+
+        # executor for the chained requests (created once, such that the configurations are read once)
+        executor = None
+        if configuration.chained_request_name:
+            executor = self.entities.create_chained_request_executor(self.config_dir)
+
+        logger.info("Streaming entities in windows of " + str(self.window_size) + " entities...")
+
+        # the phases are timed over all windows (if profiling is enabled)
+        profiler = self.entities.transport.profiler
+        windows = self._get_windows(self.entities.iter_csv(input_file, self.delimiter))
+        try:
+            while True:
+                with profiler.phase("read_from_csv"):
+                    window = next(windows, None)
+                if window is None:
+                    break
+                window_entities = self.entities.create_window(window)
+
+                if executor is not None:
+                    # retrieve data using API and execute chained requests (if configured)
+                    with profiler.phase("execute_chained_request"):
+                        window_chained_request_entities = executor.execute(window_entities)
+                    if window_chained_request_entities.configuration.raw_download:
+                        # write raw content of last chained request to output files
+                        with profiler.phase("save_raw_files"):
+                            window_chained_request_entities.save_raw_files(self.output_dir)
+                    with profiler.phase("write_to_csv"):
+                        self._export(window_chained_request_entities, executor.levels[-1])
+                else:
+                    # retrieve data using API
+                    with profiler.phase("retrieve_data"):
+                        window_entities.retrieve_data()
+
+                    # flatten output (if configured)
+                    if configuration.flatten_output:
+                        with profiler.phase("flatten_output"):
+                            window_entities.flatten_output()
+
+                    if configuration.raw_download:
+                        # write raw content to output files
+                        with profiler.phase("save_raw_files"):
+                            window_entities.save_raw_files(self.output_dir)
+                    with profiler.phase("write_to_csv"):
+                        self._export(window_entities, self.entities)
+        finally:
+            if self.exporter is not None:
+                self.exporter.close()
+            if executor is not None:
+                executor.close()
+
+        if self.exporter is None:
+            logger.info("Nothing to export.")
+
+    def _get_windows(self, entities):
+        """
+        Group entities into windows.
+        :param entities: Iterable of entities.
+        :return: Generator yielding lists with at most window_size entities.
+        """
+        window = []
+        for entity in entities:
+            window.append(entity)
+            if len(window) == self.window_size:
+                yield window
+                window = []
+        if window:
+            yield window
+
+    def _export(self, window_entities, entities):
+        """
+        Append the entities of a window to the CSV file.
+        :param window_entities: Entity list with the entities of the window.
+        :param entities: Entity list the windows are created from (used to name the CSV file).
+        """
+        if len(window_entities.entities) == 0:
+            return
+
+        if self.exporter is None:
+            self.exporter = entities.create_exporter(self.output_dir, self.delimiter)
+        self.exporter.write(window_entities.entities)
@@ -0,0 +1,271 @@
+import cProfile
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+from util.exceptions import IllegalArgumentError
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# what is measured in addition to the wall time: nothing, function calls (cProfile), or memory allocations
+PROFILE_MODES = ["timing", "cprofile", "tracemalloc"]
+DEFAULT_PROFILE_MODE = "timing"
+# what is wrapped in cProfile or tracemalloc: the phases of the run or the individual callbacks
+PROFILE_TARGETS = ["phases", "callbacks"]
+DEFAULT_PROFILE_TARGET = "phases"
+# name of the summary report and prefix of the .prof files (written to the output directory)
+PROFILE_NAME = "profile"
+# number of allocation sites listed per phase in the report (tracemalloc)
+TOP_ALLOCATIONS = 10
+
+
+class PhaseStats(object):
+    """ Wall time of one phase of a run (summed over all calls, e.g., over all windows when streaming). """
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        # cProfile profile of the phase (cprofile mode)
+        self.profile = None
+        # peak of the memory allocated during the phase and the allocation sites of the memory that was allocated
+        # during the last call of the phase and is still in use at its end (tracemalloc mode)
+        self.peak_memory = None
+        self.allocations = None
+
+
+class CallbackStats(object):
+    """ Time spent in one callback of an entity configuration (summed over all entities and workers). """
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        # merged cProfile statistics of the profiled calls and their number (cprofile mode, concurrent calls are only
+        # timed, because only one profiler can be active at a time)
+        self.stats = None
+        self.profiled_calls = 0
+        # peak of the memory allocated by one call (tracemalloc mode, only exact if callbacks are not executed
+        # concurrently, because tracemalloc traces all threads)
+        self.peak_memory = None
+
+
+class Profiler(object):
+    """
+    Profiler for the phases of a run (reading the input file, resolving range variables, retrieving data, flattening,
+    chained requests, raw downloads, and exporting) and for the pre and post request callbacks.
+    The wall time of each phase and each callback is always measured. Depending on the mode, either the phases or the
+    individual callbacks are additionally profiled using cProfile (written to .prof files, which can be inspected
+    using pstats or snakeviz) or tracemalloc (peak memory and largest allocation sites in the report).
+    cProfile only profiles the thread that starts a phase, so worker threads are only included in the profiles of
+    the callbacks (or if the run uses one worker or the asyncio engine). Only one profiler can be active at a time
+    (enforced since Python 3.12), thus if callbacks are executed concurrently, only one of them is profiled at a time,
+    while the others are only timed.
+    A disabled profiler (the default of a transport) only adds one function call per callback.
+    """
+
+    def __init__(self, enabled=False, mode=DEFAULT_PROFILE_MODE, target=DEFAULT_PROFILE_TARGET):
+        """
+        :param enabled: Measure phases and callbacks (default: False).
+        :param mode: One of PROFILE_MODES.
+        :param target: One of PROFILE_TARGETS (ignored in timing mode).
+        """
+        if mode not in PROFILE_MODES:
+            raise IllegalArgumentError("Unknown profile mode: " + str(mode))
+        if target not in PROFILE_TARGETS:
+            raise IllegalArgumentError("Unknown profile target: " + str(target))
+
+        self.enabled = enabled
+        self.mode = mode
+        self.target = target
+        self.start_time = time.perf_counter()
+        # statistics per phase (in the order the phases are entered) and per configuration and callback
+        self.phases = dict()
+        self.callbacks = dict()
+        # nesting depth of the phases (only the outermost phase is profiled, nested phases are only timed)
+        self.depth = 0
+        # callbacks are executed by all workers
+        self.lock = threading.Lock()
+        # held while a callback is profiled using cProfile (only one profiler can be active at a time)
+        self.profile_lock = threading.Lock()
+
+    def _profiles_phases(self, mode):
+        return self.mode == mode and self.target == "phases"
+
+    def _profiles_callbacks(self, mode):
+        return self.mode == mode and self.target == "callbacks"
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure a phase of the run.
+        :param name: Name of the phase (e.g., "retrieve_data").
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        outermost = self.depth == 0
+        self.depth += 1
+
+        baseline = None
+        snapshot = None
+        if outermost and self._profiles_phases("cprofile"):
+            if stats.profile is None:
+                stats.profile = cProfile.Profile()
+            stats.profile.enable()
+        elif outermost and self._profiles_phases("tracemalloc"):
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            snapshot = Profiler._take_snapshot()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            self.depth -= 1
+            if outermost and self._profiles_phases("cprofile"):
+                stats.profile.disable()
+            elif baseline is not None:
+                stats.peak_memory = max(stats.peak_memory or 0, tracemalloc.get_traced_memory()[1] - baseline)
+                stats.allocations = [statistic for statistic in
+                                     Profiler._take_snapshot().compare_to(snapshot, "lineno")[:TOP_ALLOCATIONS]
+                                     if statistic.size_diff > 0]
+
+    @staticmethod
+    def _take_snapshot():
+        """
+        Take a snapshot of the traced memory allocations, excluding the allocations of tracemalloc itself.
+        :return: Object of class tracemalloc.Snapshot.
+        """
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def call_callback(self, configuration_name, callback, entity):
+        """
+        Execute a callback, measuring its execution time.
+        :param configuration_name: Name of the entity configuration the callback belongs to.
+        :param callback: The callback function.
+        :param entity: The entity passed to the callback.
+        :return: The return value of the callback.
+        """
+        if not self.enabled:
+            return callback(entity)
+
+        profile = None
+        baseline = None
+        if self._profiles_callbacks("cprofile") and self.profile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+            profile.enable()
+        elif self._profiles_callbacks("tracemalloc"):
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            return callback(entity)
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self.profile_lock.release()
+            peak_memory = tracemalloc.get_traced_memory()[1] - baseline if baseline is not None else None
+
+            with self.lock:
+                key = (configuration_name, callback.__name__)
+                stats = self.callbacks.get(key)
+                if stats is None:
+                    stats = self.callbacks[key] = CallbackStats()
+                stats.calls += 1
+                stats.seconds += seconds
+                stats.max_seconds = max(stats.max_seconds, seconds)
+                if profile is not None:
+                    stats.profiled_calls += 1
+                    if stats.stats is None:
+                        stats.stats = pstats.Stats(profile)
+                    else:
+                        stats.stats.add(profile)
+                if peak_memory is not None:
+                    stats.peak_memory = max(stats.peak_memory or 0, peak_memory)
+
+    def write_report(self, output_dir):
+        """
+        Write the summary report and the .prof files (cprofile mode) to the output directory.
+        :param output_dir: Target directory.
+        """
+        if not self.enabled:
+            return
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        total = time.perf_counter() - self.start_time
+        lines = ["Profile of the run (mode: " + self.mode
+                 + ("" if self.mode == "timing" else ", target: " + self.target) + ")", "",
+                 "Phases (wall time, nested phases are included in the enclosing phase):",
+                 "phase".ljust(28) + "calls".rjust(8) + "seconds".rjust(12) + "share".rjust(8)
+                 + ("peak MiB".rjust(10) if self._profiles_phases("tracemalloc") else "")]
+        for name, stats in self.phases.items():
+            line = name.ljust(28) + str(stats.calls).rjust(8) + ("%.3f" % stats.seconds).rjust(12) \
+                   + ("%.1f%%" % (100 * stats.seconds / total)).rjust(8)
+            if stats.peak_memory is not None:
+                line += ("%.1f" % (stats.peak_memory / 1024 / 1024)).rjust(10)
+            lines.append(line)
+        lines.append("total".ljust(28) + "".rjust(8) + ("%.3f" % total).rjust(12))
+
+        lines += ["", "Callbacks (summed over all workers):",
+                  "configuration".ljust(36) + "callback".ljust(36) + "calls".rjust(8) + "seconds".rjust(12)
+                  + "mean ms".rjust(10) + "max ms".rjust(10)
+                  + ("peak KiB".rjust(10) if self._profiles_callbacks("tracemalloc") else "")
+                  + ("profiled".rjust(10) if self._profiles_callbacks("cprofile") else "")]
+        # heavy callbacks first
+        for (configuration_name, callback_name), stats in sorted(self.callbacks.items(),
+                                                                 key=lambda item: -item[1].seconds):
+            line = configuration_name.ljust(36) + callback_name.ljust(36) + str(stats.calls).rjust(8) \
+                   + ("%.3f" % stats.seconds).rjust(12) + ("%.3f" % (1000 * stats.seconds / stats.calls)).rjust(10) \
+                   + ("%.3f" % (1000 * stats.max_seconds)).rjust(10)
+            if stats.peak_memory is not None:
+                line += ("%.1f" % (stats.peak_memory / 1024)).rjust(10)
+            if self._profiles_callbacks("cprofile"):
+                line += str(stats.profiled_calls).rjust(10)
+            lines.append(line)
+        if not self.callbacks:
+            lines.append("(no callbacks executed)")
+
+        profile_files = []
+        for name, stats in self.phases.items():
+            if stats.profile is not None:
+                profile_files.append(os.path.join(output_dir, PROFILE_NAME + "." + name + ".prof"))
+                stats.profile.dump_stats(profile_files[-1])
+        for (configuration_name, callback_name), stats in self.callbacks.items():
+            if stats.stats is not None:
+                profile_files.append(os.path.join(output_dir, PROFILE_NAME + "." + configuration_name + "."
+                                                  + callback_name + ".prof"))
+                stats.stats.dump_stats(profile_files[-1])
+        if profile_files:
+            lines += ["", "cProfile files (e.g., python3 -m pstats <file>):"] + profile_files
+
+        for name, stats in self.phases.items():
+            if stats.allocations:
+                lines += ["", "Largest allocation sites of memory still in use at the end of phase " + name + ":"]
+                lines += [str(statistic) for statistic in stats.allocations]
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        report_file = os.path.join(output_dir, PROFILE_NAME + ".txt")
+        with open(report_file, "w", encoding="utf8") as fp:
+            fp.write("\n".join(lines) + "\n")
+        logger.info("Profile written to " + report_file + ".")
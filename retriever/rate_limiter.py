@@ -0,0 +1,162 @@
+import email.utils
+import logging
+import threading
+import time
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# values of X-RateLimit-Reset below this threshold are interpreted as seconds until reset instead of a UNIX timestamp
+RELATIVE_RESET_THRESHOLD = 1000000000
+
+
+class RateLimitState(object):
+    """ Rate limit state of one bucket (e.g., one host). """
+
+    def __init__(self):
+        # requests remaining in the current rate limit window, i.e., tokens in the bucket (None if unknown)
+        self.remaining = None
+        # UNIX timestamp at which the current rate limit window is reset, i.e., the bucket is refilled (None if unknown)
+        self.reset = None
+        # UNIX timestamp until which no request should be sent (set from Retry-After)
+        self.blocked_until = 0.0
+
+    def has_limits(self, now):
+        """
+        Check if the state describes a rate limit window that has not been reset yet.
+        :param now: Current UNIX timestamp.
+        :return: True if remaining requests and reset time are known for the current window, False otherwise.
+        """
+        return self.remaining is not None and self.reset is not None and now < self.reset
+
+
+class RateLimiter(object):
+    """
+    Token-bucket rate limiter driven by the rate limit headers sent by an API
+    (X-RateLimit-Remaining, X-RateLimit-Reset, and Retry-After).
+    Each request takes one token from the bucket; the headers of the responses tell how many tokens are left and
+    when the bucket is refilled. Requests are sent without delay while tokens are left, once the bucket is empty,
+    requests wait until the rate limit window is reset. Thus, the whole budget is used without exceeding it.
+    For buckets without rate limit headers, the randomized delay configured for the entity is used as fallback.
+    A bucket is typically the host of the requested URI.
+    """
+
+    def __init__(self):
+        # rate limit states per bucket
+        self.states = dict()
+        # the rate limiter is shared by all workers
+        self.lock = threading.Lock()
+
+    def reserve(self, bucket, fallback_delay):
+        """
+        Reserve a token for the next request to a bucket.
+        :param bucket: The bucket of the request (e.g., the host).
+        :param fallback_delay: Delay (ms) to use if no rate limit headers have been received for the bucket.
+        :return: Time in seconds to wait before sending the request.
+        """
+        with self.lock:
+            now = time.time()
+            state = self._get_state(bucket)
+
+            if not state.has_limits(now):
+                wait = fallback_delay / 1000
+            elif state.remaining > 0:
+                # take token (requests in flight are considered when the next response arrives)
+                state.remaining -= 1
+                wait = 0
+            else:
+                # bucket empty, wait until the window is reset
+                wait = state.reset - now
+                logger.info("Rate limit for " + str(bucket) + " exhausted, waiting "
+                            + str(round(wait)) + " seconds until reset...")
+
+            return max(wait, state.blocked_until - now, 0)
+
+    def get_budget(self, bucket):
+        """
+        Get the budget of a bucket in the current rate limit window.
+        :param bucket: The bucket (e.g., the host).
+        :return: Tuple with remaining requests and reset time, None if no rate limit is known.
+        """
+        with self.lock:
+            state = self.states.get(bucket)
+            if state is None or not state.has_limits(time.time()):
+                return None
+            return state.remaining, state.reset
+
+    def get_budgets(self):
+        """
+        Get the budgets of all buckets with a known rate limit (see get_budget).
+        :return: Dictionary with tuples of remaining requests and reset time per bucket.
+        """
+        with self.lock:
+            now = time.time()
+            return {bucket: (state.remaining, state.reset) for bucket, state in self.states.items()
+                    if state.has_limits(now)}
+
+    def update(self, bucket, headers):
+        """
+        Update the rate limit state of a bucket using the headers of a response.
+        :param bucket: The bucket of the request (e.g., the host).
+        :param headers: The (case-insensitive) response headers.
+        """
+        remaining = RateLimiter._parse_int(headers.get("X-RateLimit-Remaining"))
+        reset = RateLimiter._parse_int(headers.get("X-RateLimit-Reset"))
+        retry_after = RateLimiter.parse_retry_after(headers.get("Retry-After"))
+
+        with self.lock:
+            now = time.time()
+            state = self._get_state(bucket)
+
+            if retry_after is not None:
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+
+            if remaining is None or reset is None:
+                return
+
+            if reset < RELATIVE_RESET_THRESHOLD:
+                reset = now + reset
+
+            if not state.has_limits(now) or abs(reset - state.reset) > 1:
+                # new rate limit window
+                state.reset = reset
+                state.remaining = remaining
+            else:
+                # responses to earlier requests may arrive late, the local count already considers those requests
+                state.remaining = min(state.remaining, remaining)
+
+    def _get_state(self, bucket):
+        """
+        Get the rate limit state of a bucket, create it if it does not exist (lock must be held).
+        :param bucket: The bucket.
+        :return: Object of class RateLimitState.
+        """
+        state = self.states.get(bucket)
+        if state is None:
+            state = RateLimitState()
+            self.states[bucket] = state
+        return state
+
+    @staticmethod
+    def parse_retry_after(value):
+        """
+        Parse the value of a Retry-After header (seconds or HTTP date).
+        :param value: The header value (may be None).
+        :return: Seconds to wait, None if the value is missing or malformed.
+        """
+        if value is None:
+            return None
+        seconds = RateLimiter._parse_int(value)
+        if seconds is not None:
+            return max(seconds, 0)
+        try:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import tempfile
+
+# size of the chunks in which raw downloads are read from the connection (in bytes)
+RAW_CHUNK_SIZE = 64 * 1024
+# suffix of temporary files (incomplete downloads)
+TEMP_SUFFIX = ".part"
+
+
+class RawDownload(object):
+    """
+    Raw response content that is streamed to a temporary file in the output directory while it is received, such
+    that downloaded files are never kept in memory. Once the destination of the file is known (it may be set by a
+    post_request_callback), the temporary file is atomically renamed. Only the path, size, and SHA-256 digest of the
+    content are kept.
+    """
+
+    def __init__(self, directory):
+        """
+        Create the temporary file for a download.
+        :param directory: Directory for the temporary file (must be on the same file system as the destination).
+        """
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(suffix=TEMP_SUFFIX, dir=directory)
+        self.file = os.fdopen(fd, 'wb')
+        # path of the destination file (None until the download has been moved)
+        self.path = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, chunk):
+        """
+        Append a chunk of the response content to the temporary file.
+        :param chunk: Chunk of the response content (bytes).
+        """
+        self.file.write(chunk)
+        self.size += len(chunk)
+        self.digest.update(chunk)
+
+    def close(self):
+        """
+        Close the temporary file after the response content has been received completely.
+        """
+        self.file.close()
+
+    def discard(self):
+        """
+        Remove the temporary file (e.g., if the connection failed or the entity has been removed by a filter).
+        """
+        self.file.close()
+        if self.path is None and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def move(self, dest_file):
+        """
+        Atomically move the downloaded file to its destination, creating missing directories.
+        :param dest_file: Path to the destination file (an existing file is replaced).
+        """
+        dest_dir = os.path.dirname(dest_file)
+        if dest_dir:
+            os.makedirs(dest_dir, exist_ok=True)
+        os.replace(self.temp_path, dest_file)
+        self.path = dest_file
+
+    def to_dict(self):
+        """
+        Get the metadata of the download (kept in the output parameters of the entity instead of the content).
+        :return: Dictionary with path, size (in bytes), and SHA-256 digest of the downloaded file.
+        """
+        return {"path": self.path, "size": self.size, "sha256": self.digest.hexdigest()}
+
+    @staticmethod
+    def download(directory, chunks):
+        """
+        Stream response content to a temporary file.
+        :param directory: Directory for the temporary file.
+        :param chunks: Iterable with the chunks of the response content.
+        :return: Object of class RawDownload (the temporary file is removed if reading the content fails).
+        """
+        download = RawDownload(directory)
+        try:
+            for chunk in chunks:
+                download.write(chunk)
+        except BaseException:
+            download.discard()
+            raise
+        download.close()
+        return download
+
+    @staticmethod
+    async def download_async(directory, chunks):
+        """
+        Stream response content received using aiohttp to a temporary file.
+        :param directory: Directory for the temporary file.
+        :param chunks: Asynchronous iterable with the chunks of the response content.
+        :return: Object of class RawDownload (the temporary file is removed if reading the content fails).
+        """
+        download = RawDownload(directory)
+        try:
+            async for chunk in chunks:
+                download.write(chunk)
+        except BaseException:
+            download.discard()
+            raise
+        download.close()
+        return download
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# default maximum size of the completed responses kept for later requests
+DEFAULT_COALESCE_BUFFER_SIZE = 64  # MiB
+
+
+class RequestCoalescer(object):
+    """
+    Coalesces identical requests (same URI and headers) of a run, such that each request is sent only once.
+    If an identical request is in flight, the entity waits for its response instead of sending another request.
+    Completed responses are kept in a bounded buffer (least recently used responses are evicted), such that later
+    entities with the same request (e.g., the same commit reached through different chained requests) do not send
+    it again. Only the response body is shared; each entity parses it and executes its callbacks itself.
+    Failed requests are shared with the entities waiting for them, but are not buffered.
+    """
+
+    def __init__(self, max_size=DEFAULT_COALESCE_BUFFER_SIZE):
+        """
+        Initialize the coalescer.
+        :param max_size: Maximum size (MiB) of the buffered responses (0 means that only requests in flight are
+            coalesced).
+        """
+        self.max_size = max_size * 1024 * 1024
+        # the coalescer is shared by all workers
+        self.lock = threading.Lock()
+        # futures of requests in flight by request key (requests engine and asyncio engine)
+        self.in_flight = dict()
+        self.in_flight_async = dict()
+        # buffered response bodies by request key (least recently used first)
+        self.bodies = OrderedDict()
+        self.size = 0
+        # number of requests that have not been sent because of an identical request
+        self.coalesced = 0
+
+    def fetch(self, key, fetch):
+        """
+        Fetch a response body, unless an identical request is in flight or has been completed.
+        :param key: Key identifying the request.
+        :param fetch: Function sending the request, returning the response body (None if the request failed).
+        :return: The response body, None if the request failed.
+        """
+        with self.lock:
+            body = self._get_body(key)
+            if body is not None:
+                return body
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self.in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if leader:
+            # this worker sends the request
+            return self._fetch(key, future, fetch)
+        # wait for identical request in flight
+        return future.result()
+
+    def _fetch(self, key, future, fetch):
+        """
+        Send a request and share its result with the workers waiting for it.
+        :param key: Key identifying the request.
+        :param future: Future for the workers waiting for the request.
+        :param fetch: Function sending the request.
+        :return: The response body, None if the request failed.
+        """
+        try:
+            body = fetch()
+        except BaseException as e:
+            self._complete(self.in_flight, key, None)
+            future.set_exception(e)
+            raise
+        self._complete(self.in_flight, key, body)
+        future.set_result(body)
+        return body
+
+    async def fetch_async(self, key, fetch):
+        """
+        Fetch a response body using a coroutine, unless an identical request is in flight or has been completed.
+        :param key: Key identifying the request.
+        :param fetch: Function returning a coroutine that sends the request and returns the response body
+            (None if the request failed).
+        :return: The response body, None if the request failed.
+        """
+        with self.lock:
+            body = self._get_body(key)
+            if body is not None:
+                return body
+            future = self.in_flight_async.get(key)
+            if future is not None:
+                self.coalesced += 1
+
+        if future is not None:
+            # wait for identical request in flight (shield it, such that a cancelled waiter does not cancel it)
+            return await asyncio.shield(future)
+
+        # the event loop runs in a single thread, thus no other coroutine registered the request in the meantime
+        future = asyncio.get_event_loop().create_future()
+        self.in_flight_async[key] = future
+        try:
+            body = await fetch()
+        except BaseException as e:
+            self._complete(self.in_flight_async, key, None)
+            future.set_exception(e)
+            # the exception is raised here, do not warn if no other coroutine waits for the future
+            future.exception()
+            raise
+        self._complete(self.in_flight_async, key, body)
+        future.set_result(body)
+        return body
+
+    def _get_body(self, key):
+        """
+        Get a buffered response body and mark it as recently used (lock must be held).
+        :param key: Key identifying the request.
+        :return: The response body, None if it is not buffered.
+        """
+        body = self.bodies.get(key)
+        if body is not None:
+            self.bodies.move_to_end(key)
+            self.coalesced += 1
+        return body
+
+    def _complete(self, in_flight, key, body):
+        """
+        Remove a completed request from the requests in flight and buffer its response body.
+        :param in_flight: Dictionary with the requests in flight.
+        :param key: Key identifying the request.
+        :param body: The response body (None if the request failed).
+        """
+        with self.lock:
+            in_flight.pop(key, None)
+            if body is None or len(body) > self.max_size:
+                return
+            self.bodies[key] = body
+            self.size += len(body)
+            while self.size > self.max_size:
+                _, evicted_body = self.bodies.popitem(last=False)
+                self.size -= len(evicted_body)
+
+    def close(self):
+        """
+        Release the buffered responses and log statistics.
+        """
+        logger.info(str(self.coalesced) + " identical request(s) have been coalesced.")
+        with self.lock:
+            self.bodies.clear()
+            self.size = 0
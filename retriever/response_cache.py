@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# get root logger
+logger = logging.getLogger('api-retriever_logger')
+
+# defaults for cache configuration
+DEFAULT_CACHE_TTL = 86400  # s
+DEFAULT_CACHE_MAX_SIZE = 1024  # MiB
+
+
+class CachedResponse(object):
+    """ Response stored in the response cache. """
+
+    def __init__(self, key, body, etag, last_modified, stored_at, link=None):
+        self.key = key
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        # Link header (needed for pagination)
+        self.link = link
+
+    def add_validators(self, headers):
+        """
+        Add the validators of the cached response to the headers of a request, such that the server can answer with
+        "304 Not Modified" if the resource did not change.
+        :param headers: Dictionary with request headers.
+        :return: New dictionary with request headers.
+        """
+        headers = {**headers}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    """
+    Persistent cache for successful API responses, stored in an SQLite database.
+    Responses younger than the configured time to live (TTL) are used without sending a request.
+    Older responses are revalidated using If-None-Match/If-Modified-Since if the server sent an ETag or Last-Modified
+    header (GitHub, for example, does not count "304 Not Modified" responses against the rate limit).
+    If the cache exceeds its maximum size, the least recently used responses are evicted.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_CACHE_TTL, max_size=DEFAULT_CACHE_MAX_SIZE):
+        """
+        Open (or create) a response cache.
+        :param path: Path to the SQLite database file.
+        :param ttl: Time to live (s) of cached responses before they are revalidated.
+        :param max_size: Maximum size of all cached response bodies (MiB).
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.ttl = ttl
+        self.max_size = max_size * 1024 * 1024
+        # the cache is shared by all workers
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                "key TEXT PRIMARY KEY, body BLOB, etag TEXT, last_modified TEXT, "
+                                "size INTEGER, stored_at REAL, accessed_at REAL, link TEXT)")
+        # caches created by previous versions do not store the Link header
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(responses)")]
+        if "link" not in columns:
+            self.connection.execute("ALTER TABLE responses ADD COLUMN link TEXT")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.connection.commit()
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        # statistics for log
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+        logger.info("Opened response cache " + str(path) + " (" + str(round(self.size / 1024 / 1024, 1)) + " MiB).")
+
+    @staticmethod
+    def get_key(uri, headers):
+        """
+        Get the cache key for a request.
+        :param uri: The URI (should not contain API keys from a key pool, which change between requests).
+        :param headers: Dictionary with the configured request headers.
+        :return: The cache key (SHA-256 hash, such that API keys in the URI are not stored in the cache).
+        """
+        return hashlib.sha256((uri + json.dumps(headers, sort_keys=True)).encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """
+        Look up a response in the cache.
+        :param key: The cache key.
+        :return: Object of class CachedResponse, None if the response is not cached.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT body, etag, last_modified, stored_at, link FROM responses "
+                                          "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(key, *row)
+
+    def is_fresh(self, cached_response):
+        """
+        Check if a cached response can be used without revalidation (if so, it is counted as cache hit).
+        :param cached_response: Object of class CachedResponse.
+        :return: True if the response is younger than the TTL, False otherwise.
+        """
+        if time.time() - cached_response.stored_at < self.ttl:
+            self.hits += 1
+            self.touch(cached_response, False)
+            return True
+        return False
+
+    def touch(self, cached_response, revalidated):
+        """
+        Update the access time of a cached response (and the time it was stored if it has been revalidated).
+        :param cached_response: Object of class CachedResponse.
+        :param revalidated: True if the server confirmed that the response did not change ("304 Not Modified").
+        """
+        now = time.time()
+        with self.lock:
+            if revalidated:
+                self.revalidations += 1
+                cached_response.stored_at = now
+            self.connection.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                                    (cached_response.stored_at, now, cached_response.key))
+            self.connection.commit()
+
+    def store(self, key, headers, body):
+        """
+        Store a successful response in the cache, evict least recently used responses if the cache is full.
+        :param key: The cache key.
+        :param headers: The (case-insensitive) response headers.
+        :param body: The response body (bytes).
+        """
+        now = time.time()
+        with self.lock:
+            self.misses += 1
+            row = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.size -= row[0]
+            self.connection.execute("INSERT OR REPLACE INTO responses "
+                                    "(key, body, etag, last_modified, size, stored_at, accessed_at, link) "
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (key, body, headers.get("ETag"), headers.get("Last-Modified"), len(body),
+                                     now, now, headers.get("Link")))
+            self.size += len(body)
+            while self.size > self.max_size:
+                row = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT 1").fetchone()
+                if row is None:
+                    break
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+                self.size -= row[1]
+            self.connection.commit()
+
+    def close(self):
+        """
+        Close the cache and log statistics.
+        """
+        logger.info("Response cache: " + str(self.hits) + " hits, " + str(self.revalidations) + " revalidations, "
+                    + str(self.misses) + " misses.")
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,69 @@
+from random import uniform
+
+from util.exceptions import IllegalConfigurationError
+
+# defaults for optional retry configuration
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_MIN = 1000  # ms
+DEFAULT_BACKOFF_MAX = 60000  # ms
+
+
+class RetryPolicy(object):
+    """
+    Policy for retrying failed requests ("Too Many Requests", server errors, and connection errors)
+    with exponential backoff and jitter.
+    Configured using the optional "retry" object in the entity configuration, e.g.:
+        "retry": {"max_attempts": 5, "backoff": [1000, 60000]}
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_min=DEFAULT_BACKOFF_MIN,
+                 backoff_max=DEFAULT_BACKOFF_MAX):
+        """
+        Initialize a retry policy.
+        :param max_attempts: Maximum number of attempts per entity (including the first request).
+        :param backoff_min: Backoff (ms) after the first failed attempt, doubled for each further attempt.
+        :param backoff_max: Maximum backoff (ms).
+        """
+        if max_attempts < 1:
+            raise IllegalConfigurationError("Maximum number of attempts must be at least 1.")
+        if backoff_min < 0 or backoff_max < backoff_min:
+            raise IllegalConfigurationError("Illegal backoff interval: [" + str(backoff_min) + ", "
+                                            + str(backoff_max) + "]")
+        self.max_attempts = max_attempts
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+    def should_retry(self, status_code, headers):
+        """
+        Check if a request should be retried based on the response.
+        :param status_code: HTTP status code of the response.
+        :param headers: The (case-insensitive) response headers.
+        :return: True for "Too Many Requests", server errors, and exceeded rate limits (403 with no requests remaining
+            or with Retry-After, e.g., GitHub's primary and secondary rate limits), False otherwise.
+        """
+        if status_code == 429 or 500 <= status_code < 600:
+            return True
+        return status_code == 403 and (headers.get("X-RateLimit-Remaining") == "0"
+                                       or headers.get("Retry-After") is not None)
+
+    def get_backoff(self, attempt):
+        """
+        Get the backoff after a failed attempt (exponential backoff with "equal jitter").
+        :param attempt: Number of attempts made so far (starting at 1).
+        :return: Backoff in milliseconds.
+        """
+        backoff = min(self.backoff_max, self.backoff_min * 2 ** (attempt - 1))
+        return uniform(backoff / 2, backoff)
+
+    @classmethod
+    def create_from_dict(cls, retry_dict):
+        """
+        Create retry policy from the (optional) "retry" object in an entity configuration.
+        :param retry_dict: Dictionary with the retry configuration (may be empty).
+        :return: Object of class RetryPolicy.
+        """
+        max_attempts = retry_dict.get("max_attempts", DEFAULT_MAX_ATTEMPTS)
+        backoff = retry_dict.get("backoff", [DEFAULT_BACKOFF_MIN, DEFAULT_BACKOFF_MAX])
+        if not isinstance(backoff, list) or len(backoff) != 2:
+            raise IllegalConfigurationError("Backoff must be an array [min, max].")
+        return cls(max_attempts, backoff[0], backoff[1])
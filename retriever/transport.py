@@ -0,0 +1,149 @@
+import asyncio
+import requests
+
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only required for the asyncio engine
+    aiohttp = None
+
+from retriever.json_decoder import JsonDecoder
+from retriever.metrics import Metrics
+from retriever.profiler import Profiler
+from retriever.rate_limiter import RateLimiter
+from util.exceptions import IllegalConfigurationError
+
+# defaults for transport configuration
+DEFAULT_CONNECT_TIMEOUT = 10  # s
+DEFAULT_READ_TIMEOUT = 120  # s
+DEFAULT_CONNECT_RETRIES = 3
+
+
+class Transport(object):
+    """
+    HTTP transport owned by a run and shared by all entity lists (main list, chained requests, URI input parameters),
+    such that connections (and TLS sessions) are reused across all stages.
+    The transport owns the connection pools, the timeouts, the rate limiter, the decoder for JSON responses, the
+    metrics and the profiler of the run, and the (optional) response cache and request coalescer.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOLSIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, keep_alive=True, connect_retries=DEFAULT_CONNECT_RETRIES,
+                 cache=None, coalescer=None, json_decoder=None, profiler=None):
+        """
+        Initialize the transport.
+        :param pool_size: Maximum number of connections kept open per host.
+        :param connect_timeout: Timeout (s) for establishing a connection.
+        :param read_timeout: Timeout (s) between two bytes received from the server.
+        :param keep_alive: Keep connections open between requests (default: True).
+        :param connect_retries: Number of retries for failed connection attempts (done by the connection pool,
+            before the retry policy of the entity configuration applies).
+        :param cache: Persistent response cache (object of class ResponseCache, optional).
+        :param coalescer: Coalescer for identical requests (object of class RequestCoalescer, optional).
+        :param json_decoder: Decoder for JSON responses (object of class JsonDecoder, default: selected automatically).
+        :param profiler: Profiler for the phases and callbacks of the run (object of class Profiler, default: disabled).
+        """
+        assert pool_size >= 1
+
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+
+        # session for the requests engine, mounted adapter retries failed connection attempts
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_size,
+                              max_retries=Retry(total=None, connect=connect_retries, read=0, status=0,
+                                                backoff_factor=0.5))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+        # event loop and session for the asyncio engine (created on demand)
+        self.loop = None
+        self.async_session = None
+
+        # rate limiter pacing the requests according to the rate limit headers of the APIs
+        self.rate_limiter = RateLimiter()
+
+        # response cache shared by all stages (None if responses are not cached)
+        self.cache = cache
+        # coalescer sharing responses between identical requests (None if requests are not coalesced)
+        self.coalescer = coalescer
+        # decoder for JSON responses shared by all stages
+        self.json_decoder = JsonDecoder() if json_decoder is None else json_decoder
+        # metrics collected by all stages (see MetricsReporter for exporting them)
+        self.metrics = Metrics()
+        # profiler timing the phases of the run and the callbacks
+        self.profiler = Profiler() if profiler is None else profiler
+
+    def get(self, uri, headers=None, stream=False):
+        """
+        Send a GET request using the requests session.
+        :param uri: The URI.
+        :param headers: Dictionary with headers (optional).
+        :param stream: Only read the headers, such that the content can be read in chunks (default: False).
+        :return: The response (requests.Response).
+        """
+        return self.session.get(uri, headers=headers, timeout=(self.connect_timeout, self.read_timeout),
+                                stream=stream)
+
+    def get_async(self, uri, headers=None):
+        """
+        Send a GET request using the aiohttp session (must be called from a coroutine executed by run_async).
+        :param uri: The URI.
+        :param headers: Dictionary with headers (optional).
+        :return: Asynchronous context manager for the response (aiohttp.ClientResponse).
+        """
+        return self.async_session.get(uri, headers=headers)
+
+    def run_async(self, coroutine, limit):
+        """
+        Run a coroutine on the event loop of the transport. The loop and the aiohttp session are kept between calls,
+        such that connections are reused across all stages.
+        :param coroutine: The coroutine to run.
+        :param limit: Maximum number of connections (should be at least the number of workers).
+        :return: The result of the coroutine.
+        """
+        Transport.check_async_support()
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(self._run_async(coroutine, limit))
+
+    async def _run_async(self, coroutine, limit):
+        """
+        Create the aiohttp session (within the event loop) if needed, then run the coroutine.
+        """
+        if self.async_session is None or self.async_session.connector.limit < limit:
+            if self.async_session is not None:
+                await self.async_session.close()
+            connector = aiohttp.TCPConnector(limit=max(limit, self.pool_size), limit_per_host=self.pool_size,
+                                             force_close=not self.keep_alive)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self.async_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return await coroutine
+
+    @staticmethod
+    def check_async_support():
+        """
+        Check if the asyncio engine can be used, i.e., if aiohttp is installed.
+        """
+        if aiohttp is None:
+            raise IllegalConfigurationError("The asyncio engine requires the package aiohttp.")
+
+    def close(self):
+        """
+        Close all connections and the response cache.
+        """
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.coalescer is not None:
+            self.coalescer.close()
+        if self.loop is not None:
+            if self.async_session is not None:
+                self.loop.run_until_complete(self.async_session.close())
+            self.loop.close()
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+API_RETRIEVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api-retriever.py")
+API_KEY = "secret-key-1234"
+REPOS = ["owner" + str(i) + "/repo" + str(i) for i in range(10)]
+
+
+class RepositoryHandler(BaseHTTPRequestHandler):
+    """ Serves /repos/<owner>/<repo>, drops the connection for the repositories in server.failing. """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        repo_name = self.path.split("?")[0][len("/repos/"):]
+        with self.server.lock:
+            self.server.requests[repo_name] += 1
+        if repo_name in self.server.failing:
+            # connection error on the client side
+            self.close_connection = True
+            return
+        body = json.dumps({"full_name": repo_name, "license": {"key": "mit"}}).encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RepositoryHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = Counter()
+        self.server.failing = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, "repo___license.json")
+        with open(self.config_file, "w", encoding="utf8") as fp:
+            json.dump({
+                "input_parameters": ["repo_name"],
+                "ignore_input_duplicates": False,
+                "uri_template": "http://127.0.0.1:" + str(self.server.server_address[1])
+                                + "/repos/{repo_name}?key={api_key_1}",
+                "api_keys": [API_KEY],
+                "headers": {},
+                "delay": [0, 0],
+                "retry": {"max_attempts": 1},
+                "pre_request_callbacks": [],
+                "pre_request_callback_filter": False,
+                "output_parameter_mapping": {"license": ["license", "key"]},
+                "post_request_callbacks": [],
+                "post_request_callback_filter": False,
+                "flatten_output": False,
+                "chained_request": {},
+                "log_uri": False
+            }, fp)
+        self.input_file = os.path.join(self.directory, "repos.csv")
+        with open(self.input_file, "w", encoding="utf8") as fp:
+            # duplicate rows are retrieved and journaled once per row
+            fp.write("repo_name\n" + "\n".join(REPOS + REPOS[:2]) + "\n")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def run_retriever(self, output_dir, *args):
+        subprocess.run([sys.executable, API_RETRIEVER, "-i", self.input_file, "-o", output_dir,
+                        "-c", self.config_file, "-w", "4", "-ll", "ERROR"] + list(args),
+                       cwd=self.directory, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def read_output(self, output_dir):
+        with open(os.path.join(output_dir, "repo___license.csv"), encoding="utf8") as fp:
+            return fp.read()
+
+    def test_resume(self):
+        self.run_retriever(os.path.join(self.directory, "expected"))
+        expected = self.read_output(os.path.join(self.directory, "expected"))
+        self.server.requests.clear()
+
+        # interrupted run: two repositories fail because of connection errors
+        output_dir = os.path.join(self.directory, "output")
+        self.server.failing = {REPOS[3], REPOS[7]}
+        self.run_retriever(output_dir)
+        journal_file = os.path.join(output_dir, "repo___license.journal")
+        self.assertTrue(os.path.exists(journal_file))
+        with open(journal_file, encoding="utf8") as fp:
+            journal = fp.read()
+        self.assertEqual(len(journal.splitlines()), len(REPOS) + 2 - 2)
+        self.assertNotIn(API_KEY, journal)
+
+        # resumed run: only the failed repositories are retrieved again
+        self.server.failing = set()
+        self.server.requests.clear()
+        self.run_retriever(output_dir, "--resume")
+        self.assertEqual(self.server.requests, Counter({REPOS[3]: 1, REPOS[7]: 1}))
+        self.assertEqual(self.read_output(output_dir), expected)
+        # all entities have been exported, the journal is removed
+        self.assertFalse(os.path.exists(journal_file))
+
+    def test_resume_streaming(self):
+        output_dir = os.path.join(self.directory, "output")
+        self.server.failing = {REPOS[0]}
+        self.run_retriever(output_dir, "--stream", "--window-size", "3")
+        self.server.failing = set()
+        self.server.requests.clear()
+        self.run_retriever(output_dir, "--stream", "--window-size", "3", "--resume")
+        # the duplicate row of the failed repository has not been journaled either (identical requests are coalesced)
+        self.assertEqual(set(self.server.requests), {REPOS[0]})
+        self.assertEqual(self.read_output(output_dir).count("mit"), len(REPOS) + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
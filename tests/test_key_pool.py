@@ -0,0 +1,55 @@
+import unittest
+
+from requests.structures import CaseInsensitiveDict
+
+from retriever.entity import Entity
+from retriever.key_pool import KeyPool
+from retriever.retry_policy import RetryPolicy
+
+
+class KeyPoolConfiguration(object):
+    """ Minimal entity configuration with a key pool (only what Entity._check_retry needs). """
+
+    def __init__(self, keys):
+        self.retry_policy = RetryPolicy(max_attempts=5)
+        self.key_pool = KeyPool(keys)
+
+
+class KeyPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.configuration = KeyPoolConfiguration(["key1", "key2", "key3"])
+
+    def create_entity(self):
+        entity = Entity.__new__(Entity)
+        entity.configuration = self.configuration
+        entity.input_parameters = {"repo_name": "owner/repo"}
+        entity.attempts = 1
+        entity.key_removed = False
+        return entity
+
+    def test_content_level_403_keeps_pool(self):
+        headers = CaseInsensitiveDict({"X-RateLimit-Remaining": "4999"})
+        content = b'{"message": "Resource not accessible by integration"}'
+        for api_key in ["key1", "key2", "key3"]:
+            self.assertFalse(self.create_entity()._check_retry(403, headers, content, api_key))
+        self.assertEqual(self.configuration.key_pool.keys, ["key1", "key2", "key3"])
+
+    def test_403_with_retry_after_is_retried_without_removal(self):
+        headers = CaseInsensitiveDict({"Retry-After": "60", "X-RateLimit-Remaining": "4999"})
+        self.assertTrue(self.create_entity()._check_retry(403, headers, b'{"message": "secondary rate limit"}',
+                                                          "key1"))
+        self.assertEqual(self.configuration.key_pool.keys, ["key1", "key2", "key3"])
+
+    def test_bad_credentials_remove_at_most_one_key_per_entity(self):
+        headers = CaseInsensitiveDict()
+        content = b'{"message": "Bad credentials"}'
+        entity = self.create_entity()
+        self.assertTrue(entity._check_retry(401, headers, content, "key1"))
+        entity.attempts += 1
+        self.assertFalse(entity._check_retry(403, headers, content, "key2"))
+        self.assertEqual(self.configuration.key_pool.keys, ["key2", "key3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
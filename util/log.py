@@ -1,12 +1,50 @@
 """ Global logger. """
 
+import atexit
 import logging
+import logging.handlers
+import queue
+
+# levels that can be selected on the command line
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+DEFAULT_LOG_LEVEL = "INFO"
+# maximum number of characters of a payload (e.g., a response) that is included in a log message
+MAX_PAYLOAD_LENGTH = 200
+
+# console handlers of the configured loggers (their level is changed together with the level of the logger)
+console_handlers = dict()
+
+
+class Truncated(object):
+    """
+    Wrapper for payloads passed as argument to a log message (%-style). The payload is only converted to a string
+    if the message is emitted, and the string is truncated to a maximum length.
+    """
+
+    __slots__ = ['payload', 'max_length']
+
+    def __init__(self, payload, max_length=MAX_PAYLOAD_LENGTH):
+        """
+        :param payload: The payload (any object).
+        :param max_length: Maximum number of characters of the string representation.
+        """
+        self.payload = payload
+        self.max_length = max_length
+
+    def __str__(self):
+        payload = str(self.payload)
+        if len(payload) <= self.max_length:
+            return payload
+        return payload[:self.max_length] + "... (" + str(len(payload)) + " characters)"
 
 
 def configure_logger(name, log_file):
     """
     Configure a named global logger.
     (see also [1])
+    Log records are put into a queue and written to the console and the log file by a background thread, so that
+    threads logging a message never wait for the console or the disk. The messages of records below the level of the
+    logger are not even formatted, thus hot paths pass their arguments %-style instead of concatenating strings.
     :param name: Name of global logger.
     :param log_file: Path to log file for FileHandler.
     [1]: http://stackoverflow.com/a/7622029
@@ -26,8 +64,27 @@ def configure_logger(name, log_file):
     file_handler.setFormatter(log_formatter)
     file_handler.setLevel(logging.DEBUG)
 
+    # both handlers are served by a listener thread, which is stopped (and the queue drained) at exit
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
     logger.setLevel(logging.DEBUG)
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    console_handlers[name] = console_handler
 
     return logger
+
+
+def set_log_level(name, level):
+    """
+    Set the level of a named global logger and its console handler, i.e., the same messages are written to the
+    console and the log file (messages below the level are neither formatted nor written).
+    :param name: Name of global logger.
+    :param level: One of LOG_LEVELS.
+    """
+    logging.getLogger(name).setLevel(level)
+    console_handler = console_handlers.get(name)
+    if console_handler is not None:
+        console_handler.setLevel(level)
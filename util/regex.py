@@ -4,6 +4,8 @@ import re
 
 # regular expressions for api-retriever configuration
 URI_TEMPLATE_VARS_REGEX = re.compile(r'{(.+?)}')
+# values that urllib.parse.quote returns unchanged
+URI_SAFE_VALUE_REGEX = re.compile(r'[A-Za-z0-9_.\-~/]*')
 RANGE_VAR_REGEX = re.compile(r'(.+\|\d+;\d+;\d+)')
 FLATTEN_OPERATOR_REGEX = re.compile(r'^(.+)\._$')
 
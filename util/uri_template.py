@@ -1,17 +1,41 @@
 import urllib.parse
 
 from util.exceptions import IllegalArgumentError
-from util.regex import URI_TEMPLATE_VARS_REGEX
+from util.regex import URI_TEMPLATE_VARS_REGEX, URI_SAFE_VALUE_REGEX
 
 
 class URITemplate(object):
     """
     Variables in an URI template are enclosed in curly braces, e.g.:
       "https://api.airbnb.com/v2/users/{host_id}?client_id={api_key}"
+    The template is compiled into literal and variable segments, such that an URI is rendered with a single join.
     """
 
     def __init__(self, uri_template_str):
         self.uri_template_str = uri_template_str
+        # values of variables that are the same for all URIs (e.g., API keys), compiled into the literal segments
+        self.bound_values = dict()
+        # variables that are kept in the URI if no value is given (e.g., range variables of root entities or the
+        # variable of a key pool, which is replaced for each request)
+        self.optional_variables = set()
+        # segments of the compiled template (literal strings at even, variable names at odd indices)
+        self.segments = None
+        self._compile()
+
+    def _compile(self):
+        """
+        Split the template into literal and variable segments, inserting the values of bound variables.
+        """
+        # split returns the literal strings with the captured variable names in between
+        parts = URI_TEMPLATE_VARS_REGEX.split(self.uri_template_str)
+        segments = [parts[0]]
+        for index in range(1, len(parts), 2):
+            variable = parts[index]
+            if variable in self.bound_values:
+                segments[-1] += urllib.parse.quote(self.bound_values[variable]) + parts[index + 1]
+            else:
+                segments += [variable, parts[index + 1]]
+        self.segments = segments
 
     def equals(self, other_uri_template):
         return self.uri_template_str == other_uri_template.uri_template_str
@@ -21,6 +45,33 @@ class URITemplate(object):
 
     def replace_range_variable(self, range_var):
         self.uri_template_str = self.uri_template_str.replace(range_var.range_str, range_var.name)
+        # range variables are missing in the URIs of root entities (see EntityList.resolve_range_vars)
+        self.optional_variables.add(range_var.name)
+        self._compile()
+
+    def bind_variables(self, variable_values):
+        """
+        Insert values that are the same for all URIs (e.g., API keys) when compiling the template.
+        :param variable_values: A dictionary with values for variables in the URI template.
+        """
+        self.bound_values.update(variable_values)
+        self._compile()
+
+    def add_optional_variable(self, variable):
+        """
+        Keep a variable in the URI if no value is given (e.g., the variable of a key pool).
+        :param variable: Name of the variable.
+        """
+        self.optional_variables.add(variable)
+
+    def get_missing_variables(self, variable_values):
+        """
+        Get the variables that are needed to render an URI, but have no value.
+        :param variable_values: A dictionary with values for the variables in the URI template.
+        :return: List with the names of the missing variables.
+        """
+        return [variable for variable in self.segments[1::2]
+                if variable_values.get(variable, None) is None and variable not in self.optional_variables]
 
     def replace_variables(self, variable_values):
         """
@@ -29,14 +80,20 @@ class URITemplate(object):
         :return: The final URI string.
         """
 
-        uri = self.uri_template_str
-        uri_variables = self.get_variables()
+        segments = self.segments.copy()
+        is_safe = URI_SAFE_VALUE_REGEX.fullmatch
 
-        for variable in uri_variables:
+        for index in range(1, len(segments), 2):
+            variable = segments[index]
             value = variable_values.get(variable, None)
-            if value:
-                uri = uri.replace("{" + variable + "}", urllib.parse.quote(value))
+            if value is not None:
+                if not isinstance(value, str):
+                    value = str(value)
+                # most values (e.g., names and numbers) do not need to be quoted
+                segments[index] = value if is_safe(value) else urllib.parse.quote(value)
+            elif variable in self.optional_variables:
+                segments[index] = "{" + variable + "}"
             else:
-                IllegalArgumentError("Value for URI variable " + variable + " missing.")
+                raise IllegalArgumentError("Value for URI variable " + variable + " missing.")
 
-        return uri
+        return "".join(segments)